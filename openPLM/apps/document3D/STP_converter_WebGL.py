@@ -18,6 +18,8 @@
 
 
 import os.path
+import itertools
+import multiprocessing
 from OCC.STEPCAFControl import STEPCAFControl_Reader
 from OCC import XCAFApp, TDocStd, XCAFDoc
 from OCC.TCollection import TCollection_ExtendedString, TCollection_AsciiString
@@ -31,6 +33,7 @@ from OCC.BRepMesh import BRepMesh_Mesh
 from OCC.BRepBndLib import BRepBndLib_Add
 from OCC.BRep import BRep_Tool_Triangulation
 from mesh import GeometryWriter, get_mesh_precision
+from binmesh import EXTENSION
 from classes import (Link, Product, TransformationMatrix,  search_assembly,
         get_available_name)
 from OCC.GarbageCollector import garbage
@@ -41,20 +44,33 @@ def new_collect_object(self, obj_deleted):
 
 garbage.collect_object=new_collect_object
 
+#: :class:`StepImporter` whose shapes are meshed by the worker processes
+#: (they are forked, so shapes do not have to be pickled)
+_importer = None
+
+def _write_geometry(args):
+    """
+    Meshes a shape of :data:`_importer` and returns its number of triangles.
+    """
+    index, path, identifier, pov_filename, quantize = args
+    writer = GeometryWriter(_importer.shapes_simples[index], 0.3, quantize)
+    writer.write_geometries(identifier, path, pov_filename)
+    return writer.triangle_count
+
 
 class StepImporter(object):
 
     """
 
     :param file_path: Path of the file **.stp** to analyzing
-    :param id: For the generation of the :class:`.Product`, **id** is assigned like product.doc_id for every node of :class:`.Product`. For the generation of the files of geometry **.geo**, **id** , together with an index generated by the class, are used to identify the content of every file
+    :param id: For the generation of the :class:`.Product`, **id** is assigned like product.doc_id for every node of :class:`.Product`. For the generation of the files of geometry **.mesh**, **id** , together with an index generated by the class, are used to identify the content of every file
 
 
 
     Generates from a path of :class:`~django.core.files.File` **.stp**:
 
 
-    -A set of files **.geo** that represents the geometry of the different simple products that are useful to realize the visualization 3D across the web browser.
+    -A set of files **.mesh** that represents the geometry of the different simple products that are useful to realize the visualization 3D across the web browser.
 
     -A structure of information that represents the arborescencse of the different assemblies,represented in a  :class:`.Product` . (Including his spatial location and orientation and his label of reference (:class:`.OCC.TDF.TDF_Label`))
 
@@ -131,33 +147,70 @@ class StepImporter(object):
         model = ws.Model().GetObject()
         model.Clear()
 
-    def compute_geometries(self,root_path, pov_dir):
+    def compute_geometries(self,root_path, pov_dir, quantize=False, workers=1,
+            progress=None):
         """
 
-        :param root_path: Path where to store the files **.geo** generated
+        :param root_path: Path where to store the files **.mesh** generated
+        :param quantize: True if the meshes are quantized (see :mod:`.binmesh`)
+        :param workers: number of processes which mesh the shapes
+        :param progress: function called with (number of meshed shapes,
+                         number of shapes) each time a shape is meshed
 
         When we generate a new :class:`.StepImporter` we will refill a list(**shapes_simples**) whit the :class:`.SimpleShape` contained in the file **.stp**
 
         For each :class:`.SimpleShape` in the list **shapes_simples**:
 
-            We call the method :func:`.write_geometries` to generate a file **.geo** representative of its geometry,the content of the file is identified by the index+1 (>0) of the position of the :class:`.SimpleShape` in the list of **SimpleShapes**  and by the attribue id of :class:`.StepImporter`
+            We call the method :func:`.write_geometries` to generate a file **.mesh** representative of its geometry,the content of the file is identified by the index+1 (>0) of the position of the :class:`.SimpleShape` in the list of **SimpleShapes**  and by the attribue id of :class:`.StepImporter`
+
+        Shapes are independent, if *workers* is greater than 1, they are
+        meshed by a pool of processes. Results are collected in the order of
+        **shapes_simples**.
 
-        Returns the list of the path of the generated **.geo** files
+        Returns the list of the path of the generated **.mesh** files
 
         """
+        global _importer
         files_index=""
         self.povs = []
 
-        for index, shape in enumerate(self.shapes_simples):
-            name=get_available_name(root_path,self.fileName+".geo")
+        tasks = []
+        names = []
+        for index in range(len(self.shapes_simples)):
+            name=get_available_name(root_path,self.fileName+EXTENSION)
+            while name in names:
+                # files are not yet created
+                name=get_available_name(root_path,self.fileName+EXTENSION)
+            names.append(name)
             path=os.path.join(root_path, name)
             identifier="_"+str(index+1)+"_"+str(self.id)
-            writer = GeometryWriter(shape, 0.3)
             pov_filename = os.path.join(pov_dir, os.path.basename(path + ".inc"))
-            writer.write_geometries(identifier, path, pov_filename)
-            files_index+="GEO:"+name+" , "+str(index+1)+"\n"
-            if writer.triangle_count:
-                self.povs.append((os.path.basename(name + ".inc"), identifier))
+            tasks.append((index, path, identifier, pov_filename, quantize))
+        # created before workers try to create them concurrently
+        for directory in set(os.path.dirname(task[1]) for task in tasks):
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+
+        _importer = self
+        pool = None
+        try:
+            if workers > 1 and len(tasks) > 1:
+                pool = multiprocessing.Pool(min(workers, len(tasks)))
+                results = pool.imap(_write_geometry, tasks)
+            else:
+                results = itertools.imap(_write_geometry, tasks)
+            for index, (name, triangle_count) in enumerate(itertools.izip(names, results)):
+                files_index+="GEO:"+name+" , "+str(index+1)+"\n"
+                if triangle_count:
+                    identifier = tasks[index][2]
+                    self.povs.append((os.path.basename(name + ".inc"), identifier))
+                if progress is not None:
+                    progress(index + 1, len(tasks))
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            _importer = None
 
         return files_index
 
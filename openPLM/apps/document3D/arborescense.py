@@ -1,11 +1,39 @@
+import json
+from collections import OrderedDict
+
 from django.utils.html import escape
 
+from openPLM.apps.document3D.classes import IDENTITY
+
 class JSGenerator(object):
+    """
+    Generates the javascript code which builds the scene and the menu
+    of the 3D view of a :class:`.Product`.
+
+    A geometry is referenced once: its occurrences are listed with their
+    transformation matrix and all their meshes share the same geometry.
+    """
 
     _header = """var object3D = new THREE.Object3D();
 var part_to_object = {};
 var part_to_parts = {};
 var part0 = new THREE.Object3D();
+function add_instances(instances) {
+    for (var i = 0; i < instances.length; i++) {
+        var name = instances[i][0];
+        var occurrences = instances[i][1];
+        for (var j = 0; j < occurrences.length; j++) {
+            var m = occurrences[j][1];
+            var object = new THREE.Mesh(window[name], window["material_for" + name]);
+            object.matrixAutoUpdate = false;
+            object.matrix.set(m[0], m[1], m[2], m[3], m[4], m[5], m[6], m[7],
+                              m[8], m[9], m[10], m[11], 0, 0, 0, 1);
+            object.part = String(occurrences[j][0]);
+            part_to_object["part" + object.part] = object;
+            object3D.add(object);
+        }
+    }
+}
 """
     _function_head = """
 function change_part%(counter)s(attr) {
@@ -31,7 +59,7 @@ function change_part%(counter)s(attr) {
     change_part%(child_counter)s(part%(counter)s.visible);
     """
     _function_change_object = """
-    object%(object_counter)s.visible=part%(counter)s.visible;
+    part_to_object["part%(counter)s"].visible=part%(counter)s.visible;
     """
 
     _menu_tpl = """
@@ -48,13 +76,20 @@ function menu() {
         self.js = []
         self.counter = 0
         self.locations = []
+        # name of a geometry -> list of (part counter, transformation matrix)
+        self.instances = OrderedDict()
 
     def get_js(self):
         if not self.product:
             return ""
         self.menu_items.append(self._get_menu_item(0, self.product.name, self.product.geometry))
         self._process(self.product, [], self.counter)
-        return self._header + self._get_menu() + "".join(self.js)
+        return (self._header + self._get_menu() + "".join(self.js)
+                + self._get_instances())
+
+    def _get_instances(self):
+        return "add_instances(%s);\n" % json.dumps(self.instances.items(),
+                separators=(",", ":"))
 
     def _process(self, product, locations, old_counter):
         self.counter += 1
@@ -93,25 +128,13 @@ function menu() {
         self.js.extend(part_to_parts)
 
     def _add_object3d(self, counter, object_counter, product, loc):
-        reference = product.geometry
-        part_id = str(product.doc_id)
-        js = self.js
-        function = ((self._function_head + self._function_change_object
-                + "}\npart_to_object['part%(counter)s'] = object%(object_counter)s;\n"
-                + "object%(object_counter)s.part = '%(counter)s';\n") % locals())
-
-        counter = object_counter
-        js.append("var object%s=new THREE.Mesh(_%s_%s,material_for_%s_%s );\n"%(counter, reference,
-            part_id, reference, part_id))
-        js.append("object%s.matrixAutoUpdate = false;\n" % counter)
+        name = "_%s_%s" % (product.geometry, product.doc_id)
+        matrix = IDENTITY
         for l in loc:
-            js.append("""
-object%s.matrix.multiplySelf(new THREE.Matrix4(%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,0,0,0,1));\n"""
-                % (counter, l.x1, l.x2, l.x3, l.x4,
-                            l.y1, l.y2, l.y3, l.y4,
-                            l.z1, l.z2, l.z3, l.z4))
-        js.append("object3D.add(object%s);\n" % counter)
-        js.append(function)
+            matrix = matrix.multiply(l)
+        self.instances.setdefault(name, []).append((counter, matrix.to_array()))
+        self.js.append((self._function_head + self._function_change_object
+                + "}\n") % locals())
 
     def _get_menu_item(self, counter, name, is_child):
         onclick = 'change_part%d(\\"click\\");' % counter
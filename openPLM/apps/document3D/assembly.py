@@ -10,8 +10,11 @@ from django.db import transaction
 from django.core.files.base import ContentFile
 
 from openPLM.plmapp.views.base import object_to_dict, get_obj_by_id
-from openPLM.plmapp.models import DocumentFile, DelegationLink, Part, ROLE_OWNER, ROLE_NOTIFIED
+from openPLM.plmapp.models import (DocumentFile, DelegationLink, Part, ROLE_OWNER,
+        ROLE_NOTIFIED, docfs)
 from openPLM.plmapp.controllers import PartController
+from openPLM.plmapp.exceptions import PermissionError
+from openPLM.plmapp.permissions import filter_readable
 from openPLM.plmapp.references import get_new_reference
 from openPLM.plmapp.tasks import update_indexes
 
@@ -86,9 +89,7 @@ class AssemblyBuilder(object):
         try:
             native = self._build(tree, native_files, step_files)
         except:
-            # remove added files
-            for path in self._files:
-                os.remove(path)
+            self._discard_files()
             raise
         return native
 
@@ -129,12 +130,17 @@ class AssemblyBuilder(object):
         try:
             native = self._update(tree, native_files, step_files)
         except:
-            # remove added files
-            for path in self._files:
-                os.remove(path)
+            self._discard_files()
             raise
         return native
 
+    def _discard_files(self):
+        # remove added files, blobs may be shared with other files
+        # (for example, the previous revision of a checked-in file),
+        # they are released through the storage
+        for name in self._files:
+            docfs.discard(name)
+
     @transaction.commit_on_success
     def _update(self, tree, native_files, step_files):
         # tasks (handle_step_files, update_indexes) are executed
@@ -178,7 +184,7 @@ class AssemblyBuilder(object):
         # no thumbnail
         doc.checkin(df, fake_file, True, False)
         self.added_files.append(df)
-        self._files.append(df.file.path)
+        self._files.append(df.file.name)
         if self._lock:
             doc.lock(df)
 
@@ -187,7 +193,7 @@ class AssemblyBuilder(object):
         filename = df.filename.lower()
         doc.checkin(df, self._native_files[filename])
         self.added_files.append(df)
-        self._files.append(df.file.path)
+        self._files.append(df.file.name)
         if self._lock:
             doc.lock(df)
         return df
@@ -197,7 +203,7 @@ class AssemblyBuilder(object):
         filename = df.filename.lower()
         doc.checkin(df, self._step_files[filename])
         self.added_files.append(df)
-        self._files.append(df.file.path)
+        self._files.append(df.file.name)
         if self._lock:
             doc.lock(df)
 
@@ -274,7 +280,7 @@ class AssemblyBuilder(object):
         filename = node["native"].lower()
         df = doc.add_file(self._native_files[filename])
         self.added_files.append(df)
-        self._files.append(df.file.path)
+        self._files.append(df.file.name)
         return df
 
     def _add_step_file(self, doc, node):
@@ -282,7 +288,7 @@ class AssemblyBuilder(object):
         # the thumbnail is generated by handle_step_file
         df = doc.add_file(self._step_files[filename], True, False)
         self.added_files.append(df)
-        self._files.append(df.file.path)
+        self._files.append(df.file.name)
         if self._lock:
             doc.lock(df)
         return df
@@ -295,7 +301,7 @@ class AssemblyBuilder(object):
         # no thumbnail
         df = doc.add_file(fake_file, True, False)
         self.added_files.append(df)
-        self._files.append(df.file.path)
+        self._files.append(df.file.name)
         if self._lock:
             doc.lock(df)
         return df
@@ -418,6 +424,7 @@ class AssemblyInfo(object):
 
     def get_assembly_info(self):
         root = self.controller.PartDecompose
+        self._check_readable([self.controller.object])
         component = self._get_component(self.controller.object, root)
         if root is None:
             component["part"] = None
@@ -432,8 +439,14 @@ class AssemblyInfo(object):
         }
         return info
 
+    def _check_readable(self, objects):
+        """
+        Raises a :exc:`.PermissionError` if one of *objects* is not readable.
+        """
+        if len(filter_readable(self.user, objects)) != len(objects):
+            raise PermissionError("You can not see this object.")
+
     def _get_component(self, doc, part):
-        Document3DController(doc, self.user).check_readable()
         component = {}
         component["document"] = doc.id
         draft = doc.is_draft
@@ -461,8 +474,8 @@ class AssemblyInfo(object):
         return component
 
     def _add_children(self, component, root):
+        self._check_readable([root])
         pctrl = PartController(root, self.user)
-        pctrl.check_readable()
         children = pctrl.get_children(-1)
         if not children:
             return
@@ -480,6 +493,8 @@ class AssemblyInfo(object):
             otherdoc = part2doc.get(key)
             if otherdoc is None or otherdoc.ctime < doc.ctime:
                 part2doc[key] = doc
+        # checks the readability of all documents at once
+        readable = set(d.id for d in filter_readable(self.user, part2doc.values()))
 
         visited_links = set()
         mtime = root.ctime
@@ -495,6 +510,8 @@ class AssemblyInfo(object):
                 # it is not an interessing link
                 pass
             else:
+                if doc.id not in readable:
+                    raise PermissionError("You can not see this object.")
                 mtime = max(mtime, link.ctime)
                 child_comp = self._get_component(doc, part)
                 locs = [{"local_name": l.name, "local_matrix": l.to_array()} for l in locs]
@@ -0,0 +1,296 @@
+"""
+Binary indexed meshes displayed by the WebGL 3D view.
+
+A mesh file starts with a header of :const:`HEADER_SIZE` bytes
+(little-endian)::
+
+    magic           8 bytes, "OPLMMESH"
+    version         uint32
+    flags           uint32 (QUANTIZED | HAS_COLOR)
+    vertex count    uint32
+    index count     uint32
+    color           3 float32 (red, green, blue in [0, 1])
+    origin          3 float32
+    step            3 float32
+    padding         4 bytes
+
+followed by three arrays which can be read as typed arrays:
+
+    * positions: 3 float32 per vertex, or 3 uint16 per vertex if the mesh is
+      quantized (the coordinate is ``origin + value * step``)
+    * normals: 3 float32 per vertex, or 3 int16 per vertex if the mesh is
+      quantized (the component is ``value / 32767``)
+    * indices: 3 uint32 per triangle
+
+Vertices are deduplicated: a vertex shared by several triangles (same
+position and same normal) is stored once.
+
+A geometry can be stored at several levels of detail (:data:`LEVELS`).
+The fine mesh is the file of the :class:`.GeometryFile`, the coarser meshes
+and a manifest (a json file listing the available levels, their number of
+triangles and the bounding box of the geometry) are stored next to it
+(see :func:`get_level_path` and :func:`get_manifest_path`).
+
+This module does not depend on django nor on pythonOCC.
+"""
+
+import sys
+import json
+import struct
+from array import array
+
+MAGIC = "OPLMMESH"
+VERSION = 1
+#: extension of mesh files
+EXTENSION = ".mesh"
+#: content type of mesh files
+CONTENT_TYPE = "application/octet-stream"
+#: levels of detail, from the coarsest to the finest
+LEVELS = ("coarse", "medium", "fine")
+#: extension of manifests
+MANIFEST_EXTENSION = ".lod.json"
+
+QUANTIZED = 1
+HAS_COLOR = 2
+
+_HEADER = struct.Struct("<8sIIII3f3f3f4x")
+HEADER_SIZE = _HEADER.size
+
+QUANTIZATION_MAX = 65535
+NORMAL_MAX = 32767
+
+
+class MeshError(ValueError):
+    """
+    Exception raised when a file is not a valid mesh file.
+    """
+
+
+def _to_bytes(values):
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tostring()
+
+def _from_bytes(typecode, data):
+    values = array(typecode)
+    if len(data) % values.itemsize:
+        raise MeshError("Truncated mesh")
+    values.fromstring(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+def _clamp(value, lower, upper):
+    return min(upper, max(lower, int(round(value))))
+
+def _uint32_typecode():
+    for typecode in "IL":
+        if array(typecode).itemsize == 4:
+            return typecode
+    raise MeshError("No 32 bits array type")
+
+UINT32 = _uint32_typecode()
+
+
+class Mesh(object):
+    """
+    Indexed triangle mesh.
+
+    .. attribute:: positions
+
+        array of floats (x, y, z of each vertex)
+
+    .. attribute:: normals
+
+        array of floats (x, y, z of the normal of each vertex)
+
+    .. attribute:: indices
+
+        array of vertex indices (3 per triangle)
+
+    .. attribute:: color
+
+        tuple (red, green, blue) or None
+    """
+
+    def __init__(self, color=None):
+        self.positions = array("f")
+        self.normals = array("f")
+        self.indices = array(UINT32)
+        self.color = color
+        self._vertices = {}
+
+    @property
+    def vertex_count(self):
+        return len(self.positions) // 3
+
+    @property
+    def triangle_count(self):
+        return len(self.indices) // 3
+
+    def add_vertex(self, point, normal):
+        """
+        Returns the index of the vertex *point* (x, y, z) with the
+        normal *normal* (x, y, z). The vertex is added if it is
+        not already in the mesh.
+        """
+        key = (point, normal)
+        index = self._vertices.get(key)
+        if index is None:
+            index = self._vertices[key] = self.vertex_count
+            self.positions.extend(point)
+            self.normals.extend(normal)
+        return index
+
+    def add_triangle(self, p1, p2, p3, n1, n2, n3):
+        """
+        Adds a triangle of vertices *p1*, *p2*, *p3* (counter-clockwise)
+        and of normals *n1*, *n2*, *n3*.
+        """
+        self.indices.extend((self.add_vertex(p1, n1), self.add_vertex(p2, n2),
+            self.add_vertex(p3, n3)))
+
+    def get_bounds(self):
+        """
+        Returns a tuple (min, max) of the bounding box of the mesh, each bound
+        is a tuple (x, y, z).
+        """
+        if not self.positions:
+            return (0., 0., 0.), (0., 0., 0.)
+        return (tuple(min(self.positions[i::3]) for i in range(3)),
+                tuple(max(self.positions[i::3]) for i in range(3)))
+
+    def write(self, f, quantize=False):
+        """
+        Writes the mesh to the file object *f*.
+
+        If *quantize* is True, positions are stored as 16 bits integers
+        relative to the bounding box and normals as 16 bits integers.
+        """
+        flags = 0
+        origin, step = (0., 0., 0.), (1., 1., 1.)
+        if quantize:
+            flags |= QUANTIZED
+            origin, upper = self.get_bounds()
+            step = tuple((u - o) / QUANTIZATION_MAX or 1. for o, u in zip(origin, upper))
+        color = self.color or (0., 0., 0.)
+        if self.color:
+            flags |= HAS_COLOR
+        f.write(_HEADER.pack(MAGIC, VERSION, flags, self.vertex_count,
+            len(self.indices), *(tuple(color) + origin + step)))
+        if quantize:
+            positions = array("H", (_clamp((v - origin[i % 3]) / step[i % 3],
+                0, QUANTIZATION_MAX) for i, v in enumerate(self.positions)))
+            normals = array("h", (_clamp(v * NORMAL_MAX, -NORMAL_MAX, NORMAL_MAX)
+                for v in self.normals))
+        else:
+            positions, normals = self.positions, self.normals
+        f.write(_to_bytes(positions))
+        f.write(_to_bytes(normals))
+        f.write(_to_bytes(self.indices))
+
+    @classmethod
+    def read(cls, f):
+        """
+        Reads a mesh written by :meth:`write` from the file object *f*.
+        Quantized values are converted back to floats.
+        """
+        header = f.read(HEADER_SIZE)
+        if len(header) != HEADER_SIZE:
+            raise MeshError("Truncated header")
+        values = _HEADER.unpack(header)
+        magic, version, flags, vertex_count, index_count = values[:5]
+        color, origin, step = values[5:8], values[8:11], values[11:14]
+        if magic != MAGIC or version != VERSION:
+            raise MeshError("Not a mesh file")
+        mesh = cls(color if flags & HAS_COLOR else None)
+        size = 3 * vertex_count
+        if flags & QUANTIZED:
+            positions = _from_bytes("H", f.read(2 * size))
+            normals = _from_bytes("h", f.read(2 * size))
+            mesh.positions = array("f", (origin[i % 3] + v * step[i % 3]
+                for i, v in enumerate(positions)))
+            mesh.normals = array("f", (float(v) / NORMAL_MAX for v in normals))
+        else:
+            mesh.positions = _from_bytes("f", f.read(4 * size))
+            mesh.normals = _from_bytes("f", f.read(4 * size))
+        mesh.indices = _from_bytes(UINT32, f.read(4 * index_count))
+        if (len(mesh.positions) != size or len(mesh.normals) != size
+                or len(mesh.indices) != index_count):
+            raise MeshError("Truncated mesh")
+        return mesh
+
+
+def is_mesh_file(name):
+    """
+    Returns True if *name* is the name of a binary mesh file (and not
+    of a legacy javascript **.geo** file).
+    """
+    return name.endswith(EXTENSION)
+
+
+def get_level_path(path, level):
+    """
+    Returns the path of the mesh of level *level* of the geometry whose
+    fine mesh is *path*.
+
+    .. versionadded:: 2.1
+    """
+    if level == LEVELS[-1]:
+        return path
+    return "%s.%s%s" % (path[:-len(EXTENSION)], level, EXTENSION)
+
+def get_manifest_path(path):
+    """
+    Returns the path of the manifest of the geometry whose fine mesh
+    is *path*.
+
+    .. versionadded:: 2.1
+    """
+    return path[:-len(EXTENSION)] + MANIFEST_EXTENSION
+
+def get_level_files(path):
+    """
+    Returns the paths of the files (coarse meshes and manifest) stored
+    next to the fine mesh *path*.
+
+    .. versionadded:: 2.1
+    """
+    return [get_level_path(path, level) for level in LEVELS[:-1]] + \
+            [get_manifest_path(path)]
+
+def write_manifest(path, levels, bounds):
+    """
+    Writes the manifest of the geometry whose fine mesh is *path*.
+
+    :param levels: list of (level, number of triangles), from the coarsest
+                   to the finest
+    :param bounds: bounding box of the geometry (see :meth:`Mesh.get_bounds`)
+
+    .. versionadded:: 2.1
+    """
+    manifest = {
+        "levels" : [{"level" : level, "triangles" : count}
+            for level, count in levels],
+        "bounds" : [list(bounds[0]), list(bounds[1])],
+    }
+    with open(get_manifest_path(path), "w") as f:
+        json.dump(manifest, f)
+
+def read_manifest(path):
+    """
+    Returns the manifest of the geometry whose fine mesh is *path*
+    (see :func:`write_manifest`) or None if the geometry has no valid
+    manifest (legacy mesh).
+
+    .. versionadded:: 2.1
+    """
+    try:
+        with open(get_manifest_path(path)) as f:
+            manifest = json.load(f)
+    except (IOError, ValueError):
+        return None
+    if [l["level"] for l in manifest["levels"]][-1:] != [LEVELS[-1]]:
+        return None
+    return manifest
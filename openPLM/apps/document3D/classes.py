@@ -321,6 +321,24 @@ class TransformationMatrix(object):
                 self.y1, self.y2, self.y3, self.y4,
                 self.z1, self.z2, self.z3, self.z4]
 
+    def multiply(self, other):
+        """
+        Returns a new :class:`TransformationMatrix`, the product of this
+        matrix by *other* (*other* is applied first).
+
+        .. versionadded:: 2.1
+        """
+        a = self.to_array()
+        # the implicit last row (0, 0, 0, 1)
+        b = other.to_array() + [0, 0, 0, 1]
+        return TransformationMatrix([
+            sum(a[row * 4 + k] * b[k * 4 + col] for k in range(4))
+            for row in range(3) for col in range(4)])
+
+
+#: identity :class:`TransformationMatrix`
+IDENTITY = TransformationMatrix((1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0))
+
 
 def search_assembly(product, product_root):
     """
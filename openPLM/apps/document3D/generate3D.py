@@ -9,16 +9,30 @@ from classes import get_available_name
 from STP_converter_WebGL import StepImporter, MultiRootError, OCCReadingStepError
 from pov import create_thumbnail
 
-def convert_step_file(doc_file_path, doc_file_id, location, thumb_path):
+#: prefix of the lines which report the number of meshed shapes
+PROGRESS = "PROGRESS:"
+
+def report_progress(current, total):
+    """
+    Prints the number of meshed shapes, the output is read by
+    :func:`.handle_step_file` while the subprocess is running.
+    """
+    sys.stdout.write("%s%d/%d\n" % (PROGRESS, current, total))
+    sys.stdout.flush()
+
+def convert_step_file(doc_file_path, doc_file_id, location, thumb_path, quantize="0",
+        workers="1"):
     """
 
 
     :param doc_file_path: Path of a file **.stp**
-    :param doc_file_id: id that is applied for the generation of the tree **.arb** and the geometries **.geo**
-    :param location: Path where to store the files **.geo** and **.arb** generated
+    :param doc_file_id: id that is applied for the generation of the tree **.arb** and the geometries **.mesh**
+    :param location: Path where to store the files **.mesh** and **.arb** generated
+    :param quantize: ``"1"`` if the meshes are quantized
+    :param workers: number of processes which mesh the shapes
 
 
-    For a file STEP determined by its path (**doc_file_path**),  it generates its file **.arb** and its files **.geo** having count an **id** determined by **doc_file_id**
+    For a file STEP determined by its path (**doc_file_path**),  it generates its file **.arb** and its files **.mesh** having count an **id** determined by **doc_file_id**
     and returns in stdout the list of paths of files generated
 
     """
@@ -26,7 +40,8 @@ def convert_step_file(doc_file_path, doc_file_id, location, thumb_path):
     step_importer = StepImporter(doc_file_path, doc_file_id)
     product = step_importer.generate_product_arbre()
     pov_dir = tempfile.mkdtemp(suffix="openplm_pov")
-    geo = step_importer.compute_geometries(location, pov_dir)
+    geo = step_importer.compute_geometries(location, pov_dir, quantize == "1",
+            int(workers), report_progress)
     print geo
     print write_arbrefile(product, step_importer.fileName, location)
     if step_importer.thumbnail_valid and product:
@@ -12,7 +12,7 @@ import re
 DUMMY_COMPOSER = False
 
 if DUMMY_COMPOSER:
-    from part21_preparse import readStepFile, parse_entities
+    from part21_stream import StepIndex
 else:
     os.environ["MMGT_OPT"] = "0"
 
@@ -30,6 +30,8 @@ else:
 
 from classes import Product
 
+REFERENCE = re.compile(r"\#(\d+)")
+
 class StepImporter(object):
     def __init__(self, file_path):
         self.h_doc = TDocStd.Handle_TDocStd_Document()
@@ -160,49 +162,29 @@ DATA;
         def inc(m):
             val = int(m.group(1))
             return "#%d" % (val + self.item_count)
-        new_line = re.sub(r"\#(\d+)", inc, line)
-        return new_line
+        return REFERENCE.sub(inc, line)
 
     def add_step_file(self, product):
         path = product.doc_path
         if path in self.added_files:
             return
 
-        step = readStepFile(path)
-        max_id = max(step["insttype"].keys())
-        for iname, content in step["contents"].iteritems():
-            type_ = step["insttype"][iname]
-            if product != self.product and type_.startswith("APPLICATION"):
+        # entities are copied while the file is read, only the
+        # index of products is kept in memory
+        index = StepIndex()
+        for iname, type_, content in index.scan(path):
+            if product != self.product and type_ and type_.startswith("APPLICATION"):
                 # there are certainly more lines to skip
                 continue
             iname2 = iname + self.item_count
-            if type_ == "complex_type":
+            if type_ is None:
                 line = "#%d=(%s)\n" % (iname2, self.increment_ids(content))
             else:
                 line = "#%d=%s(%s)\n" % (iname2, type_, self.increment_ids(content))
             self.output.write(line)
 
-        if 'NEXT_ASSEMBLY_USAGE_OCCURRENCE' in step['typeinst']:
-            # find the root of an assembly
-            parents = set()
-            children = set()
-            for n in step['typeinst']['NEXT_ASSEMBLY_USAGE_OCCURRENCE']:
-                parent, child = [x.strip(" \n\r#'")
-                                 for x in step['contents'][n].split(',')[3:5]]
-                parents.add(int(parent))
-                children.add(int(child))
-            roots = parents / children
-            if len(roots) > 1:
-                raise ValueError("Too many roots in %s" % path)
-            root = roots.pop()
-        else:
-            # a single product
-            root = step['typeinst']['PRODUCT_DEFINITION'][0]
-        product.label_reference = self.item_count + root
-        del step
-        gc.collect()
-
-        self.item_count += max_id
+        product.label_reference = self.item_count + index.root
+        self.item_count += index.max_id
         self.added_files.add(path)
 
     def add_occurences(self, product):
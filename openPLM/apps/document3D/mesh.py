@@ -16,7 +16,6 @@
 ##along with pythonOCC. If not, see <http://www.gnu.org/licenses/>.
 
 import os, os.path
-from kjbuckets import  kjDict
 
 from OCC.Utils.Topology import Topo
 from OCC.TopAbs import TopAbs_REVERSED
@@ -24,12 +23,15 @@ from OCC.Bnd import Bnd_Box
 from OCC.BRepBndLib import BRepBndLib_Add
 from OCC.gp import gp_Vec, gp_Pnt
 from OCC.BRepMesh import BRepMesh_Mesh
+from OCC.BRepTools import BRepTools_Clean
 from OCC.BRep import BRep_Tool_Triangulation
 from OCC.TopLoc import TopLoc_Location
 from OCC.Poly import Poly_Connect
 from OCC.StdPrs import StdPrs_ToolShadedShape_Normal
 from OCC.TColgp import TColgp_Array1OfDir
 
+from binmesh import Mesh, LEVELS, get_level_path, write_manifest
+
 
 triangle_fmt = """ smooth_triangle {
         <%f, %f, %f>, <%f, %f, %f>,
@@ -37,8 +39,14 @@ triangle_fmt = """ smooth_triangle {
         <%f, %f, %f>, <%f, %f, %f>
       }
     """
-vertice_fmt = "%s.vertices.push(new THREE.Vector3(%.4f,%.4f,%.4f));\n"
-face_fmt = "%s.faces.push( new THREE.Face3( %i, %i, %i, [ new THREE.Vector3( %.4f, %.4f, %.4f ), new THREE.Vector3( %.4f, %.4f, %.4f ), new THREE.Vector3( %.4f, %.4f, %.4f ) ]  ) );\n"
+
+#: factor applied to the deflection of the finest mesh for each level of
+#: detail (see :data:`.binmesh.LEVELS`)
+LEVEL_DEFLECTIONS = {
+    "coarse" : 6.,
+    "medium" : 2.5,
+    "fine" : 1.,
+}
 
 
 def get_mesh_precision(shape, quality_factor):
@@ -52,7 +60,8 @@ def get_mesh_precision(shape, quality_factor):
 
 class GeometryWriter(object):
     """
-    Tool to convert an OpenCascade shape into a javascript file.
+    Tool to convert an OpenCascade shape into binary mesh files
+    (see :mod:`.binmesh`), one per level of detail.
 
     :model attributes:
 
@@ -63,12 +72,26 @@ class GeometryWriter(object):
     .. attribute:: quality_factor
 
         quality of applied to the geometry
+
+    .. attribute:: quantize
+
+        True if positions and normals are stored as 16 bits integers
+
+    .. attribute:: triangle_count
+
+        number of triangles of the fine mesh
+
+    .. attribute:: levels
+
+        list of (level, number of triangles) of the written meshes
     """
-    def __init__(self, shape, quality_factor):
+    def __init__(self, shape, quality_factor, quantize=False):
         self.shape = shape
         self.topo_shape = shape.shape
         self._precision = get_mesh_precision(self.topo_shape, quality_factor)
+        self.quantize = quantize
         self.triangle_count = 0
+        self.levels = []
 
     def _triangle_is_valid(self, P1,P2,P3):
 
@@ -86,59 +109,71 @@ class GeometryWriter(object):
 
     def write_geometries(self, identifier, filename, pov_filename):
         """
-        Write the geometry to *filename* (javascript) * and *pov_filename* (POVRay)
-        *identifier* is the name of the generated variable describing the whole geometry.
-        """
+        Write the geometry to *filename* (binary mesh) * and *pov_filename* (POVRay)
+        *identifier* is the name of the POVRay mesh describing the whole geometry.
 
-        opacity = 0.8
+        Coarser meshes and a manifest are written next to *filename*.
+        A level is skipped if it is not lighter than the next finer level.
+        """
 
         directory = os.path.dirname(filename)
         if not os.path.exists(directory):
             os.makedirs(directory)
 
         shape = self.shape
-
-        output = open(filename, "w")
-        with open(filename, "w") as output:
-            output.write("//Computation for : %s\n"%shape.name)
-            output.write("var %s = new THREE.Geometry();\n"%identifier)
-            output.write("var material_for%s = new THREE.MeshBasicMaterial({opacity:%s,shading:THREE.SmoothShading});\n"%(identifier,opacity))
-
-            with open(pov_filename, "w") as pov_file:
-                pov_file.write("""
-                #declare m%s = mesh {
-                    """ % identifier)
-                if shape.color:
-                    output.write("material_for%s.color.setRGB(%f,%f,%f);\n"%(identifier,shape.color.Red(),shape.color.Green(),shape.color.Blue()))
-
-                self._write_faces(output, pov_file, identifier)
-                if shape.color:
-                    color = shape.color.Red(), shape.color.Green(), shape.color.Blue()
-                else:
-                    color = 1, 1, 0
-                pov_file.write("""
-            };
-
-            #declare t%s = texture {
-                pigment {
-                    color <%f,%f, %f, 0.9>
-                }
-                finish {ambient 0.1
-                    diffuse 0.9
-                    phong 1}
-              }
-            """ % ((identifier, ) + color))
-
-    def _write_faces(self, output, pov_file, identifier):
+        if shape.color:
+            color = shape.color.Red(), shape.color.Green(), shape.color.Blue()
+        else:
+            color = None
+
+        # from the coarsest to the finest: BRepMesh refines an existing
+        # triangulation but does not coarsen it
+        BRepTools_Clean(self.topo_shape)
+        meshes = []
+        for level in LEVELS[:-1]:
+            mesh = Mesh(color)
+            self._write_faces(mesh, None, LEVEL_DEFLECTIONS[level])
+            meshes.append((level, mesh))
+        mesh = Mesh(color)
+        with open(pov_filename, "w") as pov_file:
+            pov_file.write("""
+            #declare m%s = mesh {
+                """ % identifier)
+            self._write_faces(mesh, pov_file, LEVEL_DEFLECTIONS[LEVELS[-1]])
+            pov_file.write("""
+        };
+
+        #declare t%s = texture {
+            pigment {
+                color <%f,%f, %f, 0.9>
+            }
+            finish {ambient 0.1
+                diffuse 0.9
+                phong 1}
+          }
+        """ % ((identifier, ) + (color or (1, 1, 0))))
+
+        meshes.append((LEVELS[-1], mesh))
+
+        self.levels = []
+        count = None
+        for level, mesh in reversed(meshes):
+            if count is None or mesh.triangle_count < count:
+                count = mesh.triangle_count
+                self.levels.insert(0, (level, count))
+                with open(get_level_path(filename, level), "wb") as output:
+                    mesh.write(output, self.quantize)
+        self.triangle_count = meshes[-1][1].triangle_count
+        write_manifest(filename, self.levels, meshes[-1][1].get_bounds())
+
+    def _write_faces(self, mesh, pov_file, factor=1.):
         """
-        Triangulates all faces and writes them to *output* (javascript) and *pov_file* (POVRay).
+        Triangulates all faces with a deflection multiplied by *factor* and
+        adds them to *mesh* and *pov_file* (POVRay, may be None).
         """
-        BRepMesh_Mesh(self.topo_shape, self._precision)
-
-        _points = kjDict()
+        BRepMesh_Mesh(self.topo_shape, self._precision * factor)
 
         faces_iterator = Topo(self.topo_shape).faces()
-        index=0
 
         for F in faces_iterator:
             face_location = TopLoc_Location()
@@ -167,30 +202,20 @@ class GeometryWriter(object):
                     p2_coord = P2.XYZ().Coord()
                     p3_coord = P3.XYZ().Coord()
                     if self._triangle_is_valid(P1, P2, P3):
-                        for point in (p1_coord, p2_coord, p3_coord):
-                            if not _points.has_key(point):
-                                _points.add(point, index)
-                                output.write(vertice_fmt % (identifier, point[0], point[1], point[2]))
-                                index+=1
-
                         n1 = the_normal(index1)
                         n2 = the_normal(index2)
-                        n3 = the_normal(index2)
-                        output.write(face_fmt %
-                                (identifier, _points.neighbors(p1_coord)[0],
-                                            _points.neighbors(p2_coord)[0],
-                                            _points.neighbors(p3_coord)[0],
-                                            n1.X(), n1.Y(), n1.Z(),
-                                            n2.X(), n2.Y(), n2.Z(),
-                                            n3.X(), n3.Y(), n3.Z(),
-                                    ))
-                        pov_file.write(triangle_fmt % (
-                            p1_coord[0], p1_coord[1], p1_coord[2],
-                            n1.X(), n1.Y(), n1.Z(),
-                            p2_coord[0], p2_coord[1], p2_coord[2],
-                            n2.X(), n2.Y(), n2.Z(),
-                            p3_coord[0], p3_coord[1], p3_coord[2],
-                            n3.X(), n3.Y(), n3.Z(),
-                            ))
-                        self.triangle_count += 1
+                        n3 = the_normal(index3)
+                        mesh.add_triangle(p1_coord, p2_coord, p3_coord,
+                            (n1.X(), n1.Y(), n1.Z()),
+                            (n2.X(), n2.Y(), n2.Z()),
+                            (n3.X(), n3.Y(), n3.Z()))
+                        if pov_file is not None:
+                            pov_file.write(triangle_fmt % (
+                                p1_coord[0], p1_coord[1], p1_coord[2],
+                                n1.X(), n1.Y(), n1.Z(),
+                                p2_coord[0], p2_coord[1], p2_coord[2],
+                                n2.X(), n2.Y(), n2.Z(),
+                                p3_coord[0], p3_coord[1], p3_coord[2],
+                                n3.X(), n3.Y(), n3.Z(),
+                                ))
 
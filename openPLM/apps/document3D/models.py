@@ -1,9 +1,13 @@
+import io
 import os.path
+import time
 import logging
 import shutil
 import subprocess
 import tempfile
 import copy
+import signal
+import multiprocessing
 from collections import defaultdict
 import json
 
@@ -17,7 +21,7 @@ from django.core.files import File
 
 from openPLM.plmapp.controllers import get_controller, PartController
 from openPLM.plmapp.files.formats import is_cad_file
-from openPLM.apps.document3D import classes
+from openPLM.apps.document3D import classes, stepcache, binmesh
 from openPLM.plmapp.controllers import DocumentController
 import openPLM.plmapp.models as pmodels
 from openPLM.plmapp.exceptions import ControllerError
@@ -64,9 +68,20 @@ class Document3D(pmodels.Document):
         return super(Document3D, self).get_content_and_size(doc_file)
 
     def recompose_step_file(self, doc_file):
+        """
+        Returns a tuple (file, size) of the recomposed *doc_file* or False
+        if it has not been decomposed.
+
+        .. versionchanged:: 2.1
+            Recomposed files are cached (see :mod:`.stepcache`).
+        """
         product = Document3DController(self, None).get_product(doc_file, True)
 
         if product and product.is_decomposed:
+            entry = stepcache.get_entry(doc_file, product)
+            cached = stepcache.get(entry)
+            if cached is not None:
+                return cached
             temp_file = tempfile.NamedTemporaryFile(delete=True)
             temp_file.write(json.dumps(product.to_list()))
             temp_file.seek(0)
@@ -74,6 +89,11 @@ class Document3D(pmodels.Document):
             composer = os.path.join(dirname, "generateComposition.py")
             if subprocess.call(["python", composer, temp_file.name]) == 0:
                 size = os.path.getsize(temp_file.name)
+                try:
+                    stepcache.store(entry, temp_file.name)
+                except (IOError, OSError):
+                    # the file is still served
+                    logging.getLogger("openPLM").exception("Could not cache %s", entry.path)
                 temp_file.seek(0)
                 return temp_file, size
             else:
@@ -105,6 +125,43 @@ class Document3D(pmodels.Document):
 admin.site.register(Document3D)
 
 
+#: prefix of the lines printed by :file:`generate3D.py` to report its progress
+PROGRESS = "PROGRESS:"
+
+def get_mesh_workers():
+    """
+    Returns the number of processes which mesh the shapes of a STEP file
+    (``STEP_MESH_WORKERS`` setting, default: number of CPUs).
+    """
+    workers = getattr(settings, "STEP_MESH_WORKERS", None)
+    if not workers:
+        workers = multiprocessing.cpu_count()
+    return workers
+
+def wait_for_process(process, output_path, report, delay=0.5):
+    """
+    Waits for the end of *process* and returns its exit status.
+
+    *output_path* is the path of the standard output of *process*,
+    *report* is called with (current, total) for each progress line
+    (``PROGRESS:current/total``) printed by *process*.
+    """
+    pending = ""
+    # io.open: reading after the end of file does not stick
+    with io.open(output_path, "rb") as output:
+        while True:
+            status = process.poll()
+            pending += output.read()
+            lines = pending.split("\n")
+            pending = lines.pop()
+            for line in lines:
+                if line.startswith(PROGRESS):
+                    current, total = line[len(PROGRESS):].split("/")
+                    report(int(current), int(total))
+            if status is not None:
+                return status
+            time.sleep(delay)
+
 @task(name="openPLM.apps.document3D.handle_step_file",
       soft_time_limit=60*25,time_limit=60*25)
 def handle_step_file(doc_file_pk):
@@ -115,7 +172,7 @@ def handle_step_file(doc_file_pk):
     Method called by :meth:`.DocumentController.handle_added_file` when a STEP
     file is added to a Document3D.
 
-    It calls a subprocess (:meth:`.generateGeometrys_Arborescense` ) that generates a file **.arb** and one or more files **.geo** (these files
+    It calls a subprocess (:meth:`.generateGeometrys_Arborescense` ) that generates a file **.arb** and one or more files **.mesh** (these files
     are necessary for the visualization 3D and the decomposition of the :class:`~django.core.files.File` **.stp** ),
     later these files will be attached to an :class:`.ArbreFile` and one or more :class:`.GeometryFile` and these classes with the :class:`.DocumentFile` determined by **doc_file_pk**
 
@@ -123,20 +180,36 @@ def handle_step_file(doc_file_pk):
     logging.getLogger("GarbageCollector").setLevel(logging.ERROR)
     logger = handle_step_file.get_logger()
     doc_file = pmodels.DocumentFile.objects.get(pk=doc_file_pk)
-    temp_file = tempfile.TemporaryFile()
+    temp_file = tempfile.NamedTemporaryFile()
     error_file = tempfile.NamedTemporaryFile()
     stdout = temp_file.fileno()
     name = "%s.png" % (doc_file_pk)
     thumbnail_path = pmodels.thumbnailfs.path(name)
-
+    quantize = "1" if getattr(settings, "MESH_QUANTIZATION", False) else "0"
+
+    def report(current, total):
+        logger.info("%s: %d/%d shapes meshed", doc_file.filename, current, total)
+        if handle_step_file.request.id:
+            try:
+                handle_step_file.update_state(state="PROGRESS",
+                        meta={"current" : current, "total" : total})
+            except NotImplementedError:
+                # no result backend
+                pass
+
+    process = None
     try:
         dirname = os.path.dirname(__file__)
-        status=subprocess.call(["python", os.path.join(dirname, "generate3D.py"), doc_file.file.path,
-            str(doc_file.id), settings.MEDIA_ROOT+"3D/", thumbnail_path],
-            stdout=stdout, stderr=error_file.fileno())
+        process = subprocess.Popen(["python", os.path.join(dirname, "generate3D.py"), doc_file.file.path,
+            str(doc_file.id), settings.MEDIA_ROOT+"3D/", thumbnail_path, quantize,
+            str(get_mesh_workers())],
+            stdout=stdout, stderr=error_file.fileno(),
+            # new process group: worker processes are killed with it
+            preexec_fn=os.setsid)
+        status = wait_for_process(process, temp_file.name, report)
         if status == 0:
             """
-            The subprocess is going to return a temporary file with the names of the files *.geo* and *.arb* generated.
+            The subprocess is going to return a temporary file with the names of the files *.mesh* and *.arb* generated.
             In the moment of his generation these files are not associated the documentFile
             """
             delete_ArbreFile(doc_file) #In case of an update, to erase the previous elements
@@ -161,6 +234,9 @@ def handle_step_file(doc_file_pk):
                 #Indeterminate error SEND MAIL?
                 raise ValueError("Error during the treatment of the file STEP")
     finally:
+        if process is not None and process.poll() is None:
+            # the task has been interrupted (time limit)
+            os.killpg(process.pid, signal.SIGKILL)
         temp_file.close()
         error_file.close()
 
@@ -175,7 +251,7 @@ def generate_relations_BD(doc_file,temp_file):
 
     :param doc_file: object which will be updated
     :type plmobject: :class:`.DocumentFile`
-    :param temp_file: :class:`.tempfile` that contains the path of the generated **.geo** and **.arb** files
+    :param temp_file: :class:`.tempfile` that contains the path of the generated **.mesh** and **.arb** files
     :type plmobject: :class:`.tempfile`
     """
     stdout = temp_file.fileno()
@@ -259,6 +335,8 @@ class Document3DController(DocumentController):
                     new_doc.locked = False
                     new_doc.locker = None
                     new_doc.save()
+                    # releases the copy (a blob reference) made by revise
+                    pmodels.docfs.delete(new_STP_file.file.name)
                     new_STP_file.delete()
                     new_STP_file=new_doc
 
@@ -272,6 +350,19 @@ class Document3DController(DocumentController):
                 ArbreFile.create_from_product(product,new_STP_file)
         return rev
 
+    def checkin(self, doc_file, new_file, *args, **kwargs):
+        """
+        .. versionadded:: 2.1
+
+        Checks-in *doc_file* (see :meth:`.DocumentController.checkin`) and
+        deletes the cached recomposed files which depend on it
+        (see :mod:`.stepcache`).
+        """
+        super(Document3DController, self).checkin(doc_file, new_file, *args, **kwargs)
+        fileName, fileExtension = os.path.splitext(doc_file.filename)
+        if fileExtension.upper() in ('.STP', '.STEP'):
+            stepcache.invalidate([doc_file.id])
+
     def delete_file(self, doc_file):
         """
         We erase also the classes :class:`.GeometryFile` and :class:`.ArbreFile` associated with the :class:`.DocumentFile` (**doc_file**)
@@ -281,6 +372,7 @@ class Document3DController(DocumentController):
         if fileExtension.upper() in ('.STP', '.STEP'):
             delete_GeometryFiles(doc_file)
             delete_ArbreFile(doc_file)
+            stepcache.invalidate([doc_file.id])
 
     def deprecate_file(self, doc_file,by_decomposition=False):
         """
@@ -294,6 +386,7 @@ class Document3DController(DocumentController):
         self.check_editable()
         delete_GeometryFiles(doc_file)
         delete_ArbreFile(doc_file)
+        stepcache.invalidate([doc_file.id])
         doc_file.deprecated=True
         doc_file.save()
         if by_decomposition:
@@ -301,7 +394,14 @@ class Document3DController(DocumentController):
         else:
             self._save_histo("File deprecated", "file : %s" % doc_file.filename)
 
-    def get_all_geometry_files(self, doc_file):
+    def get_geometry_files(self, doc_file):
+        """
+        Returns a queryset of all :class:`.GeometryFile` displayed in the
+        3D view of *doc_file*, including the geometries of the decomposed
+        children.
+
+        .. versionadded:: 2.1
+        """
         if self.PartDecompose is not None:
             pctrl = PartController(self.PartDecompose, self._user)
             if self._stps is None:
@@ -322,7 +422,10 @@ class Document3DController(DocumentController):
             gfs = GeometryFile.objects.filter(q)
         else:
             gfs = GeometryFile.objects.filter(stp=doc_file)
-        return gfs.values_list("file", flat=True)
+        return gfs
+
+    def get_all_geometry_files(self, doc_file):
+        return self.get_geometry_files(doc_file).values_list("file", flat=True)
 
     def get_product(self, doc_file, recursive=False):
         """
@@ -397,11 +500,11 @@ media3DGeometryFile = pmodels.DocumentStorage(location=settings.MEDIA_ROOT+"3D/"
 class GeometryFile(models.Model):
     u"""
 
-    Link between :class:`.DocumentFile` that contains a :class:`~django.core.files.File` **.stp** present in a :class:`.Document3D` and a file **.geo** that represents his geometry
+    Link between :class:`.DocumentFile` that contains a :class:`~django.core.files.File` **.stp** present in a :class:`.Document3D` and a file **.mesh** (or a legacy javascript file **.geo**) that represents his geometry
     A :class:`.DocumentFile` can have zero or many :class:`.GeometryFile` associated , to identify the different :class:`.GeometryFile` attached to one :class:`.DocumentFile` we use the
     attribute index. (**index** should be **>=1**)
 
-    The information contained in the file **.geo** will allow to generate the  3D view of the :class:`.DocumentFile`
+    The information contained in the file **.mesh** will allow to generate the  3D view of the :class:`.DocumentFile`
 
      .. attribute:: stp
 
@@ -409,7 +512,7 @@ class GeometryFile(models.Model):
 
      .. attribute:: file
 
-        file **.geo**
+        file **.mesh** (see :mod:`.binmesh`) or **.geo**
 
      .. attribute:: index
 
@@ -424,17 +527,40 @@ class GeometryFile(models.Model):
         return u"GeometryFile<%d:%s, %d>" % (self.stp.id,
             self.stp.filename, self.index)
 
+    @property
+    def is_mesh(self):
+        """
+        True if the file is a binary mesh (see :mod:`.binmesh`),
+        False if it is a legacy javascript file.
+
+        .. versionadded:: 2.1
+        """
+        return binmesh.is_mesh_file(self.file.name)
+
+    @property
+    def identifier(self):
+        """
+        Name of the javascript variable of the geometry used by
+        :class:`.JSGenerator`.
+
+        .. versionadded:: 2.1
+        """
+        return "_%d_%d" % (self.index, self.stp_id)
+
 #admin.site.register(GeometryFile)
 
 def delete_GeometryFiles(doc_file):
     """
-    Physically deletes (*.geo* files) and logically deletes :class:`.GeometryFiles` associated
-    to *doc_file*
+    Physically deletes (*.mesh* files and their levels of detail) and
+    logically deletes :class:`.GeometryFiles` associated to *doc_file*
 
     :param doc_file: :class:`.DocumentFile`
     """
     to_delete = GeometryFile.objects.filter(stp=doc_file)
-    files = to_delete.values_list("file", flat=True)
+    files = list(to_delete.values_list("file", flat=True))
+    for name in files[:]:
+        if binmesh.is_mesh_file(name):
+            files.extend(binmesh.get_level_files(name))
     delete_files(files, media3DGeometryFile.location)
     to_delete.delete()
 
@@ -815,13 +941,13 @@ def update_child_files_BD(product,user,old_product):
 def copy_geometry(product, doc_file):
     """
     :param product: :class:`.Product` that represents a sub-arborescense original of the file step that was decompose
-    :param doc_file: :class:`.DocumentFile` for which the files **.geo** that generated
+    :param doc_file: :class:`.DocumentFile` for which the files **.mesh** that generated
 
 
     Copy the content of all :class:`.GeometryFile` (determined by his index(**product**.geometry)) present in the :class:`.Product` (**product**) and his childrens  for a :class:`.DocumentFile` (**doc_file**) generating and connecting news entitys :class:`.GeometryFile`
 
 
-    To differentiate the content of a file **.geo** we use the combination index (determined by **product**.geometry) more id (**product**.doc_id)
+    To differentiate the content of a file **.mesh** we use the combination index (determined by **product**.geometry) more id (**product**.doc_id)
 
     """
 
@@ -831,18 +957,27 @@ def copy_geometry(product, doc_file):
         new_GeometryFile = GeometryFile()
         fileName, fileExtension = os.path.splitext(doc_file.filename)
 
-        new_GeometryFile.file = new_GeometryFile.file.storage.get_available_name(fileName+".geo")
+        ext = os.path.splitext(old_GeometryFile.file.name)[1]
+        new_GeometryFile.file = new_GeometryFile.file.storage.get_available_name(fileName+ext)
         new_GeometryFile.stp = doc_file
         new_GeometryFile.index = product.geometry
         new_GeometryFile.save()
 
-        with open(old_GeometryFile.file.path, "r") as infile:
-            with open(new_GeometryFile.file.path, "w") as outfile:
-                old_var = "_%s_%s" % (product.geometry, product.doc_id)
-                new_var = "_%s_%s" % (product.geometry, doc_file.id)
-                for line in infile.readlines():
-                    new_line = line.replace(old_var, new_var)
-                    outfile.write(new_line)
+        if old_GeometryFile.is_mesh:
+            # the name of the geometry is not stored in a binary mesh
+            shutil.copyfile(old_GeometryFile.file.path, new_GeometryFile.file.path)
+            for src, dst in zip(binmesh.get_level_files(old_GeometryFile.file.path),
+                    binmesh.get_level_files(new_GeometryFile.file.path)):
+                if os.path.exists(src):
+                    shutil.copyfile(src, dst)
+        else:
+            with open(old_GeometryFile.file.path, "r") as infile:
+                with open(new_GeometryFile.file.path, "w") as outfile:
+                    old_var = "_%s_%s" % (product.geometry, product.doc_id)
+                    new_var = "_%s_%s" % (product.geometry, doc_file.id)
+                    for line in infile.readlines():
+                        new_line = line.replace(old_var, new_var)
+                        outfile.write(new_line)
 
     for link in product.links:
         if not link.product.visited:
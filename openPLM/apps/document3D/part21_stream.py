@@ -0,0 +1,212 @@
+"""
+Streaming reader of STEP Part 21 files (ISO 10303-21).
+
+Unlike :func:`part21_preparse.readStepFile` which loads the whole file and
+builds dictionaries of all entity instances, this reader maps the file
+in memory and yields its entity instances one by one. The parameters of an
+instance are not parsed, they are returned as an unparsed string.
+
+:class:`StepIndex` records, while the instances are read, the only data
+needed to locate the root of a product: the ids of the
+``PRODUCT_DEFINITION`` instances and the relating/related pairs of the
+``NEXT_ASSEMBLY_USAGE_OCCURRENCE`` instances.
+
+This module does not depend on django nor on pythonOCC so that it can be
+used by the scripts run in a separate process
+(:file:`generateComposition.py`, :file:`generateDecomposition.py`).
+It is only used by the dummy composer of :file:`generateComposition.py`,
+which is disabled: production files are still composed by OpenCascade.
+
+Running this module prints the parse throughput of the given files::
+
+    python part21_stream.py data_test/*.st*
+"""
+
+import os
+import re
+import sys
+import mmap
+import time
+from collections import namedtuple
+
+#: An entity instance: *name* is its id (an :class:`int`), *keyword* its
+#: type (None for a complex instance) and *content* its unparsed
+#: parameters (without the outer parenthesis)
+Entity = namedtuple("Entity", "name keyword content")
+
+# an opening quote or the end of a statement
+_STOP = re.compile(r"[';]")
+# the rest of a string after its opening quote, '' is an escaped quote
+_STRING_END = re.compile(r"[^']*(?:''[^']*)*'")
+_STRING = re.compile(r"'[^']*(?:''[^']*)*'")
+_COMMENTS = r"\s*(?:/\*.*?\*/\s*)*"
+_INSTANCE = re.compile(_COMMENTS + r"#(\d+)\s*=\s*([A-Za-z0-9_]*)\s*\(", re.S)
+_DATA = re.compile(_COMMENTS + r"DATA\b", re.S)
+_ENDSEC = re.compile(_COMMENTS + r"ENDSEC\s*;", re.S)
+_REFERENCE = re.compile(r"#(\d+)")
+
+NAUO = "NEXT_ASSEMBLY_USAGE_OCCURRENCE"
+PRODUCT_DEFINITION = "PRODUCT_DEFINITION"
+
+
+class StepError(ValueError):
+    """
+    Exception raised when a file is not a valid Part 21 file.
+    """
+
+
+def iter_statements(buf, start=0):
+    """
+    Yields the bounds (start, end) of each statement (ended by a semicolon)
+    of *buf* (a string or a :class:`mmap.mmap`). Semicolons inside strings
+    are ignored.
+    """
+    pos = start
+    while True:
+        m = _STOP.search(buf, pos)
+        if m is None:
+            return
+        if buf[m.start()] == "'":
+            end = _STRING_END.match(buf, m.end())
+            if end is None:
+                raise StepError("Unterminated string at %d" % m.start())
+            pos = end.end()
+        else:
+            pos = m.end()
+            yield start, pos
+            start = pos
+
+
+def iter_buffer(buf):
+    """
+    Yields the :class:`Entity` instances of the data sections of *buf*.
+    """
+    in_data = False
+    for start, end in iter_statements(buf):
+        statement = buf[start:end]
+        if not in_data:
+            in_data = _DATA.match(statement) is not None
+            continue
+        m = _INSTANCE.match(statement)
+        if m is not None:
+            content = statement[m.end():statement.rindex(")")]
+            yield Entity(int(m.group(1)), m.group(2) or None, content)
+        elif _ENDSEC.match(statement):
+            in_data = False
+
+
+def iter_entities(path):
+    """
+    Yields lazily the :class:`Entity` instances of the STEP file *path*.
+
+    The file is memory-mapped: only the current statement is copied
+    in memory.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for entity in iter_buffer(buf):
+                yield entity
+        finally:
+            buf.close()
+
+
+def parse_entities(content):
+    """
+    Returns the list of ids referenced by *content*
+    (strings are ignored).
+    """
+    return [int(x) for x in _REFERENCE.findall(_STRING.sub("''", content))]
+
+
+class StepIndex(object):
+    """
+    Index of the products of a STEP file, filled by :meth:`scan`.
+
+    .. attribute:: max_id
+
+        greatest id of an entity instance
+
+    .. attribute:: product_definitions
+
+        ids of the ``PRODUCT_DEFINITION`` instances
+
+    .. attribute:: assemblies
+
+        list of (relating, related) ids of the
+        ``NEXT_ASSEMBLY_USAGE_OCCURRENCE`` instances
+    """
+
+    def __init__(self):
+        self.max_id = 0
+        self.count = 0
+        self.product_definitions = []
+        self.assemblies = []
+
+    def add(self, entity):
+        self.count += 1
+        if entity.name > self.max_id:
+            self.max_id = entity.name
+        if entity.keyword == PRODUCT_DEFINITION:
+            self.product_definitions.append(entity.name)
+        elif entity.keyword == NAUO:
+            relating, related = parse_entities(entity.content)[:2]
+            self.assemblies.append((relating, related))
+
+    def scan(self, path):
+        """
+        Yields the entity instances of *path* and indexes them.
+        """
+        for entity in iter_entities(path):
+            self.add(entity)
+            yield entity
+
+    @property
+    def root(self):
+        """
+        Id of the root product definition.
+
+        :raises: :exc:`StepError` if the file has no product or has
+                 several roots.
+        """
+        if self.assemblies:
+            parents = set(p for p, c in self.assemblies)
+            roots = parents.difference(c for p, c in self.assemblies)
+            if len(roots) != 1:
+                raise StepError("The file has %d roots" % len(roots))
+            return roots.pop()
+        if not self.product_definitions:
+            raise StepError("The file does not define a product")
+        return self.product_definitions[0]
+
+
+def read_index(path):
+    """
+    Reads the STEP file *path* and returns its :class:`StepIndex`.
+    """
+    index = StepIndex()
+    for entity in index.scan(path):
+        pass
+    return index
+
+
+def benchmark(paths, repeat=1):
+    """
+    Parses *paths* *repeat* times and returns a tuple (number of bytes,
+    number of entity instances, elapsed time in seconds).
+    """
+    size = count = 0
+    start = time.time()
+    for i in xrange(repeat):
+        for path in paths:
+            size += os.path.getsize(path)
+            count += read_index(path).count
+    return size, count, time.time() - start
+
+
+if __name__ == "__main__":
+    size, count, elapsed = benchmark(sys.argv[1:])
+    print "%d instances, %d bytes in %.3f s: %.2f MB/s" % (count, size,
+            elapsed, size / (elapsed or 1e-9) / 1e6)
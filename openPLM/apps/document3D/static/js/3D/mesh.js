@@ -0,0 +1,164 @@
+/**
+ * Loader of the binary meshes generated by openPLM
+ * (see openPLM/apps/document3D/binmesh.py for a description of the format).
+ *
+ * Typed arrays use the byte order of the platform, meshes are
+ * little-endian like all platforms supporting WebGL.
+ *
+ * A mesh may have several levels of detail: the coarsest level is loaded
+ * first and View3D.refine loads the finer levels of the visible
+ * meshes, the largest ones on screen first.
+ */
+var MeshLoader = {
+
+    HEADER_SIZE: 64,
+    MAGIC: "OPLMMESH",
+    QUANTIZED: 1,
+    HAS_COLOR: 2,
+    NORMAL_MAX: 32767,
+    OPACITY: 0.8,
+
+    /**
+     * Returns an object {geometry: a THREE.Geometry, color: [r, g, b] or null}
+     * built from the ArrayBuffer *buffer*.
+     */
+    parse: function (buffer) {
+        var magic = String.fromCharCode.apply(null, new Uint8Array(buffer, 0, 8));
+        if (magic !== this.MAGIC) {
+            throw new Error("Not a mesh file");
+        }
+        var header = new DataView(buffer, 0, this.HEADER_SIZE);
+        var flags = header.getUint32(12, true);
+        var nb_vertices = header.getUint32(16, true);
+        var nb_indices = header.getUint32(20, true);
+        var f = function (offset) { return header.getFloat32(offset, true); };
+        var color = null;
+        if (flags & this.HAS_COLOR) {
+            color = [f(24), f(28), f(32)];
+        }
+        var origin = [0, 0, 0], step = [1, 1, 1], normal_scale = 1;
+        var offset = this.HEADER_SIZE;
+        var positions, normals, indices;
+        if (flags & this.QUANTIZED) {
+            origin = [f(36), f(40), f(44)];
+            step = [f(48), f(52), f(56)];
+            normal_scale = 1 / this.NORMAL_MAX;
+            positions = new Uint16Array(buffer, offset, 3 * nb_vertices);
+            offset += 6 * nb_vertices;
+            normals = new Int16Array(buffer, offset, 3 * nb_vertices);
+            offset += 6 * nb_vertices;
+        } else {
+            positions = new Float32Array(buffer, offset, 3 * nb_vertices);
+            offset += 12 * nb_vertices;
+            normals = new Float32Array(buffer, offset, 3 * nb_vertices);
+            offset += 12 * nb_vertices;
+        }
+        indices = new Uint32Array(buffer, offset, nb_indices);
+
+        var geometry = new THREE.Geometry();
+        var vertices = geometry.vertices;
+        var vertex_normals = new Array(nb_vertices);
+        var i, j;
+        for (i = 0, j = 0; i < nb_vertices; i++, j += 3) {
+            vertices.push(new THREE.Vector3(origin[0] + positions[j] * step[0],
+                                            origin[1] + positions[j + 1] * step[1],
+                                            origin[2] + positions[j + 2] * step[2]));
+            vertex_normals[i] = new THREE.Vector3(normals[j] * normal_scale,
+                                                  normals[j + 1] * normal_scale,
+                                                  normals[j + 2] * normal_scale);
+        }
+        var faces = geometry.faces;
+        var a, b, c;
+        for (i = 0; i < nb_indices; i += 3) {
+            a = indices[i];
+            b = indices[i + 1];
+            c = indices[i + 2];
+            faces.push(new THREE.Face3(a, b, c,
+                [vertex_normals[a], vertex_normals[b], vertex_normals[c]]));
+        }
+        return {geometry: geometry, color: color};
+    },
+
+    /**
+     * Downloads the mesh at *url* and calls *onLoad* with the result of
+     * parse (or null if the mesh is not available).
+     */
+    fetch: function (url, onLoad) {
+        var self = this;
+        var xhr = new XMLHttpRequest();
+        xhr.open("GET", url, true);
+        xhr.responseType = "arraybuffer";
+        xhr.onload = function (e) {
+            onLoad(xhr.status === 200 ? self.parse(xhr.response) : null);
+        };
+        xhr.onerror = function (e) {
+            onLoad(null);
+        };
+        xhr.send();
+    },
+
+    /**
+     * Loads the meshes *meshes* (a list of {url, name, levels}) and calls
+     * *onComplete* once all meshes are loaded.
+     *
+     * Like the legacy javascript geometries, a mesh and its material
+     * are set as the global variables *name* and "material_for" + *name*.
+     * Only the coarsest level of a mesh is loaded, the geometry has
+     * a *lod* attribute ({mesh, level}) used to load the finer levels.
+     */
+    load: function (meshes, onComplete) {
+        var self = this;
+        var remaining = meshes.length;
+        if (remaining === 0) {
+            onComplete();
+            return;
+        }
+        $.each(meshes, function (index, mesh) {
+            var url = mesh.levels ? mesh.levels[0].url : mesh.url;
+            self.fetch(url, function (result) {
+                var material = new THREE.MeshBasicMaterial({opacity: self.OPACITY,
+                    shading: THREE.SmoothShading});
+                if (result !== null) {
+                    if (result.color !== null) {
+                        material.color.setRGB(result.color[0], result.color[1],
+                                              result.color[2]);
+                    }
+                    window[mesh.name] = result.geometry;
+                    if (mesh.levels) {
+                        result.geometry.lod = {mesh: mesh, level: 0};
+                    }
+                } else {
+                    window[mesh.name] = new THREE.Geometry();
+                }
+                window["material_for" + mesh.name] = material;
+                remaining--;
+                if (remaining === 0) {
+                    onComplete();
+                }
+            });
+        });
+    },
+
+    /**
+     * Returns true if a finer level of *lod* ({mesh, level}) is available.
+     */
+    can_refine: function (lod) {
+        return lod.level + 1 < lod.mesh.levels.length;
+    },
+
+    /**
+     * Loads the next level of *lod* ({mesh, level}) and calls *onLoad* with
+     * the new geometry (or null if it can not be loaded).
+     */
+    refine: function (lod, onLoad) {
+        var level = lod.level + 1;
+        this.fetch(lod.mesh.levels[level].url, function (result) {
+            if (result === null) {
+                onLoad(null);
+                return;
+            }
+            result.geometry.lod = {mesh: lod.mesh, level: level};
+            onLoad(result.geometry);
+        });
+    }
+};
@@ -14,6 +14,10 @@ jQuery.cachedScript = function(url, success, options) {
 jQuery.getScripts = function(scripts, onComplete) {
     var i = 1;
     var ii = scripts.length;
+    if (ii === 0) {
+        onComplete();
+        return;
+    }
     var onScriptLoaded = function(data, response) { if (i++ == ii) onComplete(); } ;
     for(var s in scripts) { $.cachedScript(scripts[s], onScriptLoaded); } ;
 };
@@ -96,6 +100,11 @@ View3D.prototype = {
 
     constructor: View3D,
 
+    // minimal apparent size (radius / distance) of a refined mesh
+    REFINE_MIN_SIZE: 0.02,
+    // delay (in milliseconds) between two refinements
+    REFINE_DELAY: 250,
+
     menu: window.menu || null,
     part_to_object : window.part_to_object || {},
     part_to_parts : window.part_to_parts || {},
@@ -176,7 +185,18 @@ View3D.prototype = {
             xhr.send();
         }
         else {
-            jQuery.getScripts(self.js_files, function (){
+            // legacy geometries are javascript files (urls),
+            // binary meshes are objects {url, name}
+            var scripts = [], meshes = [];
+            $.each(self.js_files, function (index, f) {
+                (typeof f === "string" ? scripts : meshes).push(f);
+            });
+            var remaining = 2;
+            var onComplete = function (){
+                remaining--;
+                if (remaining > 0) {
+                    return;
+                }
                 build_tree();
                 self.menu =  window.menu;
                 self.part_to_object = window.part_to_object || {};
@@ -185,7 +205,9 @@ View3D.prototype = {
                 self.init();
                 $("#main_content").hideLoading();
                 self.animate();
-            });
+            };
+            jQuery.getScripts(scripts, onComplete);
+            MeshLoader.load(meshes, onComplete);
         }
 
     },
@@ -230,14 +252,22 @@ View3D.prototype = {
             scene.add( light );
 
             this.center_object(this.object3D);
+            // occurrences of a geometry share the same geometry
+            var geometries = {};
             for (var i=0; i < this.object3D.children.length; i++) {
                 var obj = this.object3D.children[i];
-                var geo = THREE.GeometryUtils.clone(obj.geometry);
-                obj.geometry.deallocate();
+                // levels of detail of a binary mesh (see mesh.js)
+                obj.lod = obj.geometry.lod;
+                var geo = geometries[obj.geometry.id];
+                if (geo === undefined) {
+                    geo = THREE.GeometryUtils.clone(obj.geometry);
+                    geometries[obj.geometry.id] = geo;
+                    obj.geometry.deallocate();
+                    geo.computeBoundingSphere();
+                    geo.computeCentroids();
+                    geo.computeFaceNormals();
+                }
                 delete obj.geometry;
-                geo.computeBoundingSphere();
-                geo.computeCentroids();
-                geo.computeFaceNormals();
                 obj.receiveShadow=true;
                 obj.castShadow=true;
                 var color = obj.material.color.getHex();
@@ -490,42 +520,141 @@ View3D.prototype = {
     animate : function() {
         var self = this;
         var main = $("#main_content");
+        var last_refine = 0;
         anim = function (){
             requestAnimationFrame(anim);
             self.controls.update();
             self.spot1_controls.update();
             self.spot2_controls.update();
             self.renderer.render( self.scene, self.camera );
+            var now = Date.now();
+            if (now - last_refine > self.REFINE_DELAY) {
+                last_refine = now;
+                self.refine();
+            }
         }
         anim();
     },
 
+    /**
+     * Loads the next level of detail of the visible mesh which looks the
+     * largest on screen. Meshes are refined one at a time so that the
+     * view remains responsive.
+     */
+    refine : function() {
+        if (this.refining) {
+            return;
+        }
+        var camera = this.camera;
+        var matrix = new THREE.Matrix4();
+        var frustum = new THREE.Frustum();
+        matrix.multiply(camera.projectionMatrix, camera.matrixWorldInverse);
+        frustum.setFromMatrix(matrix);
+        var best = null;
+        var best_size = this.REFINE_MIN_SIZE;
+        var children = this.object3D.children;
+        for (var i=0; i < children.length; i++) {
+            var obj = children[i];
+            if (!obj.lod || !obj.visible || !MeshLoader.can_refine(obj.lod)
+                || !frustum.contains(obj)) {
+                continue;
+            }
+            var distance = obj.matrixWorld.getPosition().distanceTo(camera.position);
+            var size = obj.geometry.boundingSphere.radius * obj.matrixWorld.getMaxScaleOnAxis()
+                / Math.max(distance, 1e-6);
+            if (size > best_size) {
+                best = obj;
+                best_size = size;
+            }
+        }
+        if (best === null) {
+            return;
+        }
+        var self = this;
+        var mesh = best.lod.mesh;
+        this.refining = true;
+        MeshLoader.refine(best.lod, function (geometry) {
+            self.refining = false;
+            self.replace_geometry(mesh, geometry);
+        });
+    },
+
+    /**
+     * Replaces the geometry of all objects displaying *mesh* by *geometry*
+     * (a finer level of detail). If *geometry* is null, *mesh* is not
+     * refined anymore.
+     */
+    replace_geometry : function(mesh, geometry) {
+        var children = this.object3D.children.slice();
+        if (geometry !== null) {
+            geometry.computeBoundingSphere();
+            geometry.computeCentroids();
+            geometry.computeFaceNormals();
+        }
+        for (var i=0; i < children.length; i++) {
+            var obj = children[i];
+            if (!obj.lod || obj.lod.mesh !== mesh) {
+                continue;
+            }
+            if (geometry === null) {
+                obj.lod = null;
+                continue;
+            }
+            // a new object is created since the renderer does not
+            // update the buffers of an object whose geometry is changed
+            var replacement = new THREE.Mesh(geometry, obj.material);
+            replacement.matrix.copy(obj.matrix);
+            replacement.matrixAutoUpdate = false;
+            replacement.part = obj.part;
+            replacement.visible = obj.visible;
+            replacement.castShadow = obj.castShadow;
+            replacement.receiveShadow = obj.receiveShadow;
+            replacement.lod = geometry.lod;
+            this.object3D.remove(obj);
+            this.object3D.add(replacement);
+            obj.geometry.deallocate();
+            var part = "part" + obj.part;
+            if (this.part_to_object[part] === obj) {
+                this.part_to_object[part] = replacement;
+            }
+        }
+    },
+
 
     computeGroupBoundingBox : function(Object_Group) {   
         var boundingBox;
         for ( var v = 0 ;v  < Object_Group.children.length; v ++ ) {
-            var geo=THREE.GeometryUtils.clone(Object_Group.children[v].geometry);
-            geo.applyMatrix(Object_Group.children[v].matrix);
-            geo.computeBoundingBox();
-            BB=geo.boundingBox;
-            if (BB){    
+            var obj = Object_Group.children[v];
+            // the box of a geometry is computed once for all its
+            // occurrences, its corners are transformed by each occurrence
+            if (!obj.geometry.boundingBox) {
+                obj.geometry.computeBoundingBox();
+            }
+            var BB = obj.geometry.boundingBox;
+            if (!BB || obj.geometry.vertices.length === 0) {
+                continue;
+            }
+            for (var c = 0; c < 8; c++) {
+                var corner = obj.matrix.multiplyVector3(new THREE.Vector3(
+                    (c & 1) ? BB.max.x : BB.min.x,
+                    (c & 2) ? BB.max.y : BB.min.y,
+                    (c & 4) ? BB.max.z : BB.min.z));
                 if(!boundingBox){
                     boundingBox= { 
-                        'x':[BB.min.x, BB.max.x],
-                        'y':[BB.min.y, BB.max.y],
-                        'z':[BB.min.z, BB.max.z]
+                        'x':[corner.x, corner.x],
+                        'y':[corner.y, corner.y],
+                        'z':[corner.z, corner.z]
                     }; 
                 }
                 else{
-                    boundingBox.x[0]=Math.min(BB.min.x, boundingBox.x[0]);
-                    boundingBox.y[0]=Math.min(BB.min.y, boundingBox.y[0]);
-                    boundingBox.z[0]=Math.min(BB.min.z, boundingBox.z[0]);
-                    boundingBox.x[1]=Math.max(BB.max.x, boundingBox.x[1]);
-                    boundingBox.y[1]=Math.max(BB.max.y, boundingBox.y[1]);
-                    boundingBox.z[1]=Math.max(BB.max.z, boundingBox.z[1]);
+                    boundingBox.x[0]=Math.min(corner.x, boundingBox.x[0]);
+                    boundingBox.y[0]=Math.min(corner.y, boundingBox.y[0]);
+                    boundingBox.z[0]=Math.min(corner.z, boundingBox.z[0]);
+                    boundingBox.x[1]=Math.max(corner.x, boundingBox.x[1]);
+                    boundingBox.y[1]=Math.max(corner.y, boundingBox.y[1]);
+                    boundingBox.z[1]=Math.max(corner.z, boundingBox.z[1]);
                 }
-            }   
-            geo.deallocate();
+            }
         }
         return boundingBox;
     },
@@ -0,0 +1,194 @@
+"""
+Cache of recomposed STEP files.
+
+Downloading a decomposed STEP file runs :file:`generateComposition.py`
+which rebuilds the file from the STEP files of the decomposition
+(see :meth:`.Document3D.recompose_step_file`). The result only depends
+on the product tree and on the contributing files, so it is stored in the
+``STEP_CACHE_DIR`` directory (default: a directory of the system temporary
+directory). This directory must not be publicly served (``MEDIA_ROOT``).
+
+An entry is identified by the id of the recomposed :class:`.DocumentFile`
+and a digest of the product tree (locations included) and of the id,
+revision, size and modification time of each contributing file. A file
+listing the ids of the contributing files is stored next to each entry
+so that :func:`invalidate` can delete the entries which depend on a
+checked-in or decomposed file.
+
+The total size of cached files is bounded by the ``STEP_CACHE_SIZE``
+setting (in bytes), the least recently used entries are deleted first.
+"""
+
+import os
+import json
+import errno
+import shutil
+import hashlib
+import tempfile
+from collections import namedtuple
+
+from django.conf import settings
+
+import openPLM.plmapp.models as pmodels
+
+#: default value of the ``STEP_CACHE_SIZE`` setting (1 Gio)
+DEFAULT_CACHE_SIZE = 1024 * 1024 * 1024
+
+#: extension of the files which list the contributing files of an entry
+IDS_EXT = ".ids"
+
+#: prefix of partially written entries
+TMP_PREFIX = ".tmp"
+
+#: A cache entry: *path* of the recomposed file and *file_ids*, the ids
+#: of the contributing :class:`.DocumentFile`
+Entry = namedtuple("Entry", "path file_ids")
+
+def get_cache_dir():
+    # not in MEDIA_ROOT: recomposed files must not be publicly served
+    return getattr(settings, "STEP_CACHE_DIR",
+            os.path.join(tempfile.gettempdir(), "openPLM_step_cache"))
+
+def get_cache_size():
+    return getattr(settings, "STEP_CACHE_SIZE", DEFAULT_CACHE_SIZE)
+
+def get_contributing_files(product):
+    """
+    Returns a dictionary (doc_file id -> path) of all STEP files
+    contributing to *product*.
+    """
+    files = {}
+    products = [product]
+    while products:
+        prod = products.pop()
+        files[prod.doc_id] = prod.doc_path
+        products.extend(link.product for link in prod.links)
+    return files
+
+def get_entry(doc_file, product):
+    """
+    Returns the :class:`Entry` of the recomposition of *product*
+    (the complete product of *doc_file*).
+    """
+    files = get_contributing_files(product)
+    revisions = dict(pmodels.DocumentFile.objects.filter(id__in=files.keys())\
+            .values_list("id", "revision"))
+    sha = hashlib.sha1(json.dumps(product.to_list(), sort_keys=True))
+    for doc_id, path in sorted(files.iteritems()):
+        try:
+            st = os.stat(path)
+            size, mtime = st.st_size, st.st_mtime
+        except (OSError, TypeError):
+            size = mtime = None
+        sha.update("%s:%s:%s:%s;" % (doc_id, revisions.get(doc_id), size, mtime))
+    name = "%d-%s.stp" % (doc_file.id, sha.hexdigest())
+    return Entry(os.path.join(get_cache_dir(), name), sorted(files))
+
+def get(entry):
+    """
+    Returns a tuple (opened file, size) of the cached *entry* or None
+    if it is not cached.
+    """
+    try:
+        f = open(entry.path, "rb")
+    except IOError:
+        return None
+    try:
+        os.utime(entry.path, None)
+    except OSError:
+        pass
+    return f, os.fstat(f.fileno()).st_size
+
+def store(entry, path):
+    """
+    Stores a copy of the recomposed file *path* as *entry*.
+    """
+    directory = os.path.dirname(entry.path)
+    try:
+        os.makedirs(directory)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    with open(entry.path[:-4] + IDS_EXT, "w") as f:
+        f.write(" ".join(str(i) for i in entry.file_ids))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=TMP_PREFIX)
+    try:
+        with os.fdopen(fd, "wb") as dst:
+            with open(path, "rb") as src:
+                shutil.copyfileobj(src, dst)
+        # an entry is never partially visible
+        os.rename(tmp, entry.path)
+    except:
+        os.remove(tmp)
+        raise
+    evict()
+
+def _remove(stp_path):
+    for path in (stp_path, stp_path[:-4] + IDS_EXT):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _list_entries(directory):
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    return [os.path.join(directory, name) for name in names
+            if name.endswith(".stp") and not name.startswith(TMP_PREFIX)]
+
+def invalidate(doc_file_ids):
+    """
+    Deletes the cached entries of the files of *doc_file_ids* and the
+    entries to which one of these files contributes.
+
+    Returns the number of deleted entries.
+    """
+    doc_file_ids = set(int(i) for i in doc_file_ids)
+    count = 0
+    for stp_path in _list_entries(get_cache_dir()):
+        root = int(os.path.basename(stp_path).split("-", 1)[0])
+        stale = root in doc_file_ids
+        if not stale:
+            try:
+                with open(stp_path[:-4] + IDS_EXT) as f:
+                    ids = set(int(i) for i in f.read().split())
+            except (IOError, ValueError):
+                ids = None
+            stale = ids is None or bool(ids & doc_file_ids)
+        if stale:
+            _remove(stp_path)
+            count += 1
+    return count
+
+def evict(max_size=None):
+    """
+    Deletes the least recently used entries if the total size of cached
+    files exceeds *max_size* (default: ``STEP_CACHE_SIZE``)
+    so that it is reduced to 90% of *max_size*.
+
+    Returns the number of deleted entries.
+    """
+    max_size = get_cache_size() if max_size is None else max_size
+    entries = []
+    total = 0
+    for stp_path in _list_entries(get_cache_dir()):
+        try:
+            st = os.stat(stp_path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, stp_path))
+        total += st.st_size
+    if total <= max_size:
+        return 0
+    excess = total - int(max_size * 0.9)
+    entries.sort()
+    count = 0
+    for mtime, size, stp_path in entries:
+        if excess <= 0:
+            break
+        _remove(stp_path)
+        excess -= size
+        count += 1
+    return count
@@ -2,5 +2,9 @@ from openPLM.apps.document3D.tests.views import *
 from openPLM.apps.document3D.tests.arborescense import *
 from openPLM.apps.document3D.tests.decomposer import *
 from openPLM.apps.document3D.tests.assembly import *
+from openPLM.apps.document3D.tests.stepcache import *
 
 
+from openPLM.apps.document3D.tests.part21 import *
+from openPLM.apps.document3D.tests.binmesh import *
+from openPLM.apps.document3D.tests.conversion import *
@@ -1,5 +1,12 @@
+import json
+import re
+
+from django.test import SimpleTestCase
 from openPLM.plmapp.tests.views import CommonViewTest
 from openPLM.apps.document3D.models import  Document3DController, Document3D
+from openPLM.apps.document3D.arborescense import JSGenerator
+from openPLM.apps.document3D.classes import (Product, Link,
+        TransformationMatrix, IDENTITY)
 from django.core.files import File 
 from openPLM.apps.document3D.tests.views import decomposition_fromPOST_data
 class arborescense_Test(CommonViewTest):
@@ -64,3 +71,59 @@ def same_structure(product,product2):
     return True
         
 
+
+
+def translation(x, y, z):
+    return TransformationMatrix((1, 0, 0, x, 0, 1, 0, y, 0, 0, 1, z))
+
+
+class JSGeneratorTestCase(SimpleTestCase):
+
+    def get_instances(self, product):
+        js = JSGenerator(product).get_js()
+        calls = re.findall(r"^add_instances\((.*)\);$", js, re.M)
+        self.assertEqual(1, len(calls))
+        return json.loads(calls[0])
+
+    def test_multiply(self):
+        rotation = TransformationMatrix((0, -1, 0, 0, 1, 0, 0, 0, 0, 0, 1, 0))
+        m = translation(1, 2, 3).multiply(rotation)
+        self.assertEqual([0, -1, 0, 1, 1, 0, 0, 2, 0, 0, 1, 3], m.to_array())
+        m = rotation.multiply(translation(1, 2, 3))
+        self.assertEqual([0, -1, 0, -2, 1, 0, 0, 1, 0, 0, 1, 3], m.to_array())
+        self.assertEqual(m.to_array(), IDENTITY.multiply(m).to_array())
+
+    def test_single_shape(self):
+        product = Product("bolt", 0, False, 5, 1, geometry=1)
+        self.assertEqual([["_1_5", [[0, IDENTITY.to_array()]]]],
+                self.get_instances(product))
+
+    def test_repeated_geometry(self):
+        # an assembly of two sub-assemblies, each one with three screws
+        screw = Product("screw", 2, False, 5, 3, geometry=1)
+        plate = Product("plate", 2, False, 5, 4, geometry=2)
+        sub = Product("sub", 1, False, 5, 2)
+        link = Link(screw)
+        for i in range(3):
+            link.add_occurrence("s%d" % i, translation(i, 0, 0))
+        sub.links.append(link)
+        link = Link(plate)
+        link.add_occurrence("p", IDENTITY)
+        sub.links.append(link)
+        root = Product("root", 0, False, 5, 1)
+        link = Link(sub)
+        for i in range(2):
+            link.add_occurrence("sub%d" % i, translation(0, 10 * i, 0))
+        root.links.append(link)
+
+        instances = self.get_instances(root)
+        # each geometry is referenced once
+        self.assertEqual(["_1_5", "_2_5"], [name for name, occ in instances])
+        screws = instances[0][1]
+        self.assertEqual(6, len(screws))
+        positions = set((m[3], m[7], m[11]) for part, m in screws)
+        self.assertEqual(set((i, 10 * j, 0) for i in range(3) for j in range(2)),
+                positions)
+        # all occurrences are distinct parts of the menu
+        parts = [part for name, occ in instances for part, m in occ]
+        self.assertEqual(8, len(set(parts)))
@@ -1,5 +1,7 @@
 import os.path
 import copy
+import shutil
+from datetime import timedelta
 from django.test import TransactionTestCase
 
 from openPLM.plmapp.controllers import PartController
@@ -764,3 +766,34 @@ class AssemblyBuilderTestCase(BaseTestCase, TransactionTestCase):
                 self.assertEqual(2, f.revision)
         # check product is valid
         self.assertProduct(ctrl)
+
+    def test_update_error_content_addressed(self):
+        self.addCleanup(shutil.rmtree,
+                models.docfs.path(models.docfs.BLOBS_DIR), True)
+        with self.settings(DOCUMENTS_CONTENT_ADDRESSED=True):
+            ctrl = self.create("d1", "Document3D")
+            natives = get_natives("test.native_asm", "NBA_ASM.native_asm",
+                    "NUT.native", "BOLT.native", "L-BRACKET.native")
+            steps = get_steps("bolt.step", "l-bracket.step", "nut.step")
+            builder = AssemblyBuilder(ctrl)
+            builder.build_assembly(_ASSEMBLY1, natives, steps, False)
+            stp = ctrl.files.filter(is_stp)[0]
+            name = stp.file.name
+            self.assertTrue(name.startswith(models.docfs.BLOBS_DIR))
+            refcount = models.DocumentBlob.objects.get(name=name).refcount
+
+            # the native file of the root is missing: the decomposed step
+            # file, which shares its blob with the previous revision,
+            # is checked-in before the error
+            tree = copy.deepcopy(_UPDATED_ASSEMBLY1)
+            natives = get_natives("NBA_ASM.native_asm", "NUT.native",
+                    "BOLT.native", "L-BRACKET.native")
+            steps = get_steps("bolt.step", "l-bracket.step", "nut.step")
+            builder = AssemblyBuilder(ctrl)
+            self.assertRaises(KeyError, builder.update_assembly, tree,
+                    natives, steps)
+            self.assertEqual(refcount,
+                    models.DocumentBlob.objects.get(name=name).refcount)
+            models.docfs.collect_garbage(grace=timedelta(0))
+            self.assertTrue(os.path.exists(models.docfs.path(name)))
+            self.assertProduct(ctrl)
@@ -0,0 +1,149 @@
+"""
+This module contains tests of the binary meshes (:mod:`.binmesh`).
+"""
+
+import os
+import math
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from django.test import SimpleTestCase
+
+from openPLM.apps.document3D import binmesh
+from openPLM.apps.document3D.binmesh import Mesh, MeshError, HEADER_SIZE
+
+# statements written by the previous javascript format
+LEGACY_VERTEX = "%s.vertices.push(new THREE.Vector3(%.4f,%.4f,%.4f));\n"
+LEGACY_FACE = "%s.faces.push( new THREE.Face3( %i, %i, %i, [ new THREE.Vector3( %.4f, %.4f, %.4f ), new THREE.Vector3( %.4f, %.4f, %.4f ), new THREE.Vector3( %.4f, %.4f, %.4f ) ]  ) );\n"
+
+def make_sphere(rings=40, segments=80, radius=123.456):
+    """
+    Returns a list of triangles (p1, p2, p3, n1, n2, n3) of a sphere.
+    """
+    def point(i, j):
+        theta = math.pi * i / rings
+        phi = 2 * math.pi * (j % segments) / segments
+        n = (math.sin(theta) * math.cos(phi), math.sin(theta) * math.sin(phi),
+                math.cos(theta))
+        return tuple(radius * x for x in n), n
+    triangles = []
+    for i in xrange(rings):
+        for j in xrange(segments):
+            (p1, n1), (p2, n2) = point(i, j), point(i + 1, j)
+            (p3, n3), (p4, n4) = point(i + 1, j + 1), point(i, j + 1)
+            triangles.append((p1, p2, p3, n1, n2, n3))
+            triangles.append((p1, p3, p4, n1, n3, n4))
+    return triangles
+
+
+class BinMeshTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.triangles = make_sphere()
+        self.mesh = Mesh((0.5, 0.25, 1.))
+        for triangle in self.triangles:
+            self.mesh.add_triangle(*triangle)
+
+    def write(self, mesh, quantize=False):
+        f = StringIO()
+        mesh.write(f, quantize)
+        return f.getvalue()
+
+    def test_deduplication(self):
+        self.assertEqual(len(self.triangles), self.mesh.triangle_count)
+        vertices = set()
+        for p1, p2, p3, n1, n2, n3 in self.triangles:
+            vertices.update(((p1, n1), (p2, n2), (p3, n3)))
+        self.assertEqual(len(vertices), self.mesh.vertex_count)
+        # a vertex is shared by up to 6 triangles
+        self.assertTrue(self.mesh.vertex_count < len(self.triangles))
+
+    def test_write_read(self):
+        data = self.write(self.mesh)
+        size = HEADER_SIZE + 24 * self.mesh.vertex_count + 4 * len(self.mesh.indices)
+        self.assertEqual(size, len(data))
+        mesh = Mesh.read(StringIO(data))
+        self.assertEqual((0.5, 0.25, 1.), mesh.color)
+        self.assertEqual(list(self.mesh.positions), list(mesh.positions))
+        self.assertEqual(list(self.mesh.normals), list(mesh.normals))
+        self.assertEqual(list(self.mesh.indices), list(mesh.indices))
+
+    def test_write_read_quantized(self):
+        data = self.write(self.mesh, True)
+        size = HEADER_SIZE + 12 * self.mesh.vertex_count + 4 * len(self.mesh.indices)
+        self.assertEqual(size, len(data))
+        mesh = Mesh.read(StringIO(data))
+        self.assertEqual(list(self.mesh.indices), list(mesh.indices))
+        # error lower than a step
+        step = 2 * 123.456 / 65535
+        for a, b in zip(self.mesh.positions, mesh.positions):
+            self.assertTrue(abs(a - b) <= step, (a, b))
+        for a, b in zip(self.mesh.normals, mesh.normals):
+            self.assertTrue(abs(a - b) <= 1. / 32767, (a, b))
+
+    def test_no_color(self):
+        mesh = Mesh()
+        mesh.add_triangle((0., 0., 0.), (1., 0., 0.), (0., 1., 0.),
+                (0., 0., 1.), (0., 0., 1.), (0., 0., 1.))
+        mesh = Mesh.read(StringIO(self.write(mesh, True)))
+        self.assertEqual(None, mesh.color)
+        # a flat mesh: the step of the z axis is not null
+        self.assertEqual([0., 0., 0., 1., 0., 0., 0., 1., 0.], list(mesh.positions))
+
+    def test_read_invalid(self):
+        self.assertRaises(MeshError, Mesh.read, StringIO("not a mesh"))
+        self.assertRaises(MeshError, Mesh.read, StringIO("x" * HEADER_SIZE))
+        data = self.write(self.mesh)
+        self.assertRaises(MeshError, Mesh.read, StringIO(data[:-1]))
+
+    def test_size(self):
+        # the binary format must be at least ten times smaller than
+        # the legacy javascript format
+        js = []
+        name = "_1_1"
+        for x, y, z in zip(*[iter(self.mesh.positions)] * 3):
+            js.append(LEGACY_VERTEX % (name, x, y, z))
+        for (i1, i2, i3), (p1, p2, p3, n1, n2, n3) in zip(
+                zip(*[iter(self.mesh.indices)] * 3), self.triangles):
+            js.append(LEGACY_FACE % ((name, i1, i2, i3) + n1 + n2 + n3))
+        js_size = len("".join(js))
+        self.assertTrue(js_size > 10 * len(self.write(self.mesh, True)))
+        self.assertTrue(js_size > 5 * len(self.write(self.mesh)))
+
+
+class LevelOfDetailTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "abc-def.mesh")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_level_path(self):
+        self.assertEqual(self.path, binmesh.get_level_path(self.path, "fine"))
+        self.assertEqual(os.path.join(self.directory, "abc-def.coarse.mesh"),
+                binmesh.get_level_path(self.path, "coarse"))
+        files = binmesh.get_level_files(self.path)
+        self.assertEqual(3, len(files))
+        self.assertFalse(self.path in files)
+        self.assertTrue(binmesh.get_manifest_path(self.path) in files)
+
+    def test_write_read_manifest(self):
+        levels = [("coarse", 12), ("fine", 240)]
+        binmesh.write_manifest(self.path, levels, ((0, 1, 2), (3, 4, 5)))
+        manifest = binmesh.read_manifest(self.path)
+        self.assertEqual(levels, [(l["level"], l["triangles"])
+            for l in manifest["levels"]])
+        self.assertEqual([[0, 1, 2], [3, 4, 5]], manifest["bounds"])
+
+    def test_read_manifest_invalid(self):
+        # legacy mesh
+        self.assertEqual(None, binmesh.read_manifest(self.path))
+        with open(binmesh.get_manifest_path(self.path), "w") as f:
+            f.write("{invalid")
+        self.assertEqual(None, binmesh.read_manifest(self.path))
+        # the fine mesh must be listed
+        binmesh.write_manifest(self.path, [("coarse", 12)], ((0, 0, 0), (1, 1, 1)))
+        self.assertEqual(None, binmesh.read_manifest(self.path))
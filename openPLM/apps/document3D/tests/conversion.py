@@ -0,0 +1,97 @@
+"""
+This module contains tests of the conversion of STEP files
+(parallel meshing and progress reporting).
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+
+from django.test import SimpleTestCase
+
+from openPLM.apps.document3D.binmesh import Mesh, read_manifest, get_level_path
+from openPLM.apps.document3D.models import wait_for_process
+from openPLM.apps.document3D.STP_converter_WebGL import StepImporter
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data_test")
+
+SCRIPT = """
+import sys, time
+for i in range(1, 4):
+    sys.stdout.write("PROGRESS:%d/3\\n" % i)
+    sys.stdout.flush()
+    time.sleep(0.2)
+print "GEO:a.mesh , 1"
+sys.exit(2)
+"""
+
+
+class WaitForProcessTestCase(SimpleTestCase):
+
+    def test_progress(self):
+        output = tempfile.NamedTemporaryFile()
+        process = subprocess.Popen([sys.executable, "-c", SCRIPT],
+                stdout=output.fileno())
+        reports = []
+        status = wait_for_process(process, output.name,
+                lambda current, total: reports.append((current, total)), 0.05)
+        self.assertEqual(2, status)
+        self.assertEqual([(1, 3), (2, 3), (3, 3)], reports)
+        # the output is still readable by generate_relations_BD
+        output.seek(0)
+        self.assertEqual("GEO:a.mesh , 1\n", output.readlines()[-1])
+        output.close()
+
+
+class ParallelMeshTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def compute(self, workers):
+        importer = StepImporter(os.path.join(DATA_PATH, "test.stp"), 12)
+        root = os.path.join(self.directory, str(workers)) + "/"
+        pov_dir = tempfile.mkdtemp(dir=self.directory)
+        reports = []
+        index = importer.compute_geometries(root, pov_dir, workers=workers,
+                progress=lambda current, total: reports.append((current, total)))
+        meshes = []
+        for line in index.splitlines():
+            path, number = line[len("GEO:"):].split(" , ")
+            with open(os.path.join(root, path), "rb") as f:
+                meshes.append((number, Mesh.read(f).triangle_count))
+        return meshes, reports, importer.povs
+
+    def test_compute_geometries(self):
+        meshes, reports, povs = self.compute(1)
+        self.assertEqual(["1", "2", "3"], [n for n, m in meshes])
+        self.assertEqual([(1, 3), (2, 3), (3, 3)], reports)
+        # results are collected in order
+        meshes2, reports2, povs2 = self.compute(3)
+        self.assertEqual(meshes, meshes2)
+        self.assertEqual(reports, reports2)
+        self.assertEqual([identifier for name, identifier in povs],
+                         [identifier for name, identifier in povs2])
+
+    def test_levels_of_detail(self):
+        importer = StepImporter(os.path.join(DATA_PATH, "test.stp"), 12)
+        root = self.directory + "/"
+        index = importer.compute_geometries(root, self.directory)
+        for line in index.splitlines():
+            path = os.path.join(root, line[len("GEO:"):].split(" , ")[0])
+            manifest = read_manifest(path)
+            levels = manifest["levels"]
+            self.assertEqual("fine", levels[-1]["level"])
+            counts = []
+            for level in levels:
+                with open(get_level_path(path, level["level"]), "rb") as f:
+                    mesh = Mesh.read(f)
+                self.assertEqual(level["triangles"], mesh.triangle_count)
+                counts.append(mesh.triangle_count)
+            # each level is lighter than the next one
+            self.assertEqual(sorted(set(counts)), counts)
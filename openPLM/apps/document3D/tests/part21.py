@@ -0,0 +1,101 @@
+"""
+This module contains tests of the streaming Part 21 reader
+(:mod:`.part21_stream`) and measures its throughput on the
+files of :file:`data_test`.
+"""
+
+import os
+import glob
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from openPLM.apps.document3D import part21_stream as p21
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data_test")
+
+def get_step_files():
+    return sorted(path for path in glob.glob(os.path.join(DATA_PATH, "*.st*"))
+            if "false" not in path)
+
+
+class Part21StreamTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def get_step(self, data):
+        path = os.path.join(self.tmp_dir, "f.stp")
+        with open(path, "w") as f:
+            f.write("ISO-10303-21;\nHEADER;\nFILE_DESCRIPTION(('a;b'),'2;1');\n"
+                    "ENDSEC;\nDATA;\n%sENDSEC;\nEND-ISO-10303-21;\n" % data)
+        return path
+
+    def test_iter_entities(self):
+        path = self.get_step("#1=PRODUCT('a;)','b''c',$,(#2));\n"
+                "/* comment */ #2=A(\n 1.,\n #1);\n"
+                "#3=(B(#1)C());\n")
+        entities = list(p21.iter_entities(path))
+        self.assertEqual([
+            (1, "PRODUCT", "'a;)','b''c',$,(#2)"),
+            (2, "A", "\n 1.,\n #1"),
+            (3, None, "B(#1)C()"),
+            ], entities)
+
+    def test_iter_entities_empty(self):
+        path = os.path.join(self.tmp_dir, "empty.stp")
+        open(path, "w").close()
+        self.assertEqual([], list(p21.iter_entities(path)))
+
+    def test_unterminated_string(self):
+        path = self.get_step("#1=PRODUCT('a);\n")
+        self.assertRaises(p21.StepError, list, p21.iter_entities(path))
+
+    def test_parse_entities(self):
+        self.assertEqual([3, 4], p21.parse_entities("'#12',#3,(#4)"))
+
+    def test_index_single_product(self):
+        index = p21.read_index(os.path.join(DATA_PATH, "bolt.step"))
+        self.assertEqual(325, index.count)
+        self.assertEqual(325, index.max_id)
+        self.assertEqual([], index.assemblies)
+        self.assertEqual(59, index.root)
+
+    def test_index_assembly(self):
+        index = p21.read_index(os.path.join(DATA_PATH, "test.stp"))
+        self.assertEqual(1633, index.count)
+        self.assertEqual(6, len(index.assemblies))
+        self.assertEqual(1607, index.root)
+
+    def test_index_no_product(self):
+        index = p21.read_index(os.path.join(DATA_PATH, "stp_false.stp"))
+        self.assertEqual(0, index.count)
+        self.assertRaises(p21.StepError, getattr, index, "root")
+
+    def test_index_several_roots(self):
+        path = self.get_step("#1=NEXT_ASSEMBLY_USAGE_OCCURRENCE('','','',#2,#3,$);\n"
+                "#4=NEXT_ASSEMBLY_USAGE_OCCURRENCE('','','',#5,#6,$);\n")
+        index = p21.read_index(path)
+        self.assertEqual([(2, 3), (5, 6)], index.assemblies)
+        self.assertRaises(p21.StepError, getattr, index, "root")
+
+
+class Part21BenchmarkTestCase(SimpleTestCase):
+
+    #: minimal throughput (in MB/s) when parsing the files of data_test
+    MIN_THROUGHPUT = 1.0
+
+    def test_throughput(self):
+        paths = get_step_files()
+        best = None
+        for i in xrange(3):
+            size, count, elapsed = p21.benchmark(paths, 5)
+            if best is None or elapsed < best:
+                best = elapsed
+        throughput = size / max(best, 1e-6) / 1e6
+        self.assertEqual(5 * 5774, count)
+        self.assertTrue(throughput > self.MIN_THROUGHPUT, throughput)
@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+
+from django.db.models import F
+from django.test.utils import override_settings
+
+import openPLM.plmapp.models as pmodels
+from openPLM.plmapp.tests.base import BaseTestCase
+from openPLM.plmapp.controllers import DocumentController
+from openPLM.apps.document3D import stepcache
+from openPLM.apps.document3D.classes import Product, Link, TransformationMatrix
+
+
+class StepCacheTestCase(BaseTestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings = override_settings(STEP_CACHE_DIR=self.cache_dir)
+        self.settings.enable()
+        super(StepCacheTestCase, self).setUp()
+        doc = DocumentController.create("doc", "Document", "a", self.user, {})
+        self.root = doc.add_file(self.get_file("root.stp", "root"))
+        self.child = doc.add_file(self.get_file("child.stp", "child"))
+        self.product = self.get_product()
+        tmp = tempfile.NamedTemporaryFile(delete=False)
+        tmp.write("recomposed")
+        tmp.close()
+        self.recomposed = tmp.name
+
+    def tearDown(self):
+        super(StepCacheTestCase, self).tearDown()
+        self.settings.disable()
+        shutil.rmtree(self.cache_dir)
+        os.remove(self.recomposed)
+
+    def get_product(self, x=0):
+        product = Product("root", 0, 1, self.root.id, 1, self.root.file.path)
+        child = Product("child", 1, 2, self.child.id, 1, self.child.file.path)
+        link = Link(child)
+        link.add_occurrence("c1", TransformationMatrix([x, 0, 0, 0] * 3))
+        product.links.append(link)
+        return product
+
+    def test_get_store(self):
+        entry = stepcache.get_entry(self.root, self.product)
+        self.assertEqual(None, stepcache.get(entry))
+        self.assertEqual(sorted([self.root.id, self.child.id]), entry.file_ids)
+        stepcache.store(entry, self.recomposed)
+        entry = stepcache.get_entry(self.root, self.get_product())
+        f, size = stepcache.get(entry)
+        self.assertEqual("recomposed", f.read())
+        self.assertEqual(len("recomposed"), size)
+        f.close()
+
+    def test_key(self):
+        entry = stepcache.get_entry(self.root, self.product)
+        # modified location
+        self.assertNotEqual(entry.path,
+                stepcache.get_entry(self.root, self.get_product(1)).path)
+        # new revision of a contributing file
+        pmodels.DocumentFile.objects.filter(id=self.child.id)\
+                .update(revision=F("revision") + 1)
+        self.assertNotEqual(entry.path,
+                stepcache.get_entry(self.root, self.product).path)
+
+    def test_invalidate(self):
+        entry = stepcache.get_entry(self.root, self.product)
+        stepcache.store(entry, self.recomposed)
+        self.assertEqual(0, stepcache.invalidate([self.child.id + 1000]))
+        self.assertTrue(os.path.exists(entry.path))
+        self.assertEqual(1, stepcache.invalidate([self.child.id]))
+        self.assertEqual(None, stepcache.get(entry))
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_evict(self):
+        entry1 = stepcache.get_entry(self.root, self.product)
+        stepcache.store(entry1, self.recomposed)
+        entry2 = stepcache.get_entry(self.root, self.get_product(1))
+        stepcache.store(entry2, self.recomposed)
+        os.utime(entry1.path, (0, 0))
+        self.assertEqual(1, stepcache.evict(len("recomposed")))
+        self.assertFalse(os.path.exists(entry1.path))
+        self.assertTrue(os.path.exists(entry2.path))
@@ -7,6 +7,9 @@ from openPLM.apps.document3D.models import Document3DController
 from openPLM.plmapp.decomposers import DecomposersManager
 from django.core.files import File
 from json import loads
+from StringIO import StringIO
+
+from openPLM.apps.document3D import binmesh
 
 from django.test.utils import override_settings
 
@@ -82,6 +85,66 @@ class view_3dTest(CommonViewTest):
         self.assertFalse(loads(response.context["GeometryFiles"]))
         self.assertTrue(response.context["javascript_arborescense"])
 
+    def test_3D_mesh_file(self):
+        f=open("apps/document3D/data_test/test.stp")
+        myfile = File(f)
+        new_doc_file=self.document.add_file(myfile)
+        response = self.get(self.document.object.plmobject_url+"3D/")
+        geometries = loads(response.context["GeometryFiles"])
+        self.assertEqual(3, len(geometries))
+        names = set()
+        for geometry in geometries:
+            names.add(geometry["name"])
+            response = self.client.get(geometry["url"])
+            self.assertEqual(200, response.status_code)
+            self.assertEqual("application/octet-stream", response["Content-Type"])
+            content = "".join(response.streaming_content)
+            self.assertEqual(int(response["Content-Length"]), len(content))
+            mesh = binmesh.Mesh.read(StringIO(content))
+            self.assertTrue(mesh.triangle_count > 0)
+            self.assertEqual(len(set(mesh.indices)), mesh.vertex_count)
+            # the browser cache is still valid
+            response2 = self.client.get(geometry["url"],
+                    HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(304, response2.status_code)
+        self.assertEqual(set("_%d_%d" % (i, new_doc_file.id) for i in (1, 2, 3)), names)
+
+    def test_3D_mesh_file_levels(self):
+        f=open("apps/document3D/data_test/test.stp")
+        myfile = File(f)
+        new_doc_file=self.document.add_file(myfile)
+        response = self.get(self.document.object.plmobject_url+"3D/")
+        geometries = loads(response.context["GeometryFiles"])
+        for geometry in geometries:
+            if "levels" not in geometry:
+                continue
+            levels = geometry["levels"]
+            self.assertEqual(geometry["url"], levels[-1]["url"])
+            for level in levels:
+                response = self.client.get(level["url"])
+                self.assertEqual(200, response.status_code)
+                content = "".join(response.streaming_content)
+                mesh = binmesh.Mesh.read(StringIO(content))
+                self.assertEqual(level["triangles"], mesh.triangle_count)
+        gf = GeometryFile.objects.filter(stp=new_doc_file)[0]
+        response = self.client.get("/3D/mesh/%d/%d/fine/" % (self.document.id, gf.id))
+        self.assertEqual(404, response.status_code)
+
+    def test_3D_mesh_file_not_readable(self):
+        f=open("apps/document3D/data_test/test.stp")
+        myfile = File(f)
+        new_doc_file=self.document.add_file(myfile)
+        gf = GeometryFile.objects.filter(stp=new_doc_file)[0]
+        url = "/3D/mesh/%d/%d/" % (self.document.id, gf.id)
+        # another document
+        other = Document3DController.create('doc2', 'Document3D',
+                'a', self.user, self.DATA)
+        response = self.client.get("/3D/mesh/%d/%d/" % (other.id, gf.id))
+        self.assertEqual(404, response.status_code)
+        self.client.logout()
+        response = self.client.get(url)
+        self.assertEqual(302, response.status_code)
+
     def test_decompose_bom_child(self):
         f=open("apps/document3D/data_test/test.stp")
         myfile = File(f)
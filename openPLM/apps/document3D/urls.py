@@ -19,6 +19,8 @@ urlpatterns = patterns('',
     (object_url + r'public/$', public, {"template" : "public_3d.html"}),
     (r'^object/Document3D/([^/]+)/([^/]+)/public/3D/$', views.display_public_3d),
     (r'^3D/public/(\d+)$', views.public_3d_js),
+    (r'^3D/mesh/(\d+)/(\d+)/$', views.mesh_file),
+    (r'^3D/mesh/(\d+)/(\d+)/(coarse|medium)/$', views.mesh_file),
     (r'^object/([^/]+)/([^/]+)/([^/]+)/decompose/([^/]+)/$', views.display_decompose),
     (r'^ajax/decompose/([^/]+)/$', views.ajax_part_creation_form),
 
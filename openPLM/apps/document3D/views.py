@@ -6,9 +6,12 @@ from collections import namedtuple
 from django.conf import settings
 from django.contrib.auth.views import redirect_to_login
 from django.core.files.base import File
+from django.core.servers.basehttp import FileWrapper
 from django.db import transaction
 from django.http import (HttpResponse, HttpResponseRedirect,
-        HttpResponseForbidden, Http404, StreamingHttpResponse)
+        HttpResponseForbidden, Http404, StreamingHttpResponse,
+        HttpResponseNotModified)
+from django.utils.http import http_date
 
 from openPLM.plmapp.views.base import (handle_errors, secure_required,
         get_generic_data, get_obj, get_obj_by_id, init_ctx)
@@ -16,7 +19,7 @@ from openPLM.plmapp.views.ajax import ajax_login_required
 from openPLM.apps.document3D import forms
 from openPLM.apps.document3D import models
 from openPLM.apps.document3D.arborescense import JSGenerator
-from openPLM.apps.document3D import classes
+from openPLM.apps.document3D import classes, binmesh
 from openPLM.plmapp import forms as pforms
 from openPLM.plmapp import models as pmodels
 from openPLM.plmapp.models import get_all_plmobjects
@@ -24,6 +27,64 @@ from openPLM.plmapp.tasks import update_indexes
 from openPLM.plmapp.decomposers.base import Decomposer, DecomposersManager
 from django.template.loader import render_to_string
 from openPLM.plmapp.utils import r2r
+from openPLM.plmapp.utils.archive import BLOCK_SIZE
+
+#: lifetime (in seconds) of a mesh in the cache of a browser, a mesh is
+#: never modified, a new geometry file is created instead
+MESH_MAX_AGE = 60 * 60 * 24 * 7
+
+def get_geometries(obj, doc_file, public=False):
+    """
+    Returns the list of geometries loaded by the 3D view of *doc_file*.
+
+    A binary mesh is a dictionary (*url*, *name*), *name* being the
+    name of the javascript variable. Legacy javascript files are urls
+    (of the media directory or of the :func:`public_3d_js` view
+    if *public* is True).
+
+    If a mesh has several levels of detail, its dictionary also
+    contains *levels*, a list of dictionaries (*level*, *url*, *triangles*) from the
+    coarsest to the finest, and *bounds*, its bounding box
+    (see :func:`.binmesh.write_manifest`).
+    """
+    geometries = []
+    scripts = []
+    for gf in obj.get_geometry_files(doc_file).order_by("id"):
+        if gf.is_mesh:
+            url = "/3D/mesh/%d/%d/" % (obj.id, gf.id)
+            geometry = {
+                "url" : url,
+                "name" : gf.identifier,
+            }
+            manifest = binmesh.read_manifest(gf.file.path)
+            if manifest is not None and len(manifest["levels"]) > 1:
+                geometry["bounds"] = manifest["bounds"]
+                geometry["levels"] = [{
+                    "level" : l["level"],
+                    "triangles" : l["triangles"],
+                    "url" : url if l["level"] == binmesh.LEVELS[-1] else
+                        "%s%s/" % (url, l["level"]),
+                } for l in manifest["levels"]]
+            geometries.append(geometry)
+        elif public:
+            scripts = ["/3D/public/%d" % obj.id]
+        else:
+            scripts.append(os.path.join(settings.MEDIA_URL, "3D", gf.file.name))
+    return scripts + geometries
+
+def check_3d_readable(request, obj):
+    """
+    Raises :exc:`Http404` if the user can not see the 3D view
+    of *obj*, returns a redirection to the login page if the user is
+    anonymous and *obj* is not published, returns None otherwise.
+    """
+    if not obj.is_document or obj.type != "Document3D":
+        raise Http404
+    if not obj.published and request.user.is_anonymous():
+        return redirect_to_login(request.get_full_path())
+    elif not obj.published and not obj.check_restricted_readable(False):
+        raise Http404
+    return None
 
 
 @handle_errors
@@ -56,8 +117,7 @@ def display_3d(request, obj_ref, obj_revi):
             pass
     else:
         product = obj.get_product(doc_file, True)
-        geometry_files = obj.get_all_geometry_files(doc_file)
-        geometry_files = [os.path.join(settings.MEDIA_URL, "3D", p) for p in geometry_files]
+        geometry_files = get_geometries(obj, doc_file)
         javascript_arborescense = JSGenerator(product).get_js()
 
     ctx.update({
@@ -82,7 +142,7 @@ def display_public_3d(request, obj_ref, obj_revi):
         doc_file = obj.files.filter(models.is_stp)[0]
     except IndexError:
         doc_file = None
-
+        geometry_files = []
         javascript_arborescense=""
         try:
             doc_file = obj.files.filter(models.is_stl)[0]
@@ -92,9 +152,11 @@ def display_public_3d(request, obj_ref, obj_revi):
             pass
     else:
         product = obj.get_product(doc_file, True)
+        geometry_files = get_geometries(obj, doc_file, True)
         javascript_arborescense = JSGenerator(product).get_js()
 
     ctx.update({
+        'GeometryFiles' : json.dumps(geometry_files),
         'is_readable' : True,
         'is_contributor': False,
         # disable the menu and the navigation_history
@@ -110,18 +172,16 @@ def display_public_3d(request, obj_ref, obj_revi):
 @secure_required
 def public_3d_js(request, obj_id):
     obj = get_obj_by_id(int(obj_id), request.user)
-    if not obj.is_document and not obj.type == "Document3D":
-        raise Http404
-    if not obj.published and request.user.is_anonymous():
-        return redirect_to_login(request.get_full_path())
-    elif not obj.published and not obj.check_restricted_readable(False):
-        raise Http404
+    redirection = check_3d_readable(request, obj)
+    if redirection is not None:
+        return redirection
     try:
         doc_file = obj.files.filter(models.is_stp)[0]
     except IndexError:
         js_files = []
     else:
-        js_files = obj.get_all_geometry_files(doc_file)
+        js_files = [f for f in obj.get_all_geometry_files(doc_file)
+                if not binmesh.is_mesh_file(f)]
     if not js_files:
         return HttpResponse("")
     f = fileinput.FileInput(os.path.join(settings.MEDIA_ROOT, "3D", p) for p in js_files)
@@ -129,6 +189,55 @@ def public_3d_js(request, obj_id):
     return response
 
 
+@secure_required
+def mesh_file(request, obj_id, gf_id, level=None):
+    """
+    Serves a binary mesh (see :mod:`.binmesh`) displayed by the 3D view
+    of the Document3D *obj_id*.
+
+    If *level* is set, the mesh of this level of detail (``coarse`` or
+    ``medium``) is served instead of the fine mesh.
+
+    The response has an ``ETag`` and can be cached by browsers
+    (a ``304 Not Modified`` response is returned if the mesh has not changed).
+
+    :url: :samp:`/3D/mesh/{obj_id}/{gf_id}/`
+    :url: :samp:`/3D/mesh/{obj_id}/{gf_id}/{level}/`
+
+    .. versionadded:: 2.1
+    """
+    obj = get_obj_by_id(int(obj_id), request.user)
+    redirection = check_3d_readable(request, obj)
+    if redirection is not None:
+        return redirection
+    try:
+        doc_file = obj.files.filter(models.is_stp)[0]
+        gf = obj.get_geometry_files(doc_file).get(id=int(gf_id))
+    except (IndexError, models.GeometryFile.DoesNotExist):
+        raise Http404
+    if not gf.is_mesh:
+        raise Http404
+    level = level or binmesh.LEVELS[-1]
+    try:
+        f = open(binmesh.get_level_path(gf.file.path, level), "rb")
+    except IOError:
+        raise Http404
+    st = os.fstat(f.fileno())
+    etag = '"%d-%s-%d-%d"' % (gf.id, level, st.st_size, int(st.st_mtime))
+    if request.META.get("HTTP_IF_NONE_MATCH") == etag:
+        f.close()
+        response = HttpResponseNotModified()
+    else:
+        response = StreamingHttpResponse(FileWrapper(f, BLOCK_SIZE),
+                content_type=binmesh.CONTENT_TYPE)
+        response["Content-Length"] = st.st_size
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(st.st_mtime)
+    response["Cache-Control"] = "%s, max-age=%d" % (
+            "public" if obj.published else "private", MESH_MAX_AGE)
+    return response
+
+
 class StepDecomposer(Decomposer):
     """
     :class:`.Decomposer` of Document3D.
@@ -5,6 +5,7 @@ from django.utils.translation import ugettext_lazy as _
 from openPLM.plmapp.views.base import get_generic_data, handle_errors
 from openPLM.plmapp.exceptions import PermissionError
 from openPLM.plmapp.forms import ConfirmPasswordForm
+from openPLM.plmapp.permissions import get_context
 from openPLM.plmapp.utils import r2r
 
 from openPLM.apps.oerp import erp
@@ -58,7 +59,7 @@ def erp_summary(request, obj_type, obj_ref, obj_revi, publish=False, update=Fals
     except models.OERPProduct.DoesNotExist:
         # allow to publish on openERP
         ctx["published"] = False
-        if not obj.group.user_set.filter(id=request.user.id).exists():
+        if not get_context(request.user).in_group(obj.group_id):
             ctx["can_publish"] = False
         else:
             ctx["can_publish"] = obj.is_official
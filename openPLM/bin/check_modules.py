@@ -75,13 +75,6 @@ except ImportError:
     print "pygraphviz is not installed, see http://networkx.lanl.gov/pygraphviz/"
     not_installed.append("pygraphviz")
 
-try:
-    import kjbuckets
-    installed.append("kjbuckets")
-except ImportError:
-    print "kjbuckets is not installed, see http://gadfly.sourceforge.net/kjbuckets.html"
-    not_installed.append("kjbuckets")
-
 try:
     import odf
     installed.append("odf")
@@ -30,6 +30,22 @@ from django.db import models
 from django.contrib import admin
 
 import openPLM.plmapp.models as m
+from openPLM.plmapp.files.extraction import get_hit_ratio
+
+
+class ExtractedTextAdmin(admin.ModelAdmin):
+    list_display = ("content_hash", "extension", "size", "hits", "atime")
+    list_filter = ("extension", "extractor_version")
+    search_fields = ("content_hash", )
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = extra_context or {}
+        extra_context["title"] = "Extracted texts (hit ratio: %.1f%%)" % \
+                (get_hit_ratio() * 100)
+        return super(ExtractedTextAdmin, self).changelist_view(request,
+                extra_context)
+
+admin.site.register(m.ExtractedText, ExtractedTextAdmin)
 
 # register all the models from plmapp
 # we browse all attributes from plmapp.models
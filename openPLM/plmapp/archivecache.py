@@ -0,0 +1,329 @@
+############################################################################
+# openPLM - open source PLM
+# Copyright 2010 Philippe Joulaud, Pierre Cosquer
+#
+# This file is part of openPLM.
+#
+#    openPLM is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    openPLM is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with openPLM.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact :
+#    Philippe Joulaud : ninoo.fr@gmail.com
+#    Pierre Cosquer : pcosquer@linobject.com
+################################################################################
+
+
+"""
+.. versionadded:: 2.1
+
+This module caches archives of the files of official and deprecated objects
+(see :func:`.download_archive`).
+
+The files of an official or deprecated object do not change, so its archives
+can be generated once and stored in the ``ARCHIVES_CACHE_DIR`` directory.
+An archive is identified by the object, its revision, the format of the
+archive, the *cad* flag and the ids and revisions of its files, so that
+a modified set of files never hits a stale archive.
+
+Archives are generated by a celery task (:func:`fill`) after an object
+is promoted to official and after a download which missed the cache.
+A marker stored in the default cache while an archive is being built
+ensures that concurrent misses send only one task (see :func:`schedule_fill`).
+The total size of cached archives is bounded by the ``ARCHIVES_CACHE_SIZE``
+setting (in bytes), the least recently downloaded archives are deleted first.
+
+The cache is disabled if ``ARCHIVES_CACHE_DIR`` is not set.
+"""
+
+import os
+import errno
+import hashlib
+import itertools
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+
+from djcelery_transactions import task
+
+import openPLM.plmapp.models as models
+from openPLM.plmapp.utils.archive import (generate_archive, ARCHIVE_FORMATS,
+        BLOCK_SIZE)
+
+#: version of the cache, it is part of the keys
+VERSION = 1
+
+#: default value of the ``ARCHIVES_CACHE_SIZE`` setting (2 Gio)
+DEFAULT_CACHE_SIZE = 2 * 1024 * 1024 * 1024
+
+#: prefix of partially written archives
+TMP_PREFIX = ".tmp"
+
+#: lifetime (in seconds) of the marker of an archive being built, a marker
+#: left by a worker which died expires after this delay
+BUILDING_TIMEOUT = 600
+
+def get_cache_dir():
+    return getattr(settings, "ARCHIVES_CACHE_DIR", None)
+
+def get_cache_size():
+    return getattr(settings, "ARCHIVES_CACHE_SIZE", DEFAULT_CACHE_SIZE)
+
+def get_formats():
+    """
+    Returns the formats of the archives generated after a promotion
+    (``ARCHIVES_CACHE_FORMATS`` setting, default: all formats).
+    """
+    return getattr(settings, "ARCHIVES_CACHE_FORMATS", ARCHIVE_FORMATS)
+
+def is_cacheable(obj):
+    """
+    Returns True if the archives of *obj* (a :class:`.PLMObject` or
+    a controller) can be cached.
+    """
+    return bool(get_cache_dir()) and (obj.is_official or obj.is_deprecated)
+
+def get_files(ctrl, cad=False):
+    """
+    Returns the list of :class:`.DocumentFile` stored in an archive of
+    *ctrl* or None if *ctrl* is neither a document nor a part.
+
+    If *cad* is True and *ctrl* is a part, only CAD files of the part
+    and its children are returned (see :meth:`.PartController.get_cad_files`).
+    """
+    d_o_u = "document__owner__username"
+    if ctrl.is_document:
+        files = ctrl.files.select_related(d_o_u)
+    elif ctrl.is_part and cad:
+        files = ctrl.get_cad_files()
+    elif ctrl.is_part:
+        links = ctrl.get_attached_documents()
+        docs = (link.document for link in links)
+        files = itertools.chain(*(doc.files.select_related(d_o_u)
+            for doc in docs))
+    else:
+        return None
+    return list(files)
+
+def get_path(obj, files, format, cad=False):
+    """
+    Returns the path of the archive of *files* of *obj*.
+    """
+    cad = bool(cad and obj.is_part)
+    files = ",".join("%d.%d" % (df.id, df.revision) for df in files)
+    key = u"%d:%d:%s:%s:%d:%s" % (VERSION, obj.id, obj.revision, format,
+            cad, files)
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return os.path.join(get_cache_dir(), "%s.%s" % (digest, format))
+
+def get(obj, files, format, cad=False):
+    """
+    Returns the cached archive of *files* of *obj* as an opened file
+    or None if it is not cached.
+    """
+    path = get_path(obj, files, format, cad)
+    try:
+        f = open(path, "rb")
+    except IOError:
+        return None
+    # the archive may be evicted once opened, its content remains readable
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+    return f
+
+def build(obj, files, format, cad=False):
+    """
+    Generates the archive of *files* of *obj* if it is not already cached.
+    Returns its path.
+    """
+    path = get_path(obj, files, format, cad)
+    if os.path.exists(path):
+        return path
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=TMP_PREFIX)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for s in generate_archive(files, format):
+                f.write(s)
+        # an archive is never partially visible
+        os.rename(tmp, path)
+    except:
+        os.remove(tmp)
+        raise
+    evict()
+    return path
+
+def evict(max_size=None):
+    """
+    Deletes the least recently used archives if the total size of cached
+    archives exceeds *max_size* (default: ``ARCHIVES_CACHE_SIZE``)
+    so that it is reduced to 90% of *max_size*.
+
+    Returns the number of deleted archives.
+    """
+    max_size = get_cache_size() if max_size is None else max_size
+    directory = get_cache_dir()
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return 0
+    entries = []
+    total = 0
+    for name in names:
+        if name.startswith(TMP_PREFIX):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            # deleted by another worker
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+    if total <= max_size:
+        return 0
+    excess = total - int(max_size * 0.9)
+    entries.sort()
+    count = 0
+    for mtime, size, path in entries:
+        if excess <= 0:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        excess -= size
+        count += 1
+    return count
+
+def clear():
+    """
+    Deletes all cached archives.
+    """
+    directory = get_cache_dir()
+    if directory and os.path.isdir(directory):
+        for name in os.listdir(directory):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+def get_etag(f):
+    """
+    Returns the entity tag of the cached archive *f* (an opened file).
+    """
+    return '"%s"' % os.path.basename(f.name)
+
+def parse_range(header, size):
+    """
+    Parses the value of a ``Range`` header and returns a tuple (first byte,
+    last byte) of a file of *size* bytes or None if *header* must be ignored
+    (invalid syntax or several ranges).
+
+    :raise: :exc:`ValueError` if the range is not satisfiable
+    """
+    unit, sep, ranges = header.partition("=")
+    if unit.strip() != "bytes" or "," in ranges:
+        return None
+    first, sep, last = ranges.strip().partition("-")
+    try:
+        if not first:
+            # suffix range: the last bytes
+            length = int(last)
+            first, last = max(size - length, 0), size - 1
+        else:
+            first = int(first)
+            last = int(last) if last else max(size - 1, first)
+    except ValueError:
+        return None
+    if first >= size:
+        raise ValueError("unsatisfiable range")
+    if first < 0 or last < first:
+        return None
+    return first, min(last, size - 1)
+
+def iter_range(f, first, last):
+    """
+    Yields the bytes *first* to *last* (included) of *f* by blocks of
+    :const:`.BLOCK_SIZE` bytes and closes *f*.
+    """
+    try:
+        f.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            s = f.read(min(BLOCK_SIZE, remaining))
+            if not s:
+                break
+            remaining -= len(s)
+            yield s
+    finally:
+        f.close()
+
+def get_building_key(plmobject_id, format, cad=False):
+    """
+    Returns the key of the marker set while the archive is being built.
+    """
+    return "archivecache:building:%d:%d:%s:%d" % (VERSION, plmobject_id,
+            format, bool(cad))
+
+@task(name="openPLM.plmapp.archivecache.fill", ignore_result=True)
+def fill(plmobject_id, format, cad=False):
+    """
+    Celery task that generates the archive of an official or deprecated
+    object.
+
+    :param plmobject_id: id of the :class:`.PLMObject`
+    :param format: format of the archive (see :const:`.ARCHIVE_FORMATS`)
+    :param cad: True if only CAD files are archived
+    """
+    from openPLM.plmapp.controllers import get_controller
+    try:
+        obj = models.PLMObject.objects.get(id=plmobject_id).get_leaf_object()
+        if not is_cacheable(obj):
+            return
+        cie = models.User.objects.get(username=settings.COMPANY)
+        ctrl = get_controller(obj.type)(obj, cie)
+        files = get_files(ctrl, cad)
+        if files:
+            build(ctrl, files, format, cad)
+    finally:
+        cache.delete(get_building_key(plmobject_id, format, cad))
+
+def schedule_fill(plmobject_id, format, cad=False):
+    """
+    Sends a :func:`fill` task unless the archive is already being built.
+
+    Returns True if a task has been sent.
+    """
+    key = get_building_key(plmobject_id, format, cad)
+    if cache.add(key, True, BUILDING_TIMEOUT):
+        fill.delay(plmobject_id, format, cad)
+        return True
+    return False
+
+def schedule(plmobject_ids):
+    """
+    Generates asynchronously the archives (all formats of
+    :func:`get_formats`) of the objects of *plmobject_ids*.
+    """
+    if get_cache_dir():
+        for plmobject_id in plmobject_ids:
+            for format in get_formats():
+                schedule_fill(plmobject_id, format)
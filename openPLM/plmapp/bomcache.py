@@ -0,0 +1,192 @@
+############################################################################
+# openPLM - open source PLM
+# Copyright 2010 Philippe Joulaud, Pierre Cosquer
+#
+# This file is part of openPLM.
+#
+#    openPLM is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    openPLM is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with openPLM.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact :
+#    Philippe Joulaud : ninoo.fr@gmail.com
+#    Pierre Cosquer : pcosquer@linobject.com
+################################################################################
+
+"""
+.. versionadded:: 2.1
+
+This module caches snapshots of BOMs computed by
+:meth:`.PartController.get_bom` and diffs computed by
+:meth:`.PartController.cmp_bom`.
+
+A BOM at a past date never changes, so its snapshot is kept
+until it expires. A BOM at the current date is cached until
+one of its parts is modified: each part has a version token which is
+renewed by :func:`invalidate_boms` and which is part of the key of
+its current snapshots.
+
+Version tokens are deleted when a part is modified and once again
+when the current transaction ends, so that a snapshot built by a
+concurrent request from data that were not yet committed is not kept.
+They must be shared by all processes (web servers, celery workers):
+current BOMs are only cached if the ``BOM_CACHE_CURRENT`` setting
+is True. By default, it is True if the default cache is neither a
+local-memory cache nor a dummy cache.
+
+Snapshots only contain ids and values (states, extension data), they are
+pickled and compressed. The default django cache is used; its
+timeout can be set with the ``BOM_CACHE_TIMEOUT`` setting (in seconds).
+"""
+
+import zlib
+import uuid
+import datetime
+import threading
+import cPickle as pickle
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils import timezone
+
+import djcelery_transactions.transaction_signals
+import openPLM.plmapp.models as models
+
+#: dates older than now - :const:`HISTORICAL_DELAY` are considered immutable,
+#: more recent dates may still see running transactions
+HISTORICAL_DELAY = datetime.timedelta(minutes=1)
+
+def get_timeout():
+    return getattr(settings, "BOM_CACHE_TIMEOUT", 60 * 60 * 24)
+
+def can_cache_current():
+    """
+    Returns True if current BOMs can be cached, that is to say if
+    version tokens are shared by all processes.
+    """
+    shared = getattr(settings, "BOM_CACHE_CURRENT", None)
+    if shared is None:
+        shared = not isinstance(cache, (LocMemCache, DummyCache))
+    return shared
+
+def _version_key(part_id):
+    return "openplm:bom_version:%d" % part_id
+
+def get_bucket(date):
+    """
+    Returns the date part of a snapshot key: ``"now"`` if *date* is None,
+    the date itself if it is a past date and None if the BOM at *date* can
+    not be cached (recent or future date, current date if
+    :func:`can_cache_current` returns False).
+    """
+    if date is None:
+        return "now" if can_cache_current() else None
+    if date < timezone.now() - HISTORICAL_DELAY:
+        return date.isoformat()
+    return None
+
+def get_snapshot_key(part_id, date, *options):
+    """
+    Returns the key of the snapshot of the BOM of *part_id* at *date*
+    or None if it can not be cached.
+
+    *options* are the other arguments given to :meth:`.PartController.get_bom`.
+    """
+    bucket = get_bucket(date)
+    if bucket is None:
+        return None
+    if bucket == "now":
+        version_key = _version_key(part_id)
+        version = cache.get(version_key)
+        if version is None:
+            version = uuid.uuid4().hex
+            cache.set(version_key, version, get_timeout())
+        bucket = "now:" + version
+    options = ":".join(unicode(o) for o in options)
+    return "openplm:bom:%d:%s:%s" % (part_id, bucket, options)
+
+def get_diff_key(key1, key2):
+    """
+    Returns the key of the diff between the snapshots *key1* and *key2*
+    or None if one of them can not be cached.
+    """
+    if key1 is None or key2 is None:
+        return None
+    return "openplm:bomdiff:%s:%s" % (key1, key2)
+
+def get_snapshot(key):
+    """
+    Returns the snapshot stored at *key* or None if it is not cached.
+    """
+    if key is None:
+        return None
+    data = cache.get(key)
+    if data is None:
+        return None
+    return pickle.loads(zlib.decompress(data))
+
+def set_snapshot(key, snapshot):
+    """
+    Stores *snapshot* at *key* (does nothing if *key* is None).
+    """
+    if key is not None:
+        data = zlib.compress(pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL))
+        cache.set(key, data, get_timeout())
+
+def invalidate_boms(part_ids):
+    """
+    Invalidates current snapshots of the BOMs of all parts of *part_ids*
+    and of their ancestors.
+    """
+    part_ids = set(part_ids)
+    if not part_ids:
+        return
+    closure = models.ParentChildLinkClosure.current_objects
+    part_ids.update(closure.filter(descendant__in=part_ids)\
+            .values_list("ancestor", flat=True))
+    keys = [_version_key(part_id) for part_id in part_ids]
+    cache.delete_many(keys)
+    if transaction.is_managed():
+        _get_pending_keys().update(keys)
+
+def invalidate_documents_boms(document_ids):
+    """
+    Invalidates current snapshots of the BOMs of all parts attached
+    to one of the documents of *document_ids*.
+    """
+    links = models.DocumentPartLink.current_objects.filter(document__in=document_ids)
+    invalidate_boms(links.values_list("part", flat=True))
+
+
+_thread_data = threading.local()
+
+def _get_pending_keys():
+    """Returns the version keys to delete at the end of the current transaction."""
+    return _thread_data.__dict__.setdefault("pending_keys", set())
+
+def _delete_pending_keys(**kwargs):
+    """
+    Deletes the version tokens invalidated during the transaction.
+
+    Called after a transaction is committed or rolled back.
+    """
+    keys = _get_pending_keys()
+    if keys:
+        cache.delete_many(list(keys))
+        keys.clear()
+
+transaction.signals.post_commit.connect(_delete_pending_keys)
+transaction.signals.post_rollback.connect(_delete_pending_keys)
+transaction.signals.post_transaction_management.connect(_delete_pending_keys)
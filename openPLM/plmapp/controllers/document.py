@@ -27,6 +27,7 @@
 
 import os
 import shutil
+import datetime
 from django.utils import timezone
 
 import Image
@@ -34,6 +35,7 @@ from django.conf import settings
 from djcelery_transactions import task
 
 import openPLM.plmapp.models as models
+from openPLM.plmapp import bomcache
 from openPLM.plmapp.exceptions import LockError, UnlockError, DeleteFileError, PermissionError
 from openPLM.plmapp.controllers.plmobject import PLMObjectController
 from openPLM.plmapp.controllers.base import get_controller
@@ -47,9 +49,12 @@ from openPLM.plmapp.tasks import update_indexes
 @task
 def delete_old_files(doc_file_pk, selectors):
     doc_file = models.DocumentFile.objects.get(id=doc_file_pk)
+    names = []
     for df in get_deletable_files(doc_file, selectors):
-        os.chmod(df.file.path, 0700)
-        os.remove(df.file.path)
+        # a blob is released and removed below if it is not referenced
+        # by another file
+        models.docfs.delete(df.file.name)
+        names.append(df.file.name)
         if df.thumbnail:
             df.thumbnail.delete(save=False)
             df.thumbnail = None
@@ -58,6 +63,7 @@ def delete_old_files(doc_file_pk, selectors):
         df.deleted = True
         df.deprecated = True
         df.save()
+    models.docfs.collect_garbage(names, datetime.timedelta(0))
 
 
 class DocumentController(PLMObjectController):
@@ -78,7 +84,7 @@ class DocumentController(PLMObjectController):
                 raise PermissionError("Not your file")
             for pf in private_files:
                 doc_file = models.DocumentFile.objects.create(filename=pf.filename, size=pf.size,
-                    file=pf.file.path, document=obj.object)
+                    file=pf.file.name, document=obj.object)
                 generate_thumbnail.delay(doc_file.id)
                 # django < 1.2.5 deletes the file when pf is deleted
                 pf.file = ""
@@ -310,6 +316,7 @@ class DocumentController(PLMObjectController):
         if isinstance(part, PLMObjectController):
             part = part.object
         self.documentpartlink_document.create(part=part)
+        bomcache.invalidate_boms([part.id])
         self._save_histo(models.DocumentPartLink.ACTION_NAME,
                          "%s (%s//%s//%s) <=> %s (%s//%s//%s)" % (part.name, part.type, part.reference, part.revision, self.object.name, self.object.type, self.object.reference, self.object.revision))
 
@@ -324,6 +331,7 @@ class DocumentController(PLMObjectController):
             part = part.object
         link = self.documentpartlink_document.now().get(part=part)
         link.end()
+        bomcache.invalidate_boms([part.id])
         self._save_histo("Undo - " + models.DocumentPartLink.ACTION_NAME,
                          "%s (%s//%s//%s) <=> %s (%s//%s//%s)" % (part.name, part.type, part.reference, part.revision, self.object.name, self.object.type, self.object.reference, self.object.revision))
 
@@ -419,8 +427,8 @@ class DocumentController(PLMObjectController):
     def copy_files(self, src):
         for doc_file in src.files.all():
             filename = doc_file.filename
-            path = models.docfs.get_available_name(filename.encode("utf-8"))
-            shutil.copy(doc_file.file.path, models.docfs.path(path))
+            # a blob is shared, other files are copied
+            path = models.docfs.copy(doc_file.file.name, filename.encode("utf-8"))
             new_doc = models.DocumentFile.objects.create(file=path,
                 filename=filename, size=doc_file.size, document=self.object)
             os.chmod(new_doc.file.path, 0400)
@@ -443,6 +451,7 @@ class DocumentController(PLMObjectController):
         # attach the given parts
         for part in selected_parts:
             rev.documentpartlink_document.create(part=part)
+        bomcache.invalidate_boms(part.id for part in selected_parts)
 
         return rev
 
@@ -486,12 +495,13 @@ class DocumentController(PLMObjectController):
         doc_file.previous_revision = None
         doc_file.save()
         new_file.name = new_file.name.encode("utf-8")
+        # the deprecated file takes the current file, no data are copied
         deprecated_df = models.DocumentFile.objects.create(
                     document=self.object,
                     deprecated=True,
                     size=doc_file.size,
                     filename=doc_file.filename,
-                    file=models.docfs.save(new_file.name, doc_file.file),
+                    file=doc_file.file.name,
                     thumbnail=None,
                     ctime=doc_file.ctime,
                     revision=doc_file.revision,
@@ -578,6 +588,7 @@ class DocumentController(PLMObjectController):
             * removes all :class:`.DocumentPartLink` related to the object
         """
         super(DocumentController, self).cancel()
+        bomcache.invalidate_documents_boms([self.id])
         self.get_attached_parts().end()
         for doc_file in self.files:
             self._delete_old_files(doc_file, ON_CANCEL_SELECTORS)
@@ -25,20 +25,23 @@
 """
 """
 import difflib
-from itertools import imap, izip_longest, groupby
+from itertools import imap, izip_longest, groupby, chain
 from operator import attrgetter, itemgetter
 from collections import namedtuple, defaultdict
 
 from django.db import transaction
+from django.db.models import F
 from django.db.models.query import Q
 from django.utils import timezone
 
 import openPLM.plmapp.models as models
+from openPLM.plmapp import bomcache
 from openPLM.plmapp.utils.units import DEFAULT_UNIT
 from openPLM.plmapp.controllers.plmobject import PLMObjectController
 from openPLM.plmapp.controllers.base import get_controller
 from openPLM.plmapp.files.formats import is_cad_file
 from openPLM.plmapp.exceptions import PermissionError, PromotionError
+from openPLM.plmapp.permissions import filter_readable
 from openPLM.plmapp.tasks import update_indexes
 from openPLM.plmapp.utils import level_to_sign_str
 
@@ -69,6 +72,23 @@ def flatten_bom(data):
     return flatten
 
 
+def dump_bom(bom):
+    """
+    Returns a compact snapshot of *bom* (a dictionary returned by
+    :meth:`PartController.get_bom`) that can be cached.
+    Objects are replaced by their ids.
+    """
+    return {
+        "children" : [(c.level, c.link.id) for c in bom["children"]],
+        "extension_data" : dict(bom["extension_data"]),
+        "states" : bom["states"],
+        "documents" : dict((part_id, [d.id for d in docs])
+            for part_id, docs in bom["documents"].iteritems() if docs),
+        "alternates" : dict((part_id, [p.id for p in parts])
+            for part_id, parts in bom["alternates"].iteritems() if parts),
+    }
+
+
 def get_last_children(children):
     previous_level = 0
     last_children = []
@@ -80,6 +100,67 @@ def get_last_children(children):
     return last_children
 
 
+def build_bom_tree(root_id, links, max_level, node_class, src, dst,
+        get_valid_ids=None):
+    """
+    Builds an indented BOM (or an indented list of parents) in linear time.
+
+    :param root_id: id of the part at the root of the tree
+    :param links: list of :class:`.ParentChildLink` sorted by descending order
+    :param max_level: maximum level, ``-1`` means no limit
+    :param node_class: :class:`Child` or :class:`Parent`
+    :param src: ``"parent_id"`` to build a BOM, ``"child_id"`` to build
+                a list of parents
+    :param dst: the other end of a link (``"child_id"`` or ``"parent_id"``)
+    :param get_valid_ids: if not None, a function that takes the set of
+        reached part ids and returns the set of valid ids, branches whose
+        root is not valid are pruned
+    :rtype: list of *node_class*
+
+    If a part is reached several times at the same level, its subtree is
+    only added once, under the first link (in *links* order) that reaches it.
+    """
+    adjacency = defaultdict(list)
+    for index, link in enumerate(links):
+        adjacency[getattr(link, src)].append((index, link))
+    # breadth first pass: finds the link that owns the subtree of
+    # each reached part at each level
+    owners = [] # level - 1 -> {part id -> index of the owner link}
+    ids = set()
+    nodes = [root_id]
+    while nodes and (max_level < 0 or len(owners) < max_level):
+        owner = {}
+        for node in nodes:
+            for index, link in adjacency.get(node, ()):
+                d = getattr(link, dst)
+                if d not in owner:
+                    owner[d] = index
+                elif index < owner[d]:
+                    owner[d] = index
+        owners.append(owner)
+        ids.update(owner)
+        nodes = owner.keys()
+    valid = None
+    if get_valid_ids is not None and ids:
+        valid = get_valid_ids(ids)
+    # depth first pass: siblings are emitted by ascending order
+    res = []
+    stack = [(1, reversed(adjacency.get(root_id, ())))]
+    while stack:
+        level, siblings = stack[-1]
+        for index, link in siblings:
+            d = getattr(link, dst)
+            if valid is not None and d not in valid:
+                continue
+            res.append(node_class(level, link))
+            if level < len(owners) and owners[level - 1][d] == index:
+                stack.append((level + 1, reversed(adjacency.get(d, ()))))
+                break
+        else:
+            stack.pop()
+    return res
+
+
 class PartController(PLMObjectController):
     u"""
     Controller for :class:`.Part`.
@@ -165,8 +246,7 @@ class PartController(PLMObjectController):
                 if child.is_part and child.id not in invalid_ids:
                     valid_state = not (child.is_cancelled or child.is_deprecated)
                     if valid_state:
-                        child_ctrl = get_controller(child.type)(child, self._user)
-                        return child_ctrl.check_readable(False)
+                        return bool(filter_readable(self._user, [child]))
                 return False
             self.can_add_child2 = can_add
         else:
@@ -225,6 +305,7 @@ class PartController(PLMObjectController):
             if name in extension_data and PCLE.one_per_link():
                 ext = PCLE(link=link, **extension_data[name])
                 ext.save()
+        bomcache.invalidate_boms([self.id])
         # records creation in history
         self._save_histo(link.ACTION_NAME,
                          "parent : %s (%s//%s//%s) => child : %s (%s//%s//%s), quantity : %s %s, order : %s" % (self.object.name, self.object.type, self.object.reference, self.object.revision, child.name, child.type, child.reference, child.revision, link.quantity, link.unit, link.order))
@@ -250,6 +331,7 @@ class PartController(PLMObjectController):
             child = child.object
         link = self.parentchildlink_parent.now().get(child=child)
         link.end()
+        bomcache.invalidate_boms([self.id])
         self._save_histo("Undo - %s" % link.ACTION_NAME, "child : %s (%s//%s//%s)" % (child.name, child.type, child.reference, child.revision))
 
     def modify_child(self, child, new_quantity, new_order, new_unit,
@@ -286,6 +368,8 @@ class PartController(PLMObjectController):
             # do not make an update if it is useless
             return link
         link.end_time = timezone.now()
+        # link2 binds the same parts, the BOM closure does not change
+        link.keep_closure = True
         link.save()
         # make a new link
         link2, extensions = link.clone(quantity=new_quantity, order=new_order,
@@ -313,6 +397,7 @@ class PartController(PLMObjectController):
                 and PCLE.one_per_link()):
                 ext = PCLE(link=link2, **extension_data[name])
                 ext.save()
+        bomcache.invalidate_boms([self.id])
         return link2
 
     def replace_child(self, link, new_child):
@@ -365,6 +450,7 @@ class PartController(PLMObjectController):
                 if not ext.one_per_link():
                     ext.link = link2
                     ext.save(force_insert=True)
+        bomcache.invalidate_boms([self.id])
         return link2
 
     def get_children(self, max_level=1, date=None,
@@ -388,75 +474,51 @@ class PartController(PLMObjectController):
                 .select_related(*related)
         if only is not None:
             links = links.only(*only)
-        res = []
-        parents = [self.object.id]
-        level = 1
-        last_children = []
-        children_ids = []
-        while parents and (max_level < 0 or level <= max_level):
-            qs = links.filter(parent__in=parents)
-            parents = []
-            last = []
-            for link in qs.iterator():
-                parents.append(link.child_id)
-                child = Child(level, link)
-                last.append(child)
-                children_ids.append(link.child_id)
-                if level == 1:
-                    res.insert(0, child)
-                else:
-                    for c in last_children:
-                        if c.link.child_id == link.parent_id:
-                            res.insert(res.index(c) +1, child)
-                            break
-            last_children = last
-            level += 1
-        if only_official and res:
+        q = Q(parent=self.object)
+        if max_level != 1:
+            # retrieves the whole indented BOM in one query
+            descendants = models.ParentChildLinkClosure.objects.at(date)\
+                    .filter(ancestor=self.object)
+            if max_level > 1:
+                descendants = descendants.filter(depth__lt=max_level)
+            q |= Q(parent__in=descendants.values("descendant"))
+        links = list(links.filter(q))
+        get_valid_ids = None
+        if only_official:
             # retrieves all official children at *date* and then prunes the
             # tree so that we only run one query
-            res2 = []
-            sh = models.StateHistory.objects.at(date).officials().filter(plmobject__in=children_ids)
-            valid_children = set(sh.values_list("plmobject_id", flat=True))
-            # level_threshold is used to cut a "branch" of the tree
-            level_threshold = len(res) + 1 # all levels are inferior to this value
-            for child in res:
-                if child.level > level_threshold:
-                    continue
-                if child.link.child_id in valid_children:
-                    res2.append(child)
-                    level_threshold = len(res) + 1
-                else:
-                    level_threshold = child.level
-            res = res2
-        return res
+            def get_valid_ids(children_ids):
+                sh = models.StateHistory.objects.at(date).officials()\
+                        .filter(plmobject__in=children_ids)
+                return set(sh.values_list("plmobject_id", flat=True))
+        return build_bom_tree(self.id, links, max_level, Child,
+                "parent_id", "child_id", get_valid_ids)
 
     def is_ancestor(self, part):
         """
         Returns True if *part* is an ancestor of the current object.
         """
-        links = models.ParentChildLink.current_objects
-        parents = [part.id]
-        while parents:
-            parents = links.filter(parent__in=parents).values_list("child",
-                    flat=True)
-            if self.id in parents:
-                return True
-        return False
+        closure = models.ParentChildLinkClosure.current_objects
+        return closure.filter(ancestor=part.id, descendant=self.id).exists()
 
     def is_ancestor2(self, part):
         # TODO: rename this method
-        links = models.ParentChildLink.current_objects
+        closure = models.ParentChildLinkClosure.current_objects
         alternates = self.get_alternates()
         tested_parts = set(p.id for p in alternates)
         tested_parts.add(self.id)
-        parents = [part.id]
-        parents += models.AlternatePartSet.get_related_parts(parents)
+        parents = set([part.id])
+        parents.update(models.AlternatePartSet.get_related_parts(parents))
+        visited = set()
         while parents:
-            parents += models.AlternatePartSet.get_related_parts(parents)
-            parents = list(links.filter(parent__in=parents).values_list("child",
-                    flat=True))
-            if not tested_parts.isdisjoint(parents):
+            visited.update(parents)
+            descendants = set(closure.filter(ancestor__in=parents)\
+                    .values_list("descendant", flat=True))
+            if not tested_parts.isdisjoint(descendants):
                 return True
+            # descendants of alternate parts are also tested
+            parents = set(models.AlternatePartSet.get_related_parts(descendants))
+            parents.difference_update(visited, descendants)
         return False
 
 
@@ -481,47 +543,25 @@ class PartController(PLMObjectController):
                 .select_related(*related)
         if only is not None:
             links = links.only(*only)
-        res = []
-        children = [self.object.id]
-        level = 1
-        last_parents = []
-        parents_ids = []
-        while children and (max_level < 0 or level <= max_level):
-            qs = links.filter(child__in=children)
-            children = []
-            last = []
-            for link in qs.iterator():
-                children.append(link.parent_id)
-                parent = Parent(level, link)
-                last.append(parent)
-                parents_ids.append(link.parent_id)
-                if level == 1:
-                    res.insert(0, parent)
-                else:
-                    for c in last_parents:
-                        if c.link.parent_id == link.child_id:
-                            res.insert(res.index(c) +1, parent)
-                            break
-            last_parents = last
-            level += 1
-        if only_official and res:
-            # retrieves all official children at *date* and then prunes the
+        q = Q(child=self.object)
+        if max_level != 1:
+            # retrieves all ancestors in one query
+            ancestors = models.ParentChildLinkClosure.objects.at(date)\
+                    .filter(descendant=self.object)
+            if max_level > 1:
+                ancestors = ancestors.filter(depth__lt=max_level)
+            q |= Q(child__in=ancestors.values("ancestor"))
+        links = list(links.filter(q))
+        get_valid_ids = None
+        if only_official:
+            # retrieves all official parents at *date* and then prunes the
             # tree so that we only run one query
-            res2 = []
-            sh = models.StateHistory.objects.at(date).officials().filter(plmobject__in=parents_ids)
-            valid_parents = set(sh.values_list("plmobject_id", flat=True))
-            # level_threshold is used to cut a "branch" of the tree
-            level_threshold = len(res) + 1 # all levels are inferior to this value
-            for parent in res:
-                if parent.level > level_threshold:
-                    continue
-                if parent.link.parent_id in valid_parents:
-                    res2.append(parent)
-                    level_threshold = len(res) + 1
-                else:
-                    level_threshold = parent.level
-            res = res2
-        return res
+            def get_valid_ids(parents_ids):
+                sh = models.StateHistory.objects.at(date).officials()\
+                        .filter(plmobject__in=parents_ids)
+                return set(sh.values_list("plmobject_id", flat=True))
+        return build_bom_tree(self.id, links, max_level, Parent,
+                "child_id", "parent_id", get_valid_ids)
 
     def update_children(self, formset):
         u"""
@@ -591,7 +631,64 @@ class PartController(PLMObjectController):
 
         ``obj``
             this controller
+
+        .. versionchanged:: 2.1
+
+            The result is cached (see :mod:`.bomcache`).
+        """
+        key = bomcache.get_snapshot_key(self.id, date, level, state,
+                show_documents, show_alternates)
+        snapshot = bomcache.get_snapshot(key)
+        if snapshot is not None:
+            bom = self._load_bom(snapshot, level)
+            if bom is not None:
+                return bom
+        bom = self._build_bom(date, level, state, show_documents, show_alternates)
+        bomcache.set_snapshot(key, dump_bom(bom))
+        return bom
+
+    def _load_bom(self, snapshot, level):
         """
+        Returns a BOM (see :meth:`get_bom`) from a snapshot returned by
+        :func:`dump_bom`. Returns None if an object of the snapshot does
+        not exist anymore.
+        """
+        link_ids = [link_id for l, link_id in snapshot["children"]]
+        links = models.ParentChildLink.objects.select_related("child",
+                "child__state", "child__lifecycle").in_bulk(link_ids)
+        doc_ids = set(chain.from_iterable(snapshot["documents"].itervalues()))
+        docs = models.Document.objects.select_related("state").in_bulk(doc_ids)
+        alt_ids = set(chain.from_iterable(snapshot["alternates"].itervalues()))
+        alts = models.Part.objects.in_bulk(alt_ids)
+        if (len(links) != len(set(link_ids)) or len(docs) != len(doc_ids)
+            or len(alts) != len(alt_ids)):
+            return None
+        children = [Child(l, links[link_id]) for l, link_id in snapshot["children"]]
+        extra_columns = []
+        if children:
+            for PCLE in models.get_PCLEs(self.object):
+                fields = PCLE.get_visible_fields()
+                extra_columns.extend((f, PCLE._meta.get_field(f).verbose_name)
+                        for f in fields)
+        extension_data = defaultdict(dict, snapshot["extension_data"])
+        documents = defaultdict(list)
+        for part_id, ids in snapshot["documents"].iteritems():
+            documents[part_id] = [docs[i] for i in ids]
+        alternates = defaultdict(list)
+        for part_id, ids in snapshot["alternates"].iteritems():
+            alternates[part_id] = [alts[i] for i in ids]
+        return {
+                'children' : children,
+                'extra_columns' : extra_columns,
+                'extension_data' : extension_data,
+                'states' : snapshot["states"],
+                'documents' : documents,
+                'level' : level,
+                'obj' : self,
+                'alternates' : alternates,
+                }
+
+    def _build_bom(self, date, level, state, show_documents, show_alternates):
         max_level = 1 if level == "first" else -1
         only_official = state == "official"
         children = self.get_children(max_level, date=date, only_official=only_official)
@@ -684,13 +781,21 @@ class PartController(PLMObjectController):
             tuple of BOMs (at date *date1* and date *date2*)
 
         """
-        bom1 = self.get_bom(date1, level, state, show_documents, show_alternates)
-        bom2 = self.get_bom(date2, level, state, show_documents, show_alternates)
+        options = (level, state, show_documents, show_alternates)
+        bom1 = self.get_bom(date1, *options)
+        bom2 = self.get_bom(date2, *options)
         s1 = flatten_bom(bom1)
         s2 = flatten_bom(bom2)
-        matcher = difflib.SequenceMatcher(None, s1, s2)
+        key = bomcache.get_diff_key(
+                bomcache.get_snapshot_key(self.id, date1, *options),
+                bomcache.get_snapshot_key(self.id, date2, *options))
+        opcodes = bomcache.get_snapshot(key)
+        if opcodes is None:
+            matcher = difflib.SequenceMatcher(None, s1, s2)
+            opcodes = matcher.get_opcodes()
+            bomcache.set_snapshot(key, opcodes)
         diff = ((tag, izip_longest(s1[i1:i2], s2[j1:j2]))
-            for tag, i1, i2, j1, j2 in matcher.get_opcodes())
+            for tag, i1, i2, j1, j2 in opcodes)
         ctx = {
                 "diff" : diff,
                 "boms" : (bom1, bom2),
@@ -739,6 +844,7 @@ class PartController(PLMObjectController):
             if link.parent_id == parent.id:
                 link.end_time = now
                 link.save()
+        bomcache.invalidate_boms(parent.id for link, parent in parents)
         return new_controller
 
     def get_suggested_documents(self):
@@ -870,6 +976,7 @@ class PartController(PLMObjectController):
         if isinstance(document, PLMObjectController):
             document = document.object
         self.documentpartlink_part.create(document=document)
+        bomcache.invalidate_boms([self.id])
         self._save_histo(models.DocumentPartLink.ACTION_NAME,
                          "%s (%s//%s//%s) <=> %s (%s//%s//%s)" % (self.object.name, self.object.type, self.object.reference, self.object.revision, document.name, document.type, document.reference, document.revision))
 
@@ -887,6 +994,7 @@ class PartController(PLMObjectController):
             document = document.object
         link = self.documentpartlink_part.now().get(document=document)
         link.end()
+        bomcache.invalidate_boms([self.id])
         self._save_histo("Undo " + models.DocumentPartLink.ACTION_NAME,
                          "%s (%s//%s//%s) <=> %s (%s//%s//%s)" % (self.object.name, self.object.type, self.object.reference, self.object.revision, document.name, document.type, document.reference, document.revision))
 
@@ -1010,6 +1118,7 @@ class PartController(PLMObjectController):
                     self.check_attach_document(doc, True)
                 ids = (d.id for d in docs)
                 self.documentpartlink_part.filter(document__in=ids).end()
+                bomcache.invalidate_boms([self.id])
 
     def _deprecate(self):
         super(PartController, self)._deprecate()
@@ -1023,6 +1132,8 @@ class PartController(PLMObjectController):
             * removes all :class:`.DocumentPartLink` related to the object
             * removes all children/parents link (set their end_time)
         """
+        # invalidates the boms before the parents are lost
+        bomcache.invalidate_boms([self.id])
         super(PartController, self).cancel()
         self.get_attached_documents().end()
         self.end_alternate()
@@ -1093,6 +1204,77 @@ class PartController(PLMObjectController):
         # each file and testing their extension
         return (df for df in files.select_related(d_o_u) if is_cad_file(df.filename))
 
+    def get_assembly_files(self, date=None, only_official=False):
+        """
+        .. versionadded:: 2.1
+
+        Returns a list of tuples (directory, :class:`.DocumentFile`) of all
+        files of the documents attached to the part and its descendants
+        at *date*.
+
+        Directories follow the BOM: the directory of a child
+        (:samp:`{reference}_{revision}`) is a subdirectory of the directory
+        of its parent. A document attached to several parts is only
+        returned once, in the directory of the first part of the BOM.
+
+        :param date: date of the BOM (see :meth:`get_children`)
+        :param only_official: True if unofficial children and documents
+            are excluded
+
+        Documents that the user can not read are excluded.
+        If *date* is set, the revisions of the files valid at *date* are
+        returned. Files whose content has been deleted since are excluded.
+        """
+        def get_name(part):
+            name = u"%s_%s" % (part.reference, part.revision)
+            return name.replace("/", "_").replace("\\", "_")
+        children = self.get_children(-1, date=date, related=("child",),
+                only_official=only_official)
+        # directory of each part, in the order of the BOM
+        stack = [get_name(self.object)]
+        paths = [(self.id, stack[0])]
+        for level, link in children:
+            del stack[level:]
+            stack.append(get_name(link.child))
+            paths.append((link.child_id, u"/".join(stack)))
+
+        links = models.DocumentPartLink.objects.at(date)\
+                .filter(part__in=set(p for p, path in paths))\
+                .order_by("document__reference", "document__revision")
+        documents = defaultdict(list)
+        doc_ids = set()
+        for part_id, doc_id in links.values_list("part", "document"):
+            documents[part_id].append(doc_id)
+            doc_ids.add(doc_id)
+        if only_official and doc_ids:
+            sh = models.StateHistory.objects.at(date).officials()\
+                    .filter(plmobject__in=doc_ids)
+            doc_ids = set(sh.values_list("plmobject_id", flat=True))
+        # documents of the descendants may not be readable by the user
+        doc_ids = set(filter_readable(self._user, doc_ids))
+        files = defaultdict(list)
+        d_o_u = "document__owner__username"
+        dfs = models.DocumentFile.objects.filter(document__in=doc_ids)
+        if date is None:
+            dfs = dfs.filter(deprecated=False)
+        else:
+            # a checked-in file keeps its previous revision as a deprecated
+            # file ended at the check-in
+            dfs = dfs.filter(ctime__lte=date, deleted=False).filter(
+                    Q(end_time__gt=date) | Q(end_time=None, deprecated=False))
+        dfs = dfs.select_related(d_o_u).order_by("filename", "id")
+        for df in dfs:
+            files[df.document_id].append(df)
+
+        result = []
+        visited = set()
+        for part_id, path in paths:
+            for doc_id in documents[part_id]:
+                if doc_id in doc_ids and doc_id not in visited:
+                    visited.add(doc_id)
+                    result.extend((path, df) for df in files[doc_id])
+        return result
+
     def check_add_alternate(self, part, check_perm=True):
         if check_perm:
             self.check_permission("owner")
@@ -1169,6 +1351,7 @@ class PartController(PLMObjectController):
     def add_alternate(self, part, check_perm=True):
         self.check_add_alternate(part, check_perm)
         partset = models.AlternatePartSet.join(self.object, getattr(part, "object", part))
+        bomcache.invalidate_boms(partset.parts.values_list("id", flat=True))
         # TODO: HISTO
         return partset
 
@@ -1192,6 +1375,7 @@ class PartController(PLMObjectController):
         self.check_permission("owner")
         self.check_editable()
         partset = models.AlternatePartSet.get_partset(self.object)
+        bomcache.invalidate_boms(partset.parts.values_list("id", flat=True))
         # TODO: histo
         return partset.remove_part(part)
 
@@ -1199,6 +1383,7 @@ class PartController(PLMObjectController):
         # FIXME : rename me
         partset = models.AlternatePartSet.get_partset(self.object)
         if partset:
+            bomcache.invalidate_boms(partset.parts.values_list("id", flat=True))
             return partset.remove_part(self.object)
         return None
 
@@ -1233,9 +1418,75 @@ class PartController(PLMObjectController):
             self.end_alternate()
         return r
 
+    def _promote_objects(self, objects):
+        """
+        .. versionadded:: 2.1
+
+        Promotes *objects* (see :meth:`.PLMObjectController._promote_objects`)
+        and updates their alternate part sets like :meth:`promote`: an
+        official revision replaces its previous revision in its alternate
+        part set and a deprecated part is removed from its set.
+
+        Alternate part sets are loaded in a constant number of queries,
+        only parts which have alternates are updated one by one.
+        """
+        ids = [obj.id for obj in objects]
+        revisions = dict(models.RevisionLink.current_objects.filter(new__in=ids)\
+                .values_list("old", "new"))
+        # new revision id -> alternates of its previous revision, they are
+        # loaded before the previous revisions are deprecated or cancelled
+        alternates = {}
+        if revisions:
+            through = models.AlternatePartSet.parts.through
+            partsets = models.AlternatePartSet.current_objects.filter(parts__in=list(revisions))
+            parts = through.objects.filter(alternatepartset__in=partsets)
+            sets = defaultdict(set)
+            for set_id, part_id in parts.values_list("alternatepartset", "part"):
+                sets[set_id].add(part_id)
+            for part_ids in sets.itervalues():
+                for old in part_ids.intersection(revisions):
+                    others = part_ids - set([old])
+                    if others:
+                        alternates[revisions[old]] = min(others)
+        updated_revisions = super(PartController, self)._promote_objects(objects)
+        new_state = objects[0].state
+        if alternates and new_state == self.lifecycle.official_state:
+            others = models.Part.objects.in_bulk(alternates.values())
+            for obj in objects:
+                if obj.id in alternates:
+                    ctrl = PartController(obj, self._user, self._mail_blocked,
+                            getattr(self.object, "no_index", False))
+                    try:
+                        # do not check owner permission since the company
+                        # owns the part
+                        ctrl.add_alternate(others[alternates[obj.id]], check_perm=False)
+                    except (ValueError, PermissionError):
+                        # alternate/bom rules are not respected
+                        pass
+        elif new_state == self.lifecycle.last_state:
+            partsets = models.AlternatePartSet.current_objects.filter(parts__in=ids)
+            for partset in partsets.distinct():
+                part_ids = set(partset.parts.values_list("id", flat=True))
+                bomcache.invalidate_boms(part_ids)
+                for part_id in part_ids.intersection(ids):
+                    if partset is None:
+                        break
+                    partset = partset.remove_part(models.Part(id=part_id))
+        return updated_revisions
+
     @transaction.commit_on_success
     def promote_assembly(self):
-        # FIXME Inefficient version
+        """
+        Promotes the part and all its children which are at the same state
+        and follow the same lifecycle.
+
+        .. versionchanged:: 2.1
+
+            The whole assembly is checked and promoted in a constant number
+            of queries (see :meth:`._check_last_promoter` and
+            :meth:`._promote_objects`) and users receive one mail per user
+            instead of one mail per promoted part.
+        """
         # FIXME does not check if alternates part are promoted
         if not (self.is_proposed or self.is_draft):
             raise ValueError("invalid state")
@@ -1271,21 +1522,16 @@ class PartController(PLMObjectController):
                 msg = msg.format(type=type, ref=ref, revisions=revisions)
                 raise ValueError(msg)
 
-        # XXX: get leaf parts ?
-
         # check if assembly is promotable
-        to_promote = [c for c in children
-                if c.link.child.state == self.state and c.link.child.lifecycle == self.lifecycle]
-        # promote last children first
-        to_promote.sort(key=attrgetter("level"), reverse=True)
-        # remove duplicated children, only keep children with the higher level
-        to_promote2 = []
+        to_promote = []
         to_promote_ids = set()
-        for c in to_promote:
-            if c.link.child_id not in to_promote_ids:
-                to_promote2.append(c.link.child)
-                to_promote_ids.add(c.link.child_id)
-        to_promote = to_promote2
+        for c in children:
+            child = c.link.child
+            if (child.state_id == self.object.state_id and
+                child.lifecycle_id == self.object.lifecycle_id and
+                child.id not in to_promote_ids):
+                to_promote.append(child)
+                to_promote_ids.add(child.id)
 
         # other children have a different lifecycle or are already promoted
         # they can not be at a previous state because their parents could not
@@ -1294,28 +1540,29 @@ class PartController(PLMObjectController):
         # the assembly is promotable if the last children are promotable
         if self.is_draft:
             # proposed last children are always promotable
-            last_children = (c.link.child for c in get_last_children(children))
-            if not all(child.is_promotable() for child in last_children if child.id in to_promote_ids):
-                # TODO: only test if they all have an official document attached
+            # draft last children are promotable if they have been approved
+            # or if an official document is attached to them
+            leaves = set(c.link.child_id for c in get_last_children(children))
+            leaves &= to_promote_ids
+            if leaves:
+                approved = models.PromotionApproval.current_objects.\
+                        filter(plmobject__in=leaves).values_list("plmobject", flat=True)
+                leaves.difference_update(approved)
+            if leaves:
+                official = F("document__lifecycle__official_state")
+                documented = models.DocumentPartLink.current_objects.\
+                        filter(part__in=leaves, document__state=official).\
+                        values_list("part", flat=True)
+                leaves.difference_update(documented)
+            if leaves:
                 # fixme: list parts
                 raise PromotionError("Some children are not promotable")
 
-        ctrls = [PartController(c, self._user, True, True) for c in to_promote]
-        ctrls.append(self)
-        updated = to_promote[:]
-        updated.append(self.object)
-        if not all(ctrl.is_last_promoter() for ctrl in ctrls):
-            # TODO: get all required signers in one query
-            # and compare with represented signers
-            # must still check signer permission
-            raise PromotionError()
-        for ctrl in ctrls:
-            # TODO: create (state) histories in bulk
-            updated.extend(ctrl.promote(checked=True)["updated_revisions"])
+        to_promote.append(self.object)
+        self._check_last_promoter(to_promote)
+        updated = to_promote + self._promote_objects(to_promote)
 
         # send mails and update indexes
-        for ctrl in ctrls:
-            # TODO merge mails ?
-            ctrl.unblock_mails()
+        self.unblock_mails()
         update_indexes.delay([(c._meta.app_label, c._meta.module_name, c.pk) for c in updated])
 
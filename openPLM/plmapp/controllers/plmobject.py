@@ -26,20 +26,25 @@
 """
 
 import re
+from collections import defaultdict
 
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Max
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
 import openPLM.plmapp.models as models
+from openPLM.plmapp import bomcache, archivecache
+from openPLM.plmapp.permissions import get_context
 from openPLM.plmapp.exceptions import RevisionError, PermissionError,\
     PromotionError
 from openPLM.plmapp.references import parse_reference_number, validate_reference, validate_revision
 from openPLM.plmapp.utils import level_to_sign_str
 from openPLM.plmapp.controllers import get_controller
 from openPLM.plmapp.controllers.base import Controller
+from openPLM.plmapp.mail import send_merged_histories_mail
 
 
 class PLMObjectController(Controller):
@@ -180,7 +185,7 @@ class PLMObjectController(Controller):
         if user is None:
             user = self._user
         role = self.get_current_signer_role()
-        delegators = set(models.DelegationLink.get_delegators(self._user, role))
+        delegators = get_context(self._user).get_delegators(role)
         delegators.add(self._user.id)
         delegators.difference_update(self.get_approvers())
         delegators.intersection_update(self.get_current_signers())
@@ -265,6 +270,7 @@ class PLMObjectController(Controller):
             updated_revisions = []
             if self.object.state == lifecycle.official_state:
                updated_revisions = self._officialize()
+               archivecache.schedule([self.object.id])
             self._update_state_history()
             self._clear_approvals()
             return {"new_state": self.object, "updated_revisions": updated_revisions}
@@ -276,6 +282,13 @@ class PLMObjectController(Controller):
         # changes the owner to the company
         cie = models.User.objects.get(username=settings.COMPANY)
         self.set_owner(cie, True)
+        return self._update_previous_revisions()
+
+    def _update_previous_revisions(self):
+        """
+        Cancels or deprecates previous revisions of an officialized object.
+        Returns the list of updated revisions.
+        """
         updated_revisions = []
         for rev in self.get_previous_revisions():
             if rev.is_cancelled:
@@ -290,11 +303,135 @@ class PLMObjectController(Controller):
                 else:
                     ctrl._deprecate()
                 if self._mail_blocked:
-                    self._pending_mails.extends(ctrl._pending_mails)
+                    self._pending_mails.extend(ctrl._pending_mails)
                     del ctrl._pending_mails[:]
                 updated_revisions.append(ctrl.object)
         return updated_revisions
 
+    def _check_last_promoter(self, objects):
+        """
+        .. versionadded:: 2.1
+
+        Checks that :attr:`_user` is the last promoter of all *objects*,
+        like :meth:`is_last_promoter` does for :attr:`object`, in a constant
+        number of queries.
+
+        *objects* must be at the same state and follow the same lifecycle
+        as :attr:`object`.
+
+        :raise: :exc:`.PromotionError` if an object is not approved by all
+            its other signers.
+        :returns: a dictionary (object id -> set of represented signers' id)
+        """
+        if not self._user.is_active:
+            raise PromotionError()
+        role = self.get_current_signer_role()
+        next_state = self.lifecycle.to_states_list().next_state(self.state.name)
+        ids = [obj.id for obj in objects]
+        users = get_context(self._user).get_delegators(role)
+        users.add(self._user.id)
+        signers = defaultdict(set)
+        links = models.PLMObjectUserLink.current_objects.filter(plmobject__in=ids,
+                role=role)
+        for obj_id, user_id in links.values_list("plmobject", "user"):
+            signers[obj_id].add(user_id)
+        approvers = defaultdict(set)
+        approvals = models.PromotionApproval.current_objects.filter(plmobject__in=ids,
+                current_state=self.state, next_state=next_state)
+        for obj_id, user_id in approvals.values_list("plmobject", "user"):
+            approvers[obj_id].add(user_id)
+        represented = {}
+        for obj in objects:
+            not_approvers = signers[obj.id] - approvers[obj.id]
+            represented[obj.id] = not_approvers & users
+            if not represented[obj.id] or not_approvers - users:
+                raise PromotionError()
+        return represented
+
+    def _promote_objects(self, objects):
+        """
+        .. versionadded:: 2.1
+
+        Promotes all *objects* in a constant number of queries (if no
+        previous revisions must be deprecated or cancelled) and notifies
+        their owners, notified users and signers with one mail per user.
+
+        *objects* must have been checked (see :meth:`_check_last_promoter`),
+        be at the same state and follow the same lifecycle
+        as :attr:`object`.
+
+        :returns: a list of updated (deprecated or cancelled) revisions
+        """
+        now = timezone.now()
+        state = self.state
+        lifecycle = self.lifecycle
+        new_state = lifecycle.to_states_list().next_state(state.name)
+        new_state = models.State.objects.get_or_create(name=new_state)[0]
+        ids = [obj.id for obj in objects]
+        # update() does not set auto_now fields
+        fields = {"state" : new_state, "mtime" : now}
+        official = new_state == lifecycle.official_state
+        if official:
+            cie = models.User.objects.get(username=settings.COMPANY)
+            fields["owner"] = cie
+            models.PLMObjectUserLink.objects.now().filter(plmobject__in=ids,
+                    role=models.ROLE_OWNER).end()
+            models.PLMObjectUserLink.objects.bulk_create(
+                models.PLMObjectUserLink(plmobject=obj, user=cie,
+                    role=models.ROLE_OWNER, ctime=now) for obj in objects)
+            models.links_created.send(sender=models.PLMObjectUserLink)
+        models.PLMObject.objects.filter(id__in=ids).update(**fields)
+        for obj in objects:
+            for field, value in fields.iteritems():
+                setattr(obj, field, value)
+
+        # histories
+        details = "from state %(first)s to state %(second)s" % \
+                {"first" :state.name, "second" : new_state.name}
+        last_id = self.HISTORY.objects.aggregate(last_id=Max("id"))["last_id"] or 0
+        self.HISTORY.objects.bulk_create(self.HISTORY(plmobject=obj,
+            action="promoted", details=details, user=self._user) for obj in objects)
+        # bulk_create does not set primary keys, the created histories
+        # are fetched again (by ids greater than *last_id*) to be sent by mail
+        histories = self.HISTORY.objects.filter(id__gt=last_id,
+                plmobject__in=ids, action="promoted", user=self._user,
+                details=details)
+        self._send_mail(send_merged_histories_mail, self.object,
+                [models.ROLE_OWNER, models.ROLE_NOTIFIED, models.ROLE_SIGN], "promoted",
+                list(histories), self._user, (self._user.email,))
+
+        updated_revisions = []
+        if official:
+            revised = models.RevisionLink.current_objects.filter(new__in=ids)
+            revised = set(revised.values_list("new", flat=True))
+            for obj in objects:
+                if obj.id in revised:
+                    ctrl = type(self)(obj, self._user, self._mail_blocked,
+                            getattr(self.object, "no_index", False))
+                    updated_revisions.extend(ctrl._update_previous_revisions())
+                    self._pending_mails.extend(ctrl._pending_mails)
+                    del ctrl._pending_mails[:]
+
+        # state histories
+        models.StateHistory.objects.filter(plmobject__in=ids,
+            end_time=None).update(end_time=now)
+        state_histories = []
+        for obj in objects:
+            sh = models.StateHistory(plmobject=obj, start_time=now,
+                    end_time=None, state=new_state, lifecycle=lifecycle)
+            # save() is not called by bulk_create
+            sh.set_state_category()
+            state_histories.append(sh)
+        models.StateHistory.objects.bulk_create(state_histories)
+        if self.object.is_part:
+            bomcache.invalidate_boms(ids)
+        elif self.object.is_document:
+            bomcache.invalidate_documents_boms(ids)
+        models.PromotionApproval.objects.now().filter(plmobject__in=ids).end()
+        if official:
+            archivecache.schedule(ids)
+        return updated_revisions
+
     def _update_state_history(self):
         """ Updates the :class:`.StateHistory` table of the object."""
         now = timezone.now()
@@ -307,6 +444,11 @@ class PLMObjectController(Controller):
         models.StateHistory.objects.create(plmobject=self.object,
                 start_time=now, end_time=None, state=self.state,
                 lifecycle=self.lifecycle)
+        # states are stored in the BOM snapshots
+        if self.object.is_part:
+            bomcache.invalidate_boms([self.object.id])
+        elif self.object.is_document:
+            bomcache.invalidate_documents_boms([self.object.id])
 
     def _deprecate(self):
         """ Deprecate the object. """
@@ -361,17 +503,11 @@ class PLMObjectController(Controller):
     def has_permission(self, role):
         if not self._user.is_active:
             return False
-        if role == models.ROLE_OWNER and self.owner == self._user:
-            return True
-        if self.users.now().filter(user=self._user, role=role).exists():
+        if role == models.ROLE_OWNER and self.owner_id == self._user.id:
             return True
-
-        users = models.DelegationLink.get_delegators(self._user, role)
-        if users:
-            qset = self.users.now().filter(user__in=users, role=role)
-            return qset.exists()
-        else:
-            return False
+        # roles of the user and of its delegators are cached by
+        # the authorization context of the user
+        return get_context(self._user).has_role(self.object.id, role)
 
     def check_editable(self):
         """
@@ -394,7 +530,7 @@ class PLMObjectController(Controller):
         """
         if user.username == settings.COMPANY:
             return True
-        if not self.group.user_set.filter(id=user.id).exists():
+        if not get_context(user).in_group(self.group_id):
             if raise_:
                 raise PermissionError("The user %s does not belong to the group." % user.username)
             else:
@@ -421,7 +557,7 @@ class PLMObjectController(Controller):
             raise RevisionError("A revision already exists for %s" % self.object)
         if group is None:
             group = self.object.group
-        if not group.user_set.filter(id=self._user.id).exists():
+        if not get_context(self._user).in_group(group.id):
             raise ValueError("Invalid group")
         data = {}
         fields = self.get_modification_fields() + self.get_creation_fields()
@@ -775,7 +911,7 @@ class PLMObjectController(Controller):
         if self._user.username == settings.COMPANY:
             # the company is like a super user
             return True
-        if not self.group.user_set.filter(id=self._user.id).exists():
+        if not get_context(self._user).in_group(self.group_id):
             if raise_:
                 raise PermissionError("action not allowed for %s" % self._user)
             else:
@@ -799,7 +935,7 @@ class PLMObjectController(Controller):
                 return True
             if self.owner_id == self._user.id:
                 return True
-            if self.group.user_set.filter(id=self._user.id).exists():
+            if get_context(self._user).in_group(self.group_id):
                 return True
         if raise_:
             raise PermissionError("You can not see this object.")
@@ -404,8 +404,7 @@ class UserController(Controller):
         path = os.path.realpath(doc_file.file.path)
         if not path.startswith(settings.DOCUMENTS_DIR):
             raise DeleteFileError("Bad path : %s" % path)
-        os.chmod(path, 0700)
-        os.remove(path)
+        models.docfs.delete(doc_file.file.name)
         doc_file.delete()
 
     def update_file(self, formset):
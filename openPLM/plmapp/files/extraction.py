@@ -0,0 +1,214 @@
+############################################################################
+# openPLM - open source PLM
+# Copyright 2010 Philippe Joulaud, Pierre Cosquer
+#
+# This file is part of openPLM.
+#
+#    openPLM is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    openPLM is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with openPLM.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact :
+#    Philippe Joulaud : ninoo.fr@gmail.com
+#    Pierre Cosquer : pcosquer@linobject.com
+################################################################################
+
+
+"""
+.. versionadded:: 2.1
+
+This module extracts the text of a file with :const:`.settings.EXTRACTOR`
+and caches it by content.
+
+Extracted texts are stored as :class:`.ExtractedText` and are looked up by the
+sha1 digest of the file, its extension and the version of the extractor, so
+that a revised document, a copied file or a file reindexed
+by :program:`./manage.py rebuild_index` is not extracted again.
+
+The version of the extractor is the ``EXTRACTOR_VERSION`` setting if it is
+set, otherwise the md5 digest of the extractor program: modifying the script
+invalidates all stored texts.
+
+The total size of stored texts is bounded by the ``EXTRACTED_TEXT_CACHE_SIZE``
+setting (in bytes), the least recently used texts are deleted first.
+The total size and the numbers of hits and misses are kept up to date
+in :class:`.ExtractedTextStats`, so that the stored texts are only scanned
+when some of them must be deleted.
+"""
+
+import os
+import hashlib
+from subprocess import Popen, PIPE
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from openPLM.plmapp.models import ExtractedText, ExtractedTextStats
+
+#: maximal size of an extracted text (1 Mo)
+MAX_SIZE = 1024 * 1024
+
+#: block size used to compute the digest of a file
+BLOCK_SIZE = 64 * 1024
+
+#: default value of the ``EXTRACTED_TEXT_CACHE_SIZE`` setting (512 Mo)
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024
+
+_versions = {}
+
+def get_extractor_version():
+    """
+    Returns the version of the current extractor.
+    """
+    version = getattr(settings, "EXTRACTOR_VERSION", None)
+    if version:
+        return str(version)[:40]
+    path = settings.EXTRACTOR
+    try:
+        key = (path, os.path.getmtime(path))
+    except OSError:
+        return "unknown"
+    if key not in _versions:
+        with open(path, "rb") as f:
+            _versions[key] = hashlib.md5(f.read()).hexdigest()
+    return _versions[key]
+
+def get_cache_size():
+    return getattr(settings, "EXTRACTED_TEXT_CACHE_SIZE", DEFAULT_CACHE_SIZE)
+
+def _create_stats():
+    """
+    Creates the counters from the stored texts.
+    """
+    stats = ExtractedText.objects.aggregate(size=Sum("size"), hits=Sum("hits"))
+    sid = transaction.savepoint()
+    try:
+        ExtractedTextStats.objects.create(pk=1, size=stats["size"] or 0,
+            hits=stats["hits"] or 0, misses=ExtractedText.objects.count())
+        transaction.savepoint_commit(sid)
+    except IntegrityError:
+        # created by another worker
+        transaction.savepoint_rollback(sid)
+
+def get_stats():
+    """
+    Returns the :class:`.ExtractedTextStats` of the stored texts.
+    """
+    try:
+        return ExtractedTextStats.objects.get(pk=1)
+    except ExtractedTextStats.DoesNotExist:
+        _create_stats()
+        return ExtractedTextStats.objects.get(pk=1)
+
+def update_stats(**deltas):
+    """
+    Adds *deltas* (keyword arguments *size*, *hits* or *misses*)
+    to the counters.
+    """
+    fields = dict((name, F(name) + delta) for name, delta in deltas.iteritems())
+    if not ExtractedTextStats.objects.filter(pk=1).update(**fields):
+        # the stored texts already take the deltas into account
+        _create_stats()
+
+def hash_file(path):
+    """
+    Returns the sha1 hex digest of the file *path*.
+    """
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), ""):
+            sha.update(block)
+    return sha.hexdigest()
+
+def run_extractor(path, size=MAX_SIZE):
+    """
+    Runs the extractor on *path* and returns at most *size* bytes of its
+    output as an unicode string.
+    """
+    p = Popen([settings.EXTRACTOR, path], stdout=PIPE, close_fds=True)
+    content = p.stdout.read(size)
+    p.stdout.close()
+    p.wait()
+    return content.decode("utf-8", "ignore")
+
+def extract_text(path, size=MAX_SIZE):
+    """
+    Returns the text of the file *path* (at most *size* bytes).
+
+    The extractor is only run if no file with the same content and
+    the same extension has been extracted before.
+    """
+    ext = os.path.splitext(path)[1].lower()[:20]
+    content_hash = hash_file(path)
+    version = get_extractor_version()
+    texts = ExtractedText.objects.filter(content_hash=content_hash,
+            extension=ext, extractor_version=version)
+    for pk, text in texts.values_list("pk", "text"):
+        ExtractedText.objects.filter(pk=pk).update(hits=F("hits") + 1,
+                atime=timezone.now())
+        update_stats(hits=1)
+        return text[:size]
+    text = run_extractor(path, size)
+    sid = transaction.savepoint()
+    text_size = len(text.encode("utf-8"))
+    try:
+        ExtractedText.objects.create(content_hash=content_hash, extension=ext,
+            extractor_version=version, text=text, size=text_size)
+        transaction.savepoint_commit(sid)
+    except IntegrityError:
+        # the same file has been extracted by another worker
+        transaction.savepoint_rollback(sid)
+    else:
+        update_stats(size=text_size, misses=1)
+        if get_stats().size > get_cache_size():
+            evict()
+    return text
+
+def evict(max_size=None):
+    """
+    Deletes the least recently used texts if the total size of
+    stored texts exceeds *max_size* (default: ``EXTRACTED_TEXT_CACHE_SIZE``)
+    so that it is reduced to 90% of *max_size*.
+
+    Returns the number of deleted texts.
+    """
+    max_size = get_cache_size() if max_size is None else max_size
+    if get_stats().size <= max_size:
+        return 0
+    # the running size may have drifted (deleted rows, concurrent
+    # evictions), it is reset to the real size
+    total = ExtractedText.objects.aggregate(total=Sum("size"))["total"] or 0
+    excess = total - int(max_size * 0.9)
+    deleted = []
+    texts = ExtractedText.objects.order_by("atime", "pk").values_list("pk", "size")
+    for pk, size in texts.iterator():
+        if excess <= 0:
+            break
+        deleted.append(pk)
+        excess -= size
+        total -= size
+    for i in xrange(0, len(deleted), 500):
+        ExtractedText.objects.filter(pk__in=deleted[i:i + 500]).delete()
+    ExtractedTextStats.objects.filter(pk=1).update(size=total)
+    return len(deleted)
+
+def get_hit_ratio():
+    """
+    Returns the ratio of extractions avoided by the stored texts
+    (a number between 0 and 1), evicted texts included.
+    """
+    stats = get_stats()
+    if stats.hits + stats.misses == 0:
+        return 0.0
+    return float(stats.hits) / (stats.hits + stats.misses)
@@ -27,10 +27,6 @@ This module contains a function :func:`send_mail` which can be used to notify
 users about a changement in a :class:`.PLMObject`.
 """
 from collections import Iterable, Mapping, defaultdict
-from operator import itemgetter
-from itertools import groupby
-
-import kjbuckets
 
 from django.conf import settings
 from django.utils import translation
@@ -42,29 +38,43 @@ from django.db.models.loading import get_model
 from django.contrib.sites.models import Site
 from djcelery_transactions import task
 
-from openPLM.plmapp.models import (User, UserProfile,
-        DelegationLink, ROLE_OWNER, ROLE_SIGN)
+from openPLM.plmapp.models import (User, UserProfile, History,
+        ClosureDelegationLink, PLMObjectUserLink, ROLE_OWNER, ROLE_SIGN)
+
+
+def get_roles_filter(roles):
+    roles_filter = Q()
+    for role in roles:
+        if role == ROLE_SIGN:
+            roles_filter |= Q(role__startswith=role)
+        else:
+            roles_filter |= Q(role=role)
+    return roles_filter
 
+def get_delegatees(users, roles_filter):
+    """
+    .. versionadded:: 2.1
+
+    Returns a dictionary (user id -> set of delegatee ids) of the direct
+    and indirect delegatees of *users* for the roles matching *roles_filter*.
+    """
+    delegatees = defaultdict(set)
+    if users:
+        links = ClosureDelegationLink.objects.filter(roles_filter,
+                delegator__in=users).order_by()
+        for delegator, delegatee in links.values_list("delegator", "delegatee"):
+            delegatees[delegator].add(delegatee)
+    return delegatees
 
 def get_recipients(obj, roles, users):
     recipients = set(users)
     if hasattr(obj, "users"):
         manager = obj.users.now().order_by()
-        roles_filter = Q()
-
-        for role in roles:
-            if role == ROLE_SIGN:
-                roles_filter |= Q(role__startswith=role)
-            else:
-                roles_filter |= Q(role=role)
+        roles_filter = get_roles_filter(roles)
         users = list(manager.filter(roles_filter).values_list("user", flat=True).distinct())
         recipients.update(users)
-        links = tuple(DelegationLink.current_objects.filter(roles_filter).order_by("role")\
-                .values_list("role", "delegator", "delegatee"))
-        for role, group in groupby(links, itemgetter(0)):
-            gr = kjbuckets.kjGraph(tuple((x[1], x[2]) for x in group))
-            for u in users:
-                recipients.update(gr.reachable(u).items())
+        for delegatees in get_delegatees(users, roles_filter).itervalues():
+            recipients.update(delegatees)
     elif roles == [ROLE_OWNER]:
         if hasattr(obj, "owner"):
             recipients.add(obj.owner_id)
@@ -72,6 +82,27 @@ def get_recipients(obj, roles, users):
             recipients.add(obj.id)
     return recipients
 
+def get_bulk_recipients(object_ids, roles):
+    """
+    .. versionadded:: 2.1
+
+    Returns a dictionary (plmobject id -> set of recipient ids) of the users
+    who have one of the roles *roles* for one of the objects of
+    *object_ids* and their delegatees.
+    This function runs two queries whatever the number of objects.
+    """
+    recipients = dict((obj_id, set()) for obj_id in object_ids)
+    roles_filter = get_roles_filter(roles)
+    links = PLMObjectUserLink.current_objects.filter(roles_filter,
+            plmobject__in=recipients.keys()).order_by()
+    for obj_id, user_id in links.values_list("plmobject", "user"):
+        recipients[obj_id].add(user_id)
+    delegatees = get_delegatees(set().union(*recipients.values()), roles_filter)
+    for users in recipients.itervalues():
+        for u in tuple(users):
+            users.update(delegatees[u])
+    return recipients
+
 def convert_users(users):
     if users:
         r = iter(users).next()
@@ -134,6 +165,23 @@ def unserialize(obj):
         return [unserialize(o) for o in obj]
     return obj
 
+def send_merged_histories_mail(plmobject, roles, last_action, histories, user,
+        blacklist=(), template="mails/history"):
+    """
+    .. versionadded:: 2.1
+
+    Sends the notifications of *histories*, which may be related to
+    several objects, like :func:`send_histories_mail` but each user receives
+    only one mail listing all the histories that concern them.
+
+    *plmobject* is the main modified object (for example, the root of
+    a promoted assembly), it is used to build the subject of the mails.
+    """
+    plmobject = CT.from_object(plmobject)
+    user = CT.from_object(user)
+    do_send_merged_histories_mail.delay(plmobject, roles, last_action,
+            [h.id for h in histories], user, blacklist, template)
+
 @task(name="openPLM.plmapp.mail.do_send_histories_mail",ignore_result=True)
 def do_send_histories_mail(plmobject, roles, last_action, histories, user, blacklist=(),
               users=(), template="mails/history"):
@@ -163,6 +211,39 @@ def do_send_histories_mail(plmobject, roles, last_action, histories, user, black
             }
         do_send_mail(subject, recipients, ctx, template, blacklist)
 
+@task(name="openPLM.plmapp.mail.do_send_merged_histories_mail", ignore_result=True)
+def do_send_merged_histories_mail(plmobject, roles, last_action, history_ids, user,
+        blacklist=(), template="mails/history"):
+    """
+    .. versionadded:: 2.1
+
+    Task called by :func:`send_merged_histories_mail`. Users who are notified
+    of the same histories receive the same mail.
+    """
+    histories = list(History.objects.filter(id__in=history_ids).\
+            select_related("plmobject").order_by("id"))
+    recipients = get_bulk_recipients(set(h.plmobject_id for h in histories), roles)
+    user_histories = defaultdict(list)
+    for h in histories:
+        for recipient in recipients[h.plmobject_id]:
+            user_histories[recipient].append(h)
+    groups = defaultdict(set)
+    for recipient, hs in user_histories.iteritems():
+        groups[tuple(hs)].add(recipient)
+    if groups:
+        plmobject = unserialize(plmobject)
+        user = unserialize(user)
+        subject = "[PLM] " + unicode(plmobject)
+        for hs, users in groups.iteritems():
+            ctx = {
+                    "last_action" : last_action,
+                    "histories" : hs,
+                    "plmobject" : plmobject,
+                    "user" : user,
+                    "merged" : True,
+                }
+            do_send_mail(subject, users, ctx, template, blacklist)
+
 @task(name="openPLM.plmapp.mail.do_send_mail", ignore_result=True)
 def do_send_mail(subject, recipients, ctx, template, blacklist=()):
     if recipients:
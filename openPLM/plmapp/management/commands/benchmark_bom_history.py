@@ -0,0 +1,207 @@
+"""
+Management utility to measure the performances of historical BOM queries
+(children and parents of a part at a given date) on a synthetic history
+of links (one million links by default).
+
+All created parts, links and state histories are rolled back at the end
+of the command.
+"""
+
+import time
+import random
+import datetime
+from optparse import make_option
+
+from django.contrib.auth.models import User
+from django.core.management.base import NoArgsCommand, CommandError
+from django.db import transaction, connection
+from django.utils import timezone
+
+from openPLM.plmapp import models
+from openPLM.plmapp.controllers import PartController
+
+#: number of rows inserted by one bulk_create call
+BATCH_SIZE = 1000
+
+#: history span of the synthetic links
+SPAN = datetime.timedelta(days=5 * 365)
+
+def get_statistics(times):
+    """
+    Returns a dictionary of statistics (in milliseconds) of *times*
+    (list of durations in seconds).
+    """
+    times = sorted(times)
+    count = len(times)
+    return {
+        "count" : count,
+        "mean" : 1000 * sum(times) / count,
+        "median" : 1000 * times[count // 2],
+        "p95" : 1000 * times[min(count - 1, int(count * 0.95))],
+        "max" : 1000 * times[-1],
+    }
+
+
+class Command(NoArgsCommand):
+    option_list = NoArgsCommand.option_list + (
+        make_option('-l', '--links', dest='links', type='int', default=1000000,
+            help='Number of links, default: 1000000.'),
+        make_option('-p', '--parts', dest='parts', type='int', default=10000,
+            help='Number of parts, default: 10000.'),
+        make_option('-q', '--queries', dest='queries', type='int', default=200,
+            help='Number of queries of each kind, default: 200.'),
+        make_option('-u', '--user', dest='user', default=None,
+            help='Username of the creator of the parts, default: '
+                 'the first superuser.'),
+        make_option('-s', '--seed', dest='seed', type='int', default=0,
+            help='Seed of the random generator, default: 0.'),
+    )
+    help = 'Measures historical BOM queries on a synthetic history of links.'
+
+    def handle_noargs(self, **options):
+        if options["parts"] < 2 or options["links"] < options["parts"]:
+            raise CommandError("At least 2 parts and one link per part are required")
+        verbosity = int(options.get("verbosity", 1))
+        self.rand = random.Random(options["seed"])
+        self.end = timezone.now()
+        self.start = self.end - SPAN
+        with transaction.commit_manually():
+            try:
+                self.setup_objects(options["user"])
+                t = time.time()
+                parts = self.create_parts(options["parts"])
+                self.create_state_histories(parts)
+                count = self.create_links(parts, options["links"])
+                if connection.vendor == "postgresql":
+                    cursor = connection.cursor()
+                    for table in ("plmapp_parentchildlink", "plmapp_statehistory"):
+                        cursor.execute("ANALYZE %s" % table)
+                if verbosity >= 1:
+                    self.stdout.write("%d parts and %d links created in %.1f s\n"
+                        % (len(parts), count, time.time() - t))
+                if verbosity >= 2:
+                    self.explain(parts)
+                self.measure(parts, options["queries"])
+            finally:
+                transaction.rollback()
+
+    def setup_objects(self, username):
+        if username is None:
+            users = User.objects.filter(is_superuser=True).order_by("id")[:1]
+        else:
+            users = User.objects.filter(username=username)
+        if not users:
+            raise CommandError("No user found")
+        self.user = users[0]
+        groups = models.GroupInfo.objects.order_by("id")[:1]
+        if not groups:
+            raise CommandError("No group found")
+        self.group = groups[0]
+        self.lifecycle = models.get_default_lifecycle()
+
+    def random_time(self):
+        return self.start + datetime.timedelta(
+            seconds=self.rand.random() * SPAN.total_seconds())
+
+    def random_times(self, count):
+        """
+        Returns *count* distinct dates (at a second precision, since some
+        databases do not store microseconds) in ascending order.
+        """
+        seconds = self.rand.sample(xrange(int(SPAN.total_seconds())), count)
+        return [self.start + datetime.timedelta(seconds=s)
+                for s in sorted(seconds)]
+
+    def create_parts(self, count):
+        parts = []
+        lifecycle = self.lifecycle
+        for i in xrange(count):
+            part = models.Part(type="Part", reference="BENCHMARK-%d" % i,
+                    revision="a", lifecycle=lifecycle, state=lifecycle.first_state,
+                    creator=self.user, owner=self.user, group=self.group)
+            part.no_index = True
+            part.save()
+            parts.append(part)
+        return parts
+
+    def create_state_histories(self, parts):
+        """
+        Each part is a draft and then official after a random date.
+        """
+        histories = []
+        states = (self.lifecycle.first_state, self.lifecycle.official_state)
+        for part in parts:
+            promotion = self.random_time()
+            for state, start, end in ((states[0], self.start, promotion),
+                                      (states[1], promotion, None)):
+                sh = models.StateHistory(plmobject=part, state=state,
+                        lifecycle=self.lifecycle, start_time=start, end_time=end)
+                sh.set_state_category()
+                histories.append(sh)
+        models.StateHistory.objects.bulk_create(histories, batch_size=BATCH_SIZE)
+
+    def create_links(self, parts, count):
+        """
+        Creates *count* links: each part (except the root) has one parent,
+        the link between a part and its parent has been ended and recreated
+        several times (a new revision of the link), the last one is alive.
+        """
+        # ctime is set by auto_now_add, it must be kept to build a history
+        field = models.ParentChildLink._meta.get_field("ctime")
+        auto_now_add, field.auto_now_add = field.auto_now_add, False
+        try:
+            created = 0
+            pending = []
+            nb_children = len(parts) - 1
+            for index, child in enumerate(parts[1:]):
+                revisions = count // nb_children + (index < count % nb_children)
+                parent = parts[self.rand.randint(max(0, index - 50), index)]
+                # end times must be distinct (unique_together)
+                dates = self.random_times(revisions)
+                for r, ctime in enumerate(dates):
+                    end_time = dates[r + 1] if r + 1 < revisions else None
+                    pending.append(models.ParentChildLink(parent=parent,
+                        child=child, ctime=ctime, end_time=end_time,
+                        quantity=self.rand.randint(1, 10), order=r))
+                if len(pending) >= 10 * BATCH_SIZE:
+                    models.ParentChildLink.objects.bulk_create(pending,
+                            batch_size=BATCH_SIZE)
+                    created += len(pending)
+                    pending = []
+            models.ParentChildLink.objects.bulk_create(pending,
+                    batch_size=BATCH_SIZE)
+            created += len(pending)
+        finally:
+            field.auto_now_add = auto_now_add
+        return created
+
+    def explain(self, parts):
+        """
+        Prints the plan of a query of children at a given date.
+        """
+        qs = models.ParentChildLink.objects.at(self.random_time())\
+                .filter(parent=parts[0])
+        sql, params = qs.query.sql_with_params()
+        cursor = connection.cursor()
+        cursor.execute("EXPLAIN " + sql, params)
+        for row in cursor.fetchall():
+            self.stdout.write(" ".join(unicode(c) for c in row) + "\n")
+
+    def measure(self, parts, count):
+        queries = (
+            ("children", lambda ctrl, date: ctrl.get_children(1, date)),
+            ("official children", lambda ctrl, date:
+                ctrl.get_children(1, date, only_official=True)),
+            ("parents", lambda ctrl, date: ctrl.get_parents(1, date)),
+        )
+        for name, query in queries:
+            times = []
+            for i in xrange(count):
+                ctrl = PartController(self.rand.choice(parts), self.user)
+                date = self.random_time()
+                t = time.time()
+                query(ctrl, date)
+                times.append(time.time() - t)
+            self.stdout.write("%(name)s: %(count)d queries, mean: %(mean).2f ms, "
+                "median: %(median).2f ms, 95%%: %(p95).2f ms, max: %(max).2f ms\n"
+                % dict(get_statistics(times), name=name))
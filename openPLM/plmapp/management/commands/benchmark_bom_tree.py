@@ -0,0 +1,79 @@
+"""
+Management utility to measure the performances of :func:`.build_bom_tree`
+on synthetic assemblies (100000 links by default).
+
+No object is created: the tree is built from fake links.
+"""
+
+import time
+import random
+from collections import namedtuple
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand, CommandError
+
+from openPLM.plmapp.controllers.part import build_bom_tree, Child, Parent
+
+FakeLink = namedtuple("FakeLink", "id parent_id child_id order")
+
+def make_assembly(nb_links, seed=0):
+    """
+    Returns a list of *nb_links* fake links of a synthetic assembly
+    sorted by descending order. The root has the id 0.
+    """
+    rand = random.Random(seed)
+    links = []
+    for child in xrange(1, nb_links + 1):
+        parent = rand.randint(max(0, child - 50), child - 1)
+        links.append(FakeLink(child, parent, child, rand.randint(1, 100)))
+    links.sort(key=lambda link: -link.order)
+    return links
+
+def reverse_assembly(links):
+    """
+    Returns the links of a part used in many assemblies: the tree of
+    *links* upside down.
+    """
+    return [FakeLink(l.id, l.child_id, l.parent_id, l.order) for l in links]
+
+
+class Command(NoArgsCommand):
+    option_list = NoArgsCommand.option_list + (
+        make_option('-l', '--links', dest='links', type='int', default=100000,
+            help='Number of links, default: 100000.'),
+        make_option('-r', '--repeat', dest='repeat', type='int', default=3,
+            help='Number of measures of each tree, the best one is kept, '
+                 'default: 3.'),
+        make_option('-s', '--seed', dest='seed', type='int', default=0,
+            help='Seed of the random generator, default: 0.'),
+    )
+    help = 'Measures the construction of BOM trees of synthetic assemblies.'
+
+    def handle_noargs(self, **options):
+        nb_links = options["links"]
+        if nb_links < 10:
+            raise CommandError("At least 10 links are required")
+        repeat = max(1, options["repeat"])
+        for name, args in (("children", (Child, "parent_id", "child_id")),
+                           ("parents", (Parent, "child_id", "parent_id"))):
+            times = {}
+            for count in (nb_links // 10, nb_links):
+                links = make_assembly(count, options["seed"])
+                if name == "parents":
+                    links = reverse_assembly(links)
+                times[count] = self.measure(links, repeat, *args)
+                self.stdout.write("%s: %d links, %.1f ms\n"
+                        % (name, count, 1000 * times[count]))
+            # a linear algorithm has a ratio close to 10
+            ratio = times[nb_links] / max(times[nb_links // 10], 1e-6)
+            self.stdout.write("%s: ratio %.1f\n" % (name, ratio))
+
+    def measure(self, links, repeat, *args):
+        best = None
+        for i in xrange(repeat):
+            t = time.time()
+            build_bom_tree(0, links, -1, *args)
+            elapsed = time.time() - t
+            if best is None or elapsed < best:
+                best = elapsed
+        return best
@@ -0,0 +1,25 @@
+"""
+Management utility to remove unreferenced content-addressed blobs
+(see :meth:`.DocumentStorage.collect_garbage`).
+"""
+
+import datetime
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from openPLM.plmapp.models import docfs
+
+class Command(NoArgsCommand):
+    option_list = NoArgsCommand.option_list + (
+        make_option('-g', '--grace', dest='grace', type='int', default=3600,
+            help='Only removes blobs unreferenced since GRACE seconds, '
+                 'default: 3600.'),
+    )
+    help = 'Removes unreferenced document blobs.'
+
+    def handle_noargs(self, **options):
+        grace = datetime.timedelta(seconds=options["grace"])
+        count, size = docfs.collect_garbage(grace=grace)
+        if int(options.get("verbosity", 1)) >= 1:
+            self.stdout.write("%d blobs removed (%d bytes)\n" % (count, size))
@@ -0,0 +1,88 @@
+"""
+Management utility to convert the files stored by :obj:`.docfs` into
+content-addressed blobs.
+
+Each file is hard linked (or copied) to its blob before the database is
+updated and it is removed after, so the conversion can be interrupted
+and run again.
+"""
+
+import os
+import shutil
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from openPLM.plmapp.models import docfs, DocumentFile, PrivateFile
+from openPLM.plmapp.files.extraction import hash_file
+
+def link_blob(path, blob_path):
+    """
+    Creates the blob *blob_path* from the file *path* if it does not exist.
+    Returns True if the blob has been created.
+    """
+    if os.path.exists(blob_path):
+        return False
+    dirname = os.path.dirname(blob_path)
+    if not os.path.exists(dirname):
+        os.makedirs(dirname)
+    try:
+        os.link(path, blob_path)
+    except OSError:
+        # hard links are not supported
+        tmp = blob_path + ".tmp"
+        shutil.copy(path, tmp)
+        os.rename(tmp, blob_path)
+    os.chmod(blob_path, 0400)
+    return True
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('-n', '--dry-run', action='store_true', dest='dry_run',
+            default=False,
+            help='Only prints how many bytes would be saved.'),
+    )
+    help = 'Converts stored document files into content-addressed blobs.'
+
+    def handle(self, *args, **options):
+        if not docfs.content_addressed:
+            raise CommandError("DOCUMENTS_CONTENT_ADDRESSED must be set to True.")
+        verbosity = int(options.get("verbosity", 1))
+        dry_run = options["dry_run"]
+        prefix = docfs.BLOBS_DIR + os.sep
+        querysets = (DocumentFile.objects.filter(deleted=False),
+                PrivateFile.objects.all())
+        files = saved = 0
+        seen = set()
+        for queryset in querysets:
+            names = queryset.exclude(file__startswith=prefix)\
+                    .values_list("file", flat=True).distinct()
+            for name in list(names):
+                path = docfs.path(name)
+                if not name or not os.path.exists(path):
+                    if verbosity >= 1:
+                        self.stderr.write("Missing file: %s\n" % name)
+                    continue
+                size = os.path.getsize(path)
+                blob_name = docfs.get_blob_name(hash_file(path), name)
+                if blob_name in seen or os.path.exists(docfs.path(blob_name)):
+                    saved += size
+                seen.add(blob_name)
+                files += 1
+                if dry_run:
+                    continue
+                link_blob(path, docfs.path(blob_name))
+                with transaction.commit_on_success():
+                    count = queryset.filter(file=name).update(file=blob_name)
+                    docfs.add_reference(blob_name, size, count)
+                os.chmod(path, 0700)
+                os.remove(path)
+                if verbosity >= 2:
+                    self.stdout.write("%s -> %s\n" % (name, blob_name))
+        if verbosity >= 1:
+            verb = "would be" if dry_run else "have been"
+            self.stdout.write("%d files %s converted, %d bytes %s saved\n"
+                    % (files, verb, saved, verb))
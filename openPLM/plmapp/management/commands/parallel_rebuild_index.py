@@ -0,0 +1,313 @@
+"""
+Management utility to rebuild the search index with several processes.
+
+The indexed objects are split into shards (ranges of primary keys).
+Each shard is indexed by a process of a pool into its own Xapian
+database, then all shards are merged into a new index which replaces
+the current one.
+
+Indexed shards are recorded in a checkpoint file so that an interrupted
+rebuild resumes where it stopped.
+
+Objects created or modified since the start of the rebuild (its updates
+were applied to the replaced index) are indexed again once the new index
+is in place.
+"""
+
+import os
+import json
+import shutil
+import multiprocessing
+from optparse import make_option
+
+import xapian
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+PLAN = "plan.json"
+DONE = "done.txt"
+START = "start.txt"
+
+#: fields which store the date of the last modification of indexed objects
+DATE_FIELDS = ("mtime", "ctime")
+
+def swap_index(new_index, index_path):
+    """
+    Replaces the index *index_path* by *new_index*.
+
+    The new index is first moved next to the current one (the checkpoint
+    may be on another filesystem) so that the current index is only
+    renamed aside and replaced by a rename: readers always find an index.
+    """
+    base = index_path.rstrip(os.sep)
+    new_path, old_path = base + ".new", base + ".old"
+    for path in (new_path, old_path):
+        if os.path.exists(path):
+            shutil.rmtree(path)
+    shutil.move(new_index, new_path)
+    if os.path.exists(index_path):
+        os.rename(index_path, old_path)
+    os.rename(new_path, index_path)
+    if os.path.exists(old_path):
+        shutil.rmtree(old_path)
+
+
+class Checkpoint(object):
+    """
+    Progress of a rebuild stored in the directory *path*.
+
+    .. attribute:: shards
+
+        list of shards, a shard is a list [key, app_label, module_name,
+        first pk, last pk]
+
+    .. attribute:: done
+
+        set of keys of indexed shards
+
+    .. attribute:: start
+
+        date of the start of the rebuild (before the shards were computed)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.shards = []
+        self.done = set()
+        self.start = None
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, PLAN))
+
+    def load(self):
+        with open(os.path.join(self.path, PLAN)) as f:
+            self.shards = json.load(f)
+        done = os.path.join(self.path, DONE)
+        if os.path.exists(done):
+            with open(done) as f:
+                self.done = set(line.strip() for line in f if line.strip())
+        start = os.path.join(self.path, START)
+        if os.path.exists(start):
+            with open(start) as f:
+                self.start = parse_datetime(f.read().strip())
+
+    def create(self, shards, start):
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        self.shards = shards
+        self.done = set()
+        self.start = start
+        with open(os.path.join(self.path, START), "w") as f:
+            f.write(start.isoformat())
+        tmp = os.path.join(self.path, PLAN + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(shards, f)
+        # the plan must not be partially written
+        os.rename(tmp, os.path.join(self.path, PLAN))
+        if os.path.exists(os.path.join(self.path, DONE)):
+            os.remove(os.path.join(self.path, DONE))
+
+    def mark_done(self, key):
+        # a line is only written once the shard database is committed and
+        # closed, a partial line would be an unknown key and the shard
+        # would be indexed again
+        with open(os.path.join(self.path, DONE), "a") as f:
+            f.write(key + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.add(key)
+
+    def get_shard_path(self, key):
+        return os.path.join(self.path, "shards", key)
+
+    def pending(self):
+        return [s for s in self.shards if s[0] not in self.done]
+
+
+def make_shards(batch_size):
+    """
+    Returns the list of shards of all indexed models, each shard contains
+    at most *batch_size* objects.
+    """
+    from haystack import site
+    import openPLM.plmapp.search_indexes
+
+    shards = []
+    for model in site.get_indexed_models():
+        index = site.get_index(model)
+        pks = list(index.index_queryset().order_by("pk").values_list("pk", flat=True))
+        app_label, module_name = model._meta.app_label, model._meta.module_name
+        for i in xrange(0, len(pks), batch_size):
+            chunk = pks[i:i + batch_size]
+            key = "%s.%s.%d" % (app_label, module_name, i // batch_size)
+            shards.append([key, app_label, module_name, chunk[0], chunk[-1]])
+    return shards
+
+def init_worker():
+    # the connection of the parent process must not be shared
+    connection.close()
+
+def index_shard(args):
+    """
+    Indexes a shard (see :class:`Checkpoint`) into the database *path*.
+    Returns the key of the shard and the number of indexed objects.
+    """
+    from haystack import site, backend
+    from django.db.models.loading import get_model
+    import openPLM.plmapp.search_indexes
+
+    (key, app_label, module_name, first, last), path = args
+    model = get_model(app_label, module_name)
+    index = site.get_index(model)
+    objects = index.index_queryset().filter(pk__gte=first, pk__lte=last)
+    search_backend = backend.SearchBackend(site=site)
+    search_backend.open_writer(path)
+    try:
+        count = 0
+        for obj in objects.iterator():
+            # extracts text like the update_object method does
+            if index.should_update(obj):
+                index.backend.update(index, [obj])
+                count += 1
+        search_backend.writable_db.commit()
+    finally:
+        search_backend.close_writer()
+    return key, count
+
+def index_updated(shards, start):
+    """
+    Indexes, in the current index, the objects created after *shards*
+    were computed or modified since *start* (a datetime).
+    Returns the number of indexed objects.
+    """
+    from haystack import site
+    from openPLM.plmapp.tasks import IndexWriter, get_index_writer
+    import openPLM.plmapp.search_indexes
+
+    last_pks = {}
+    for key, app_label, module_name, first, last in shards:
+        model = (app_label, module_name)
+        last_pks[model] = max(last, last_pks.get(model, last))
+    operations = []
+    for model in site.get_indexed_models():
+        index = site.get_index(model)
+        app_label, module_name = model._meta.app_label, model._meta.module_name
+        query = Q(pk__gt=last_pks.get((app_label, module_name), 0))
+        fields = set(f.name for f in model._meta.fields)
+        for field in DATE_FIELDS:
+            if field in fields:
+                query |= Q(**{field + "__gte" : start})
+                break
+        pks = index.index_queryset().filter(query).values_list("pk", flat=True)
+        operations.extend((IndexWriter.UPDATE, app_label, module_name, pk)
+                for pk in pks)
+    get_index_writer().apply_operations(operations)
+    return len(operations)
+
+def merge(paths, destination):
+    """
+    Merges the Xapian databases *paths* into a new database *destination*.
+    Returns the number of documents.
+    """
+    target = xapian.WritableDatabase(destination, xapian.DB_CREATE_OR_OVERWRITE)
+    count = 0
+    try:
+        for path in paths:
+            database = xapian.Database(path)
+            for posting in database.postlist(""):
+                target.add_document(database.get_document(posting.docid))
+                count += 1
+                if count % 10000 == 0:
+                    target.commit()
+            database.close()
+        target.commit()
+    finally:
+        target.close()
+    return count
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('-k', '--workers', dest='workers', type='int',
+            default=multiprocessing.cpu_count(),
+            help='Number of indexing processes (0 to index in the current '
+                 'process), default: number of CPUs.'),
+        make_option('-b', '--batch-size', dest='batch_size', type='int',
+            default=500, help='Number of objects per shard.'),
+        make_option('--checkpoint', dest='checkpoint', default=None,
+            help='Directory where shards and progress are stored, default: '
+                 'HAYSTACK_XAPIAN_PATH + ".rebuild".'),
+        make_option('--restart', action='store_true', dest='restart', default=False,
+            help='Ignores the progress of a previous interrupted rebuild.'),
+    )
+    help = 'Rebuilds the search index with several processes.'
+
+    def handle(self, *args, **options):
+        from openPLM.xapian_backend import MEMORY_DB_NAME
+
+        index_path = settings.HAYSTACK_XAPIAN_PATH
+        if index_path == MEMORY_DB_NAME:
+            raise CommandError("An in-memory index can not be rebuilt.")
+        verbosity = int(options.get("verbosity", 1))
+        workers = options["workers"]
+        if workers < 0 or options["batch_size"] <= 0:
+            raise CommandError("Invalid number of workers or batch size.")
+        checkpoint = Checkpoint(options["checkpoint"] or
+                index_path.rstrip(os.sep) + ".rebuild")
+
+        if checkpoint.exists() and not options["restart"]:
+            checkpoint.load()
+            if verbosity >= 1:
+                self.stdout.write("Resuming: %d/%d shards already indexed\n" %
+                        (len(checkpoint.done), len(checkpoint.shards)))
+        else:
+            if os.path.exists(checkpoint.path):
+                shutil.rmtree(checkpoint.path)
+            # recorded before the shards are computed, objects modified
+            # while they are computed are indexed again
+            start = timezone.now()
+            checkpoint.create(make_shards(options["batch_size"]), start)
+        pending = checkpoint.pending()
+        shards_path = os.path.join(checkpoint.path, "shards")
+        if not os.path.exists(shards_path):
+            os.makedirs(shards_path)
+
+        tasks = [(shard, checkpoint.get_shard_path(shard[0])) for shard in pending]
+        if workers == 0:
+            results = (index_shard(task) for task in tasks)
+        else:
+            connection.close()
+            pool = multiprocessing.Pool(workers, init_worker)
+            results = pool.imap_unordered(index_shard, tasks)
+        total = len(checkpoint.shards)
+        for key, count in results:
+            checkpoint.mark_done(key)
+            if verbosity >= 2:
+                self.stdout.write("%s: %d objects indexed\n" % (key, count))
+            if verbosity >= 1:
+                self.stdout.write("%d/%d shards indexed\n" % (len(checkpoint.done), total))
+        if workers:
+            pool.close()
+            pool.join()
+
+        # merges the shards and replaces the current index
+        paths = [checkpoint.get_shard_path(s[0]) for s in checkpoint.shards]
+        new_index = os.path.join(checkpoint.path, "index")
+        count = merge([p for p in paths if os.path.exists(p)], new_index)
+        swap_index(new_index, index_path)
+        # updates applied to the replaced index since the start
+        # are applied again to the new index
+        if checkpoint.start is not None:
+            updated = index_updated(checkpoint.shards, checkpoint.start)
+            if verbosity >= 1:
+                self.stdout.write("%d objects modified during the rebuild "
+                        "indexed again\n" % updated)
+        shutil.rmtree(checkpoint.path)
+        if verbosity >= 1:
+            self.stdout.write("%d documents indexed\n" % count)
+
@@ -0,0 +1,17 @@
+"""
+Management utility to rebuild the closure table of all BOMs.
+"""
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from openPLM.plmapp.models import rebuild_bom_closure
+
+class Command(NoArgsCommand):
+    help = 'Rebuilds the closure table of all BOMs (indented BOM index).'
+
+    @transaction.commit_on_success
+    def handle_noargs(self, **options):
+        count = rebuild_bom_closure()
+        if int(options.get("verbosity", 1)) >= 1:
+            self.stdout.write("%d paths created\n" % count)
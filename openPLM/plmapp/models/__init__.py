@@ -55,8 +55,11 @@ There are 5 kinds of models:
         - :class:`.Part`
         - :class:`.Document` and related classes:
             - :class:`.DocumentStorage` (see also :obj:`.docfs`)
+            - :class:`.DocumentBlob`
             - :class:`.DocumentFile`
             - :class:`.PrivateFile`
+            - :class:`.ExtractedText` (and its counters,
+              :class:`.ExtractedTextStats`)
         - functions:
             - :func:`.get_all_plmobjects`
             - :func:`.part.get_all_parts`
@@ -64,9 +67,11 @@ There are 5 kinds of models:
             - :func:`.import_models`
     * :class:`.link.Link` models:
         - :class:`.RevisionLink`
-        - :class:`.ParentChildLink`
+        - :class:`.ParentChildLink` (and its closure,
+          :class:`.ParentChildLinkClosure`)
         - :class:`.DocumentPartLink`
-        - :class:`.DelegationLink`
+        - :class:`.DelegationLink` (and its closure,
+          :class:`.ClosureDelegationLink`)
         - :class:`.PLMObjectUserLink`
         - :class:`.AlternatePartSet`
 
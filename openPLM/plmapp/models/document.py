@@ -1,11 +1,16 @@
 
 import os
+import errno
+import shutil
 import string
 import random
 import hashlib
+import datetime
+import tempfile
 from django.utils import timezone
 
-from django.db import models
+from django.db import models, connection, transaction, IntegrityError
+from django.db.models import F
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.files.storage import FileSystemStorage
@@ -14,7 +19,7 @@ from django.utils.translation import ugettext_noop
 from django.utils.functional import memoize
 
 from openPLM.plmapp.files.formats import native_to_standards
-from openPLM.plmapp.utils import memoize_noarg
+from openPLM.plmapp import refcache
 
 from .lifecycle import Lifecycle
 from .plmobject import (PLMObject, get_all_subclasses,
@@ -24,7 +29,180 @@ from .plmobject import (PLMObject, get_all_subclasses,
 class DocumentStorage(FileSystemStorage):
     """
     File system storage which stores files with a specific name
+
+    .. versionchanged:: 2.1
+        Content-addressed mode and :meth:`copy`, :meth:`collect_garbage`
+        methods
+
+    If the ``DOCUMENTS_CONTENT_ADDRESSED`` setting is True, saved files
+    are stored once per content: a file is stored as a blob which name is
+    computed by :meth:`get_blob_name` and which references are counted by a
+    :class:`.DocumentBlob`. Copying a blob (:meth:`copy`) only increments
+    its reference counter and deleting it (:meth:`delete`) decrements it.
+    Unreferenced blobs are physically removed by :meth:`collect_garbage`.
+    Files saved by a rolled back transaction must be released
+    with :meth:`discard`.
+
+    Files saved before the content-addressed mode was enabled are still
+    managed as before, they can be converted with the
+    :program:`./manage.py convert_document_storage` command.
     """
+
+    #: name of the directory which contains blobs
+    BLOBS_DIR = "blobs"
+
+    @property
+    def content_addressed(self):
+        return getattr(settings, "DOCUMENTS_CONTENT_ADDRESSED", False)
+
+    def get_blob_name(self, content_hash, name):
+        """
+        Returns the name of the blob of a file *name* whose content has
+        the sha1 hex digest *content_hash*.
+
+        The extension of *name* is kept since some handlers rely on it,
+        for example, ``blobs/stp/ab/abcdef...0123.stp``.
+        """
+        ext = os.path.splitext(os.path.basename(name))[1].lower()
+        ext2 = ext.lstrip(".") or "no_ext"
+        return os.path.join(self.BLOBS_DIR, ext2, content_hash[:2],
+                content_hash + ext)
+
+    def _save(self, name, content):
+        if not self.content_addressed:
+            return super(DocumentStorage, self)._save(name, content)
+        tmp_dir = self.path(os.path.join(self.BLOBS_DIR, "tmp"))
+        if not os.path.exists(tmp_dir):
+            try:
+                os.makedirs(tmp_dir)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        sha = hashlib.sha1()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in content.chunks():
+                    sha.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            blob_name = self.get_blob_name(sha.hexdigest(), name)
+            # the reference is added before the blob is written so that
+            # collect_garbage can not remove it
+            self.add_reference(blob_name, size)
+            path = self.path(blob_name)
+            if not os.path.exists(path):
+                dirname = os.path.dirname(path)
+                if not os.path.exists(dirname):
+                    try:
+                        os.makedirs(dirname)
+                    except OSError as e:
+                        if e.errno != errno.EEXIST:
+                            raise
+                os.rename(tmp_path, path)
+                os.chmod(path, 0400)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return blob_name
+
+    def add_reference(self, name, size=0, count=1):
+        """
+        Increments by *count* the reference counter of the blob *name*, the
+        :class:`.DocumentBlob` is created if it does not exist.
+        """
+        blobs = DocumentBlob.objects.filter(name=name)
+        if blobs.update(refcount=F("refcount") + count, mtime=timezone.now()):
+            return
+        sid = transaction.savepoint()
+        try:
+            DocumentBlob.objects.create(name=name, size=size, refcount=count)
+            transaction.savepoint_commit(sid)
+        except IntegrityError:
+            # created by a concurrent save
+            transaction.savepoint_rollback(sid)
+            blobs.update(refcount=F("refcount") + count, mtime=timezone.now())
+
+    def is_blob(self, name):
+        return DocumentBlob.objects.filter(name=name).exists()
+
+    def copy(self, name, filename):
+        """
+        Returns the name of a copy of the file *name*. *filename* is the
+        original filename of the file.
+
+        A blob is not copied: its reference counter is incremented and
+        *name* is returned.
+        """
+        blobs = DocumentBlob.objects.filter(name=name)
+        if blobs.update(refcount=F("refcount") + 1, mtime=timezone.now()):
+            return name
+        path = self.get_available_name(filename)
+        shutil.copy(self.path(name), self.path(path))
+        return path
+
+    def delete(self, name):
+        """
+        Deletes the file *name*. A blob is only released, it will be
+        removed by :meth:`collect_garbage` once it is not referenced.
+        """
+        blobs = DocumentBlob.objects.filter(name=name)
+        if not blobs.update(refcount=F("refcount") - 1, mtime=timezone.now()):
+            path = self.path(name)
+            if os.path.exists(path):
+                os.chmod(path, 0700)
+            super(DocumentStorage, self).delete(name)
+
+    def discard(self, name):
+        """
+        Discards the file *name* saved by a transaction which has been
+        rolled back.
+
+        A blob may be shared by committed files and its references have been
+        rolled back with the transaction, so it is not removed: a counter
+        without reference is created if the blob was new, so that
+        :meth:`collect_garbage` removes it once it is not referenced.
+        Other files are deleted.
+        """
+        if self.content_addressed and name.startswith(self.BLOBS_DIR + os.sep):
+            path = self.path(name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            self.add_reference(name, size, 0)
+            transaction.commit_unless_managed()
+        else:
+            self.delete(name)
+
+    def collect_garbage(self, names=None, grace=datetime.timedelta(hours=1)):
+        """
+        Removes blobs which are not referenced since *grace* (a timedelta).
+        If *names* is not None, only blobs whose name is in *names* are
+        removed.
+
+        Returns the number of removed blobs and their total size.
+        """
+        limit = timezone.now() - grace
+        blobs = DocumentBlob.objects.filter(refcount__lte=0, mtime__lte=limit)
+        if names is not None:
+            blobs = blobs.filter(name__in=list(names))
+        table = connection.ops.quote_name(DocumentBlob._meta.db_table)
+        cursor = connection.cursor()
+        count = size = 0
+        for pk, name, blob_size in blobs.values_list("pk", "name", "size"):
+            # a reference may have been added since the blob was selected
+            cursor.execute("DELETE FROM %s WHERE id = %%s AND refcount <= 0" % table,
+                    [pk])
+            if cursor.rowcount != 1:
+                continue
+            path = self.path(name)
+            if os.path.exists(path):
+                os.chmod(path, 0700)
+                os.remove(path)
+            count += 1
+            size += blob_size
+        transaction.commit_unless_managed()
+        return count, size
+
     def get_available_name(self, name):
         """
         Returns a path for a file *name*, the path always refers to a file
@@ -68,6 +246,41 @@ class DocumentStorage(FileSystemStorage):
         return path
 
 
+class DocumentBlob(models.Model):
+    """
+    .. versionadded:: 2.1
+
+    Model which counts the references to a file stored by
+    :obj:`.docfs` in content-addressed mode (see :class:`.DocumentStorage`).
+
+    :model attributes:
+        .. attribute:: name
+
+            name of the blob in :obj:`.docfs`
+        .. attribute:: size
+
+            size of the blob in Byte
+        .. attribute:: refcount
+
+            number of :class:`.DocumentFile` and :class:`.PrivateFile`
+            which reference the blob
+        .. attribute:: mtime
+
+            date of the last modification of :attr:`refcount`
+    """
+
+    class Meta:
+        app_label = "plmapp"
+
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveIntegerField()
+    refcount = models.IntegerField(default=0)
+    mtime = models.DateTimeField(default=timezone.now)
+
+    def __unicode__(self):
+        return u"DocumentBlob<%s, %d>" % (self.name, self.refcount)
+
+
 #: :class:`.DocumentStorage` instance which stores files in :const:`.settings.DOCUMENTS_DIR`
 docfs = DocumentStorage(location=settings.DOCUMENTS_DIR)
 #: :class:`.FileSystemStorage` instance which stores thumbnails in :const:`.settings.THUMBNAILS_DIR`
@@ -234,6 +447,90 @@ class PrivateFile(models.Model):
         return u"PrivateFile<%s, %s>" % (self.filename, self.creator)
 
 
+class ExtractedText(models.Model):
+    """
+    .. versionadded:: 2.1
+
+    Model which stores the text extracted from a file by
+    :const:`.settings.EXTRACTOR` so that it is not extracted again when
+    a file with the same content is indexed (see :mod:`.files.extraction`).
+
+    :model attributes:
+        .. attribute:: content_hash
+
+            sha1 hex digest of the content of the file
+        .. attribute:: extension
+
+            lower-cased extension of the file, the extractor depends on it
+        .. attribute:: extractor_version
+
+            version of the extractor (see :func:`.get_extractor_version`)
+        .. attribute:: text
+
+            extracted text
+        .. attribute:: size
+
+            size of the text in Byte
+        .. attribute:: hits
+
+            number of times the text has been reused
+        .. attribute:: ctime
+
+            date of creation
+        .. attribute:: atime
+
+            date of the last access
+    """
+
+    class Meta:
+        app_label = "plmapp"
+        unique_together = (("content_hash", "extension", "extractor_version"),)
+
+    content_hash = models.CharField(max_length=40)
+    extension = models.CharField(max_length=20)
+    extractor_version = models.CharField(max_length=40)
+    text = models.TextField(blank=True)
+    size = models.PositiveIntegerField()
+    hits = models.PositiveIntegerField(default=0)
+    ctime = models.DateTimeField(default=timezone.now)
+    atime = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __unicode__(self):
+        return u"ExtractedText<%s%s>" % (self.content_hash, self.extension)
+
+
+class ExtractedTextStats(models.Model):
+    """
+    .. versionadded:: 2.1
+
+    Model which stores the running counters of the stored
+    :class:`.ExtractedText` (see :mod:`.files.extraction`).
+    It has only one row.
+
+    :model attributes:
+        .. attribute:: size
+
+            total size of stored texts in Byte
+        .. attribute:: hits
+
+            number of extractions avoided by a stored text
+        .. attribute:: misses
+
+            number of extracted texts
+    """
+
+    class Meta:
+        app_label = "plmapp"
+
+    size = models.BigIntegerField(default=0)
+    hits = models.BigIntegerField(default=0)
+    misses = models.BigIntegerField(default=0)
+
+    def __unicode__(self):
+        return u"ExtractedTextStats<%d, %d/%d>" % (self.size, self.hits,
+                self.misses)
+
+
 class Document(PLMObject):
     """
     Model for documents
@@ -321,7 +618,7 @@ class Document(PLMObject):
         return self.lifecycle.type == Lifecycle.TEMPLATE
 
 
-@memoize_noarg
+@refcache.cached(refcache.TYPES)
 def get_all_documents():
     u"""
     Returns a dict<doc_name, doc_class> of all available :class:`.Document` classes
@@ -4,6 +4,7 @@ from django.utils import timezone
 
 from django.conf import settings
 from django.db import models
+from django.db.models import Q
 from django.db.models.query import QuerySet
 from django.contrib.auth.models import User, Group
 from django.contrib.comments.signals import comment_was_posted
@@ -147,7 +148,9 @@ class StateHistoryQuerySet(QuerySet):
         """
         if time is None:
             return self.now()
-        return self.filter(start_time__lte=time).exclude(end_time__lt=time)
+        # same index friendly predicate as LinkQuerySet.at
+        return self.filter(Q(end_time__isnull=True) | Q(end_time__gte=time),
+                start_time__lte=time)
 
     def officials(self):
         """
@@ -233,6 +236,7 @@ class StateHistory(models.Model):
 
     class Meta:
         app_label = "plmapp"
+        index_together = (("plmobject", "start_time", "end_time"),)
 
     DRAFT, PROPOSED, OFFICIAL, DEPRECATED, CANCELLED = range(5)
     STATE_CATEGORIES = (
@@ -254,6 +258,17 @@ class StateHistory(models.Model):
     objects = StateHistoryManager()
 
     def save(self, *args, **kwargs):
+        self.set_state_category()
+        super(StateHistory, self).save(*args, **kwargs)
+
+    def set_state_category(self):
+        """
+        Sets :attr:`state_category` according to :attr:`state` and
+        :attr:`lifecycle`. Called by :meth:`save`, it must be called
+        before a bulk creation.
+
+        .. versionadded:: 2.1
+        """
         if self.state == get_cancelled_state():
             category = StateHistory.CANCELLED
         elif self.state == self.lifecycle.official_state:
@@ -265,7 +280,6 @@ class StateHistory(models.Model):
         else:
             category = StateHistory.PROPOSED
         self.state_category = category
-        super(StateHistory, self).save(*args, **kwargs)
 
 def timeline_histories(user, date_begin=None, date_end=None, done_by=None, list_display=None):
     if date_begin is None and date_end is None:
@@ -2,6 +2,9 @@
 #! -*- coding:utf-8 -*-
 
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+
+from openPLM.plmapp import refcache
 from openPLM.plmapp.lifecycle import LifecycleList
 from openPLM.plmapp.utils import memoize_noarg
 
@@ -74,33 +77,35 @@ class Lifecycle(models.Model):
     def __unicode__(self):
         return u'Lifecycle<%s>' % self.name
 
+    def _get_states(self):
+        if self._states_list is None:
+            self._states_list = get_lifecycle_states(self.name)
+        return self._states_list
+
     def to_states_list(self):
         u"""
         Converts a Lifecycle to a :class:`.LifecycleList` (a list of strings)
+
+        .. versionchanged:: 2.1
+            the names of the states are cached (see :func:`get_lifecycle_states`)
         """
-        if self._states_list is None:
-            lcs = self.lifecyclestates_set.order_by("rank")
-            self._states_list = LifecycleList(self.name, self.official_state.name,
-                    *lcs.values_list("state__name", flat=True))
-        return LifecycleList(self.name, self.official_state, *self._states_list)
+        return LifecycleList(self.name, self.official_state_id, *self._get_states())
 
     @property
     def first_state(self):
         if self._first_state is None:
-            self._first_state = self.lifecyclestates_set.order_by('rank')[0].state
+            self._first_state = State(name=self._get_states()[0])
         return self._first_state
 
     @property
     def last_state(self):
         if self._last_state is None:
-            self._last_state = self.lifecyclestates_set.order_by('-rank')[0].state
+            self._last_state = State(name=self._get_states()[-1])
         return self._last_state
 
     @property
     def nb_states(self):
-        if self._states_list is not None:
-            return len(self._states_list)
-        return self.lifecyclestates_set.count()
+        return len(self._get_states())
 
     def __iter__(self):
         return iter(self.to_states_list())
@@ -169,7 +174,6 @@ def get_cancelled_state():
     return State.objects.get(name="cancelled")
 
 
-_default_states_cache = {}
 def get_default_state(lifecycle=None):
     u"""
     Returns the default :class:`.State` used when instanciate a :class:`.PLMObject`.
@@ -178,9 +182,35 @@ def get_default_state(lifecycle=None):
 
     if not lifecycle:
         lifecycle = get_default_lifecycle()
-    state = _default_states_cache.get(lifecycle.name, None)
-    if state is None:
-        state = lifecycle.first_state
-        _default_states_cache[lifecycle.name] = state
-    return state
+    return lifecycle.first_state
+
+@refcache.cached(refcache.LIFECYCLES)
+def get_lifecycle_states(name):
+    u"""
+    .. versionadded:: 2.1
+
+    Returns the names of the states of the lifecycle *name* (a tuple
+    sorted by rank). The result is cached (see :mod:`.refcache`).
+    """
+    lcs = LifecycleStates.objects.filter(lifecycle=name).order_by("rank")
+    return tuple(lcs.values_list("state", flat=True))
+
+@refcache.cached(refcache.LIFECYCLES)
+def get_state_names():
+    u"""
+    .. versionadded:: 2.1
+
+    Returns the names of all states (a tuple sorted by name).
+    The result is cached (see :mod:`.refcache`).
+    """
+    return tuple(State.objects.order_by("name").values_list("name", flat=True))
+
+
+def _invalidate_lifecycles(sender, **kwargs):
+    refcache.invalidate(refcache.LIFECYCLES)
+
+if __name__ == "openPLM.plmapp.models.lifecycle":
+    for model in (State, Lifecycle, LifecycleStates):
+        post_save.connect(_invalidate_lifecycles, sender=model)
+        post_delete.connect(_invalidate_lifecycles, sender=model)
 
@@ -1,10 +1,14 @@
+from collections import defaultdict
+
 from django.utils import timezone
-import kjbuckets
 
 
 from django.core.exceptions import ValidationError
 from django.db import models, IntegrityError
+from django.db.models import Q
 from django.db.models.query import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal
 from django.contrib.auth.models import User
 
 from openPLM.plmapp.utils.units import UNITS, DEFAULT_UNIT
@@ -15,6 +19,18 @@ from .plmobject import PLMObject
 from .part import Part
 from .document import Document
 
+#: .. versionadded:: 2.1
+#:
+#: signal sent by :meth:`LinkQuerySet.end` (which does not send
+#: :data:`post_save` signals), the sender is the model of the ended links
+links_ended = Signal()
+
+#: .. versionadded:: 2.1
+#:
+#: signal sent after a bulk creation of links (which does not send
+#: :data:`post_save` signals), the sender is the model of the created links
+links_created = Signal()
+
 class LinkQuerySet(QuerySet):
     """ QuerySet with utility methods to filter links alive at a given time."""
 
@@ -28,19 +44,26 @@ class LinkQuerySet(QuerySet):
         """
         Filters links: keeps alive links at time *time*.
 
+        A link is alive if ``ctime <= time`` and if ``end_time`` is null or
+        greater than or equal to *time*. This predicate is a plain
+        conjunction (not a negation) so that it can be evaluated
+        by the composite indexes (object, ctime, end_time) of the links.
+
         :param time: a :class:`~datetime.datetime` or None
         """
         if time is None:
             return self.now()
-        return self.filter(ctime__lte=time).exclude(end_time__isnull=False,
-                end_time__lt=time)
+        return self.filter(Q(end_time__isnull=True) | Q(end_time__gte=time),
+                ctime__lte=time)
 
     def end(self):
         """
         Ends all alive links: sets theur :attr:`end_time` to the current time and saves them
         if there :attr:`end_time` are not already set.
         """
-        return self.now().update(end_time=timezone.now())
+        res = self.now().update(end_time=timezone.now())
+        links_ended.send(sender=self.model)
+        return res
 
 
 class LinkManager(models.Manager):
@@ -160,6 +183,42 @@ class Link(models.Model):
             self.end_time = timezone.now()
             self.save()
 
+class ParentChildLinkQuerySet(LinkQuerySet):
+    """
+    A :class:`LinkQuerySet` which keeps the :class:`ParentChildLinkClosure`
+    table up to date when links are ended.
+    """
+
+    def end(self):
+        """
+        Ends all alive links and removes the paths that went through them
+        from the :class:`ParentChildLinkClosure` table.
+        """
+        now = timezone.now()
+        alive = self.now()
+        pairs = list(alive.values_list("parent", "child"))
+        res = alive.update(end_time=now)
+        if pairs:
+            remove_closure_paths(pairs, now)
+        return res
+
+
+class ParentChildLinkManager(LinkManager):
+    """Manager of :class:`ParentChildLink`, returns a :class:`ParentChildLinkQuerySet`."""
+
+    def get_query_set(self):
+        return ParentChildLinkQuerySet(self.model)
+
+
+class CurrentParentChildLinkManager(ParentChildLinkManager):
+    """
+    Manager which returns alive parent-child links.
+    """
+
+    def get_query_set(self):
+        return ParentChildLinkQuerySet(self.model).now()
+
+
 class ParentChildLink(Link):
     """
     Link between two :class:`.Part`: a parent and a child
@@ -192,9 +251,14 @@ class ParentChildLink(Link):
             default=lambda: DEFAULT_UNIT)
     order = models.PositiveSmallIntegerField(default=lambda: 1)
 
+    objects = ParentChildLinkManager()
+    current_objects = CurrentParentChildLinkManager()
+
     class Meta:
         app_label = "plmapp"
         unique_together = ("parent", "child", "end_time")
+        index_together = (("parent", "ctime", "end_time"),
+                          ("child", "ctime", "end_time"))
 
     def __unicode__(self):
         return u"ParentChildLink<%s, %s, %f, %s, %d>" % (self.parent, self.child,
@@ -273,6 +337,208 @@ class ParentChildLink(Link):
         return link, extensions
 
 
+class ParentChildLinkClosure(models.Model):
+    """
+    .. versionadded:: 2.1
+
+    Transitive closure of :class:`ParentChildLink`: a row tells that
+    *descendant* is in the indented BOM of *ancestor* at level *depth*.
+
+    There is one row per distinct path length, so a part which is a child
+    of two sub-assemblies at different levels has two rows.
+    Rows are never updated by users, they are maintained each time
+    a :class:`ParentChildLink` is created or ended (see
+    :func:`add_closure_paths` and :func:`remove_closure_paths`) and
+    can be rebuilt with :func:`rebuild_bom_closure`.
+
+    :model attributes:
+        .. attribute:: ancestor
+
+            a :class:`.Part`
+        .. attribute:: descendant
+
+            a :class:`.Part`
+        .. attribute:: depth
+
+            length of the path from *ancestor* to *descendant* (1 for
+            a direct child)
+        .. attribute:: ctime
+
+            date of creation of the path
+        .. attribute:: end_time
+
+            date of deletion of the path (default: None, the path still exists)
+
+    Like a :class:`Link`, this model has two managers, :attr:`objects`
+    and :attr:`current_objects`.
+    """
+
+    ancestor = models.ForeignKey(Part, related_name="%(class)s_ancestor")
+    descendant = models.ForeignKey(Part, related_name="%(class)s_descendant")
+    depth = models.PositiveSmallIntegerField()
+    ctime = models.DateTimeField()
+    end_time = models.DateTimeField(blank=True, null=True, default=lambda: None)
+
+    objects = LinkManager()
+    current_objects = CurrentLinkManager()
+
+    class Meta:
+        app_label = "plmapp"
+        index_together = (("ancestor", "end_time"), ("descendant", "end_time"))
+
+    def __unicode__(self):
+        return u"ParentChildLinkClosure<%d, %d, %d>" % (self.ancestor_id,
+                self.descendant_id, self.depth)
+
+
+def get_descendants(children, ancestor):
+    """
+    Returns the set of (descendant, depth) reachable from *ancestor*.
+
+    :param children: dictionary part id -> set of children ids
+    """
+    res = set()
+    level = children.get(ancestor, ())
+    depth = 1
+    while level:
+        res.update((child, depth) for child in level)
+        next_level = set()
+        for child in level:
+            next_level.update(children.get(child, ()))
+        level = next_level
+        depth += 1
+    return res
+
+def add_closure_paths(parent_id, child_id, time):
+    """
+    Adds to the :class:`ParentChildLinkClosure` table all paths that
+    go through a new link between *parent_id* and *child_id* created
+    at *time*.
+    """
+    closure = ParentChildLinkClosure.current_objects
+    ancestors = [(parent_id, 0)]
+    ancestors.extend(closure.filter(descendant=parent_id).values_list("ancestor", "depth"))
+    descendants = [(child_id, 0)]
+    descendants.extend(closure.filter(ancestor=child_id).values_list("descendant", "depth"))
+    paths = set((a, d, i + 1 + j) for a, i in ancestors for d, j in descendants)
+    # a path may already exist if a part is reachable through several links
+    existing = closure.filter(ancestor__in=set(a for a, i in ancestors),
+            descendant__in=set(d for d, j in descendants))
+    paths.difference_update(existing.values_list("ancestor", "descendant", "depth"))
+    ParentChildLinkClosure.objects.bulk_create([ParentChildLinkClosure(
+        ancestor_id=a, descendant_id=d, depth=depth, ctime=time)
+        for a, d, depth in paths])
+
+def remove_closure_paths(pairs, time):
+    """
+    Ends all paths of the :class:`ParentChildLinkClosure` table that
+    only exist thanks to links that have been ended at *time*.
+
+    :param pairs: list of (parent id, child id) of the ended links
+    """
+    closure = ParentChildLinkClosure.current_objects
+    parents = set(p for p, c in pairs)
+    ancestors = set(parents)
+    ancestors.update(closure.filter(descendant__in=parents).values_list("ancestor", flat=True))
+    descendants = set(c for p, c in pairs)
+    descendants.update(closure.filter(ancestor__in=descendants).values_list("descendant", flat=True))
+    # loads the current indented BOMs of all ancestors
+    links = ParentChildLink.current_objects
+    children = defaultdict(set)
+    visited = set()
+    level = ancestors
+    while level:
+        visited.update(level)
+        qs = links.filter(parent__in=level).values_list("parent", "child")
+        level = set()
+        for parent, child in qs:
+            children[parent].add(child)
+            if child not in visited:
+                level.add(child)
+    existing = closure.filter(ancestor__in=ancestors, descendant__in=descendants)
+    paths = {}
+    ended = []
+    for pk, a, d, depth in existing.values_list("id", "ancestor", "descendant", "depth"):
+        if a not in paths:
+            paths[a] = get_descendants(children, a)
+        if (d, depth) not in paths[a]:
+            ended.append(pk)
+    if ended:
+        ParentChildLinkClosure.objects.filter(id__in=ended).update(end_time=time)
+
+def rebuild_bom_closure():
+    """
+    Rebuilds the whole :class:`ParentChildLinkClosure` table by replaying
+    the history of all :class:`ParentChildLink`.
+
+    Returns the number of created rows.
+    """
+    events = []
+    links = ParentChildLink.objects.values_list("parent", "child", "ctime", "end_time")
+    for parent, child, ctime, end_time in links.iterator():
+        if end_time is None or end_time > ctime:
+            events.append((ctime, 1, parent, child))
+            if end_time is not None:
+                events.append((end_time, 0, parent, child))
+    # ended links are processed before created links at the same date
+    events.sort()
+    children = defaultdict(set)
+    descendants = defaultdict(dict) # ancestor -> {(descendant, depth) : row}
+    ancestors = defaultdict(set) # descendant -> set of (ancestor, depth)
+    rows = []
+    for time, created, parent, child in events:
+        if created:
+            children[parent].add(child)
+            anc = [(parent, 0)] + list(ancestors[parent])
+            desc = [(child, 0)] + descendants[child].keys()
+            for a, i in anc:
+                current = descendants[a]
+                for d, j in desc:
+                    key = (d, i + 1 + j)
+                    if key not in current:
+                        row = ParentChildLinkClosure(ancestor_id=a,
+                                descendant_id=d, depth=key[1], ctime=time)
+                        current[key] = row
+                        ancestors[d].add((a, key[1]))
+                        rows.append(row)
+        else:
+            children[parent].discard(child)
+            anc = set([parent])
+            anc.update(a for a, i in ancestors[parent])
+            desc = set([child])
+            desc.update(d for d, j in descendants[child])
+            for a in anc:
+                paths = get_descendants(children, a)
+                current = descendants[a]
+                for key in [k for k in current if k[0] in desc and k not in paths]:
+                    current.pop(key).end_time = time
+                    ancestors[key[0]].discard((a, key[1]))
+    ParentChildLinkClosure.objects.all().delete()
+    ParentChildLinkClosure.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+def _update_closure(sender, instance, created, **kwargs):
+    """ function called when a :class:`ParentChildLink` is saved """
+    if getattr(instance, "keep_closure", False):
+        # the link has been replaced by a link between the same parts
+        return
+    if instance.end_time is not None:
+        remove_closure_paths([(instance.parent_id, instance.child_id)],
+                instance.end_time)
+    elif created:
+        add_closure_paths(instance.parent_id, instance.child_id, instance.ctime)
+
+def _delete_closure(sender, instance, **kwargs):
+    """ function called when a :class:`ParentChildLink` is deleted """
+    if instance.end_time is None:
+        remove_closure_paths([(instance.parent_id, instance.child_id)],
+                timezone.now())
+
+if __name__ == "openPLM.plmapp.models.link":
+    post_save.connect(_update_closure, sender=ParentChildLink)
+    post_delete.connect(_delete_closure, sender=ParentChildLink)
+
+
 class ChildQuerySet(QuerySet):
     def iterator(self):
         for obj in super(ChildQuerySet, self).iterator():
@@ -469,6 +735,8 @@ class DocumentPartLink(Link):
     class Meta:
         app_label = "plmapp"
         unique_together = ("document", "part", "end_time")
+        index_together = (("document", "ctime", "end_time"),
+                          ("part", "ctime", "end_time"))
 
     def __unicode__(self):
         return u"DocumentPartLink<%s, %s>" % (self.document, self.part)
@@ -523,10 +791,160 @@ class DelegationLink(Link):
         """
         Returns the list of user's id of the delegators of *user* for the role
         *role*.
+
+        .. versionchanged:: 2.1
+            delegators are read from the :class:`ClosureDelegationLink` table
         """
-        links = cls.current_objects.filter(role=role).values_list("delegatee", "delegator")
-        gr = kjbuckets.kjGraph(tuple(links))
-        return gr.reachable(user.id).items()
+        return list(ClosureDelegationLink.objects.filter(role=role,
+            delegatee=user.id).values_list("delegator", flat=True))
+
+
+class ClosureDelegationLink(models.Model):
+    """
+    .. versionadded:: 2.1
+
+    Transitive closure of the alive :class:`DelegationLink`: a row tells that
+    :attr:`delegator` has delegated (directly or through other delegatees)
+    the role :attr:`role` to :attr:`delegatee`.
+
+    This table is updated each time a :class:`DelegationLink` is saved (see
+    :func:`add_delegation_paths` and :func:`remove_delegation_paths`) and
+    can be rebuilt with :func:`rebuild_delegation_closure`.
+
+    :model attributes:
+        .. attribute:: delegator
+
+            :class:`~django.contrib.auth.models.User` who gives his role
+        .. attribute:: delegatee
+
+            :class:`~django.contrib.auth.models.User` who receives the role
+        .. attribute:: role
+
+            right that is delegated
+    """
+
+    delegator = models.ForeignKey(User, related_name="%(class)s_delegator")
+    delegatee = models.ForeignKey(User, related_name="%(class)s_delegatee")
+    role = models.CharField(max_length=30, choices=zip(ROLES, ROLES))
+
+    class Meta:
+        app_label = "plmapp"
+        unique_together = ("role", "delegatee", "delegator")
+        index_together = (("role", "delegator"),)
+
+    def __unicode__(self):
+        return u"ClosureDelegationLink<%d, %d, %s>" % (self.delegator_id,
+                self.delegatee_id, self.role)
+
+
+def get_delegatees(delegatees, delegator):
+    """
+    Returns the set of users reachable from *delegator* (including
+    *delegator* if it belongs to a cycle of delegations).
+
+    :param delegatees: dictionary user id -> set of delegatee ids
+    """
+    res = set()
+    level = set(delegatees.get(delegator, ()))
+    while level:
+        res.update(level)
+        next_level = set()
+        for user in level:
+            next_level.update(delegatees.get(user, ()))
+        level = next_level - res
+    return res
+
+def add_delegation_paths(delegator_id, delegatee_id, role):
+    """
+    Adds to the :class:`ClosureDelegationLink` table all paths that
+    go through a new delegation of *role* from *delegator_id* to
+    *delegatee_id*.
+    """
+    closure = ClosureDelegationLink.objects.filter(role=role)
+    delegators = set([delegator_id])
+    delegators.update(closure.filter(delegatee=delegator_id).values_list("delegator", flat=True))
+    delegatees = set([delegatee_id])
+    delegatees.update(closure.filter(delegator=delegatee_id).values_list("delegatee", flat=True))
+    paths = set((a, d) for a in delegators for d in delegatees)
+    existing = closure.filter(delegator__in=delegators, delegatee__in=delegatees)
+    paths.difference_update(existing.values_list("delegator", "delegatee"))
+    ClosureDelegationLink.objects.bulk_create([ClosureDelegationLink(
+        delegator_id=a, delegatee_id=d, role=role) for a, d in paths])
+
+def remove_delegation_paths(delegator_id, delegatee_id, role):
+    """
+    Removes from the :class:`ClosureDelegationLink` table all paths that
+    only existed thanks to an ended delegation of *role* from *delegator_id*
+    to *delegatee_id*.
+    """
+    closure = ClosureDelegationLink.objects.filter(role=role)
+    delegators = set([delegator_id])
+    delegators.update(closure.filter(delegatee=delegator_id).values_list("delegator", flat=True))
+    delegatees = set([delegatee_id])
+    delegatees.update(closure.filter(delegator=delegatee_id).values_list("delegatee", flat=True))
+    # loads the alive delegations reachable from the delegators
+    links = DelegationLink.current_objects.filter(role=role)
+    graph = defaultdict(set)
+    visited = set()
+    level = delegators
+    while level:
+        visited.update(level)
+        qs = links.filter(delegator__in=level).values_list("delegator", "delegatee")
+        level = set()
+        for delegator, delegatee in qs:
+            graph[delegator].add(delegatee)
+            if delegatee not in visited:
+                level.add(delegatee)
+    existing = closure.filter(delegator__in=delegators, delegatee__in=delegatees)
+    paths = {}
+    removed = []
+    for pk, a, d in existing.values_list("id", "delegator", "delegatee"):
+        if a not in paths:
+            paths[a] = get_delegatees(graph, a)
+        if d not in paths[a]:
+            removed.append(pk)
+    if removed:
+        ClosureDelegationLink.objects.filter(id__in=removed).delete()
+
+def rebuild_delegation_closure():
+    """
+    Rebuilds the whole :class:`ClosureDelegationLink` table from
+    all alive :class:`DelegationLink`.
+
+    Returns the number of created rows.
+    """
+    graphs = defaultdict(lambda: defaultdict(set))
+    links = DelegationLink.current_objects.values_list("role", "delegator", "delegatee")
+    for role, delegator, delegatee in links.iterator():
+        graphs[role][delegator].add(delegatee)
+    rows = []
+    for role, graph in graphs.iteritems():
+        for delegator in graph:
+            rows.extend(ClosureDelegationLink(delegator_id=delegator,
+                delegatee_id=delegatee, role=role)
+                for delegatee in get_delegatees(graph, delegator))
+    ClosureDelegationLink.objects.all().delete()
+    ClosureDelegationLink.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+def _update_delegation_closure(sender, instance, created, **kwargs):
+    """ function called when a :class:`DelegationLink` is saved """
+    if instance.end_time is not None:
+        remove_delegation_paths(instance.delegator_id, instance.delegatee_id,
+                instance.role)
+    elif created:
+        add_delegation_paths(instance.delegator_id, instance.delegatee_id,
+                instance.role)
+
+def _delete_delegation_closure(sender, instance, **kwargs):
+    """ function called when a :class:`DelegationLink` is deleted """
+    if instance.end_time is None:
+        remove_delegation_paths(instance.delegator_id, instance.delegatee_id,
+                instance.role)
+
+if __name__ == "openPLM.plmapp.models.link":
+    post_save.connect(_update_delegation_closure, sender=DelegationLink)
+    post_delete.connect(_delete_delegation_closure, sender=DelegationLink)
 
 
 class PLMObjectUserLink(Link):
@@ -556,6 +974,7 @@ class PLMObjectUserLink(Link):
     class Meta:
         app_label = "plmapp"
         unique_together = ("plmobject", "user", "role", "end_time")
+        index_together = (("plmobject", "ctime", "end_time"),)
         ordering = ["user", "role", "plmobject__type", "plmobject__reference",
                 "plmobject__revision"]
 
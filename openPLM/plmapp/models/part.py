@@ -2,7 +2,7 @@ from django.db import models
 from django.db.models import F
 from django.utils.translation import ugettext_lazy as _
 from django.utils.translation import ugettext_noop
-from openPLM.plmapp.utils import memoize_noarg
+from openPLM.plmapp import refcache
 
 from .plmobject import (PLMObject, get_all_subclasses,
         get_all_subclasses_with_level, PLMObjectQuerySet, PLMObjectManager)
@@ -70,11 +70,12 @@ class TopAssemblyManager(PartManager):
     """
 
     def get_query_set(self):
-        from openPLM.plmapp.models.link import ParentChildLink
-        current_pcl = ParentChildLink.current_objects
+        from openPLM.plmapp.models.link import ParentChildLinkClosure
+        # direct children and parents are enough to find top assemblies
+        closure = ParentChildLinkClosure.current_objects.filter(depth=1)
         return super(TopAssemblyManager, self).get_query_set().\
-                exclude(id__in=current_pcl.values_list("child")).\
-                filter(id__in=current_pcl.values_list("parent"))
+                exclude(id__in=closure.values_list("descendant")).\
+                filter(id__in=closure.values_list("ancestor"))
 
 
 class AbstractPart(models.Model):
@@ -181,7 +182,7 @@ class Part(AbstractPart, PLMObject):
         return False
 
 
-@memoize_noarg
+@refcache.cached(refcache.TYPES)
 def get_all_parts():
     u"""
     Returns a dict<part_name, part_class> of all available :class:`.Part` classes
@@ -190,7 +191,7 @@ def get_all_parts():
     get_all_subclasses(Part, res)
     return res
 
-@memoize_noarg
+@refcache.cached(refcache.TYPES)
 def get_all_parts_with_level():
     lst = []
     level="=>"
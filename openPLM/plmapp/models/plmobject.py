@@ -12,7 +12,8 @@ from django.utils.safestring import mark_safe
 from django.utils import timezone
 from django.utils.translation import ugettext_noop, ugettext_lazy as _
 
-from openPLM.plmapp.utils import level_to_sign_str, memoize_noarg
+from openPLM.plmapp import refcache
+from openPLM.plmapp.utils import level_to_sign_str
 from .iobject import IObject
 from .lifecycle import (State, Lifecycle, LifecycleStates,
         get_default_lifecycle, get_default_state, get_cancelled_lifecycle)
@@ -31,17 +32,16 @@ def cache_lifecycle_stuff(func):
     The maximum cache size will be the number of
     :class:`.LifecycleStates`. Each key of the cache is
     a tuple (state's name, lifecycle's name).
+
+    .. versionchanged:: 2.1
+        results are stored by :mod:`.refcache` and invalidated
+        when a lifecycle is modified.
     """
+    name = "%s.%s" % (func.__module__, func.__name__)
     @wraps(func)
     def wrapper(plmobject):
-        key = (plmobject.state_id, plmobject.lifecycle_id)
-        if key in func.cache:
-            return func.cache[key]
-        else:
-            value = func(plmobject)
-            func.cache[key] = value
-            return value
-    func.cache = {}
+        key = (name, plmobject.state_id, plmobject.lifecycle_id)
+        return refcache.get(refcache.LIFECYCLES, key, lambda: func(plmobject))
     wrapper.__doc__ += """
 
         .. note::
@@ -450,7 +450,7 @@ def get_all_subclasses(base, d):
         get_all_subclasses(cls, d)
 
 
-@memoize_noarg
+@refcache.cached(refcache.TYPES)
 def get_all_plmobjects():
     u"""
     Returns a dict<name, class> of all available :class:`.PLMObject` subclasses
@@ -463,7 +463,7 @@ def get_all_plmobjects():
     del res["IObject"]
     return res
 
-@memoize_noarg
+@refcache.cached(refcache.TYPES)
 def get_all_users_and_plmobjects():
     res = {}
     get_all_subclasses(User, res)
@@ -484,6 +484,7 @@ def get_all_subclasses_with_level(base, lst, level):
             get_all_subclasses_with_level(cls, lst, level)
 
 
+@refcache.cached(refcache.TYPES)
 def get_subclasses(base):
     r = []
     def populate(b, l):
@@ -496,7 +497,7 @@ def get_subclasses(base):
     populate(base, 0)
     return r
 
-@memoize_noarg
+@refcache.cached(refcache.TYPES)
 def get_all_users_and_plmobjects_with_level():
     choices = []
     get_all_subclasses_with_level(PLMObject, choices, ">")
@@ -28,6 +28,7 @@ the navigation's graph in :func:`~plmapp.views.navigate`.
 """
 
 import re
+import hashlib
 import datetime
 import warnings
 import cStringIO as StringIO
@@ -36,6 +37,7 @@ from collections import defaultdict
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.template.loader import render_to_string
 from django.utils.html import linebreaks
 from django.utils.encoding import iri_to_uri
@@ -56,6 +58,20 @@ OSR = "only_search_results"
 
 TIME_FORMAT = "%Y-%m-%d:%H:%M:%S/"
 
+def get_layout_key(dot, prog):
+    """
+    .. versionadded:: 2.1
+
+    Returns the cache key of the layout of the graph *dot* (a canonical
+    representation of the graph in dot format) computed by *prog*.
+    """
+    sha = hashlib.sha1(prog)
+    sha.update(dot.encode("utf-8"))
+    return "openplm:navigate:layout:" + sha.hexdigest()
+
+def get_layout_timeout():
+    return getattr(settings, "NAVIGATE_LAYOUT_CACHE_TIMEOUT", 60 * 60 * 24)
+
 def get_id_card_data(doc_ids, date=None):
     """
     Get informations to display in the id-cards of all Document which id is in doc_ids
@@ -186,6 +202,8 @@ class NavigationGraph(object):
         self._title_to_node = {}
         self._part_to_node = {}
         self._doc_ids = []
+        # part id -> nodes linked to the documents attached to the part
+        self._pending_documents = defaultdict(list)
         self.time = None
 
     def set_options(self, options):
@@ -330,26 +348,50 @@ class NavigationGraph(object):
             for link in links[:OBJECTS_LIMIT]:
                 self.edges.add((node, link.plmobject_id, " "))
                 self._set_node_attributes(link.plmobject)
-        else:
-            # obj is the part id
-            links = models.DocumentPartLink.objects.at(self.time).filter(part__id=obj).select_related("document")
-            if self.options[OSR]:
-                links = links.filter(document__in=self.plmobject_results)
-            for link in links.only(*_documents_attrs)[:OBJECTS_LIMIT]:
-                self.edges.add((obj_id or obj, link.document_id, " "))
+
+    def _add_document_edges(self, part_id, node):
+        """
+        Adds edges from *node* to the documents attached to the part
+        *part_id*. Edges are created by :meth:`_load_document_edges`.
+        """
+        self._pending_documents[part_id].append(node)
+
+    def _load_document_edges(self):
+        """
+        Creates the edges requested by :meth:`_add_document_edges`,
+        all attached documents are retrieved in one query.
+        """
+        if not self._pending_documents:
+            return
+        links = models.DocumentPartLink.objects.at(self.time)\
+                .filter(part__in=self._pending_documents.keys())
+        if self.options[OSR]:
+            links = links.filter(document__in=self.plmobject_results)
+        links = links.select_related("document").only("part", *_documents_attrs)
+        counts = defaultdict(int)
+        for link in links.order_by("id"):
+            for node in self._pending_documents[link.part_id]:
+                # documents of parts linked to an user are limited
+                if node != link.part_id:
+                    if counts[node] >= OBJECTS_LIMIT:
+                        continue
+                    counts[node] += 1
+                self.edges.add((node, link.document_id, " "))
                 self._set_node_attributes(link.document)
+        self._pending_documents.clear()
 
     def _create_user_edges(self, obj, role):
         if self.options[OSR] and not self.user_results:
             return
         if hasattr(obj, 'user_set'):
             if role == "owner":
-                users = ((obj.owner, role),)
+                owner = User.objects.select_related("profile").get(id=obj.owner_id)
+                users = ((owner, role),)
             else:
                 users = ((u, role) for u in obj.user_set.select_related("profile").all())
         else:
             users = obj.users.at(self.time).filter(role__istartswith=role)
-            users = ((u.user, u.role) for u in users.select_related("profile").all())
+            users = ((u.user, u.role) for u in users.select_related("user__profile"))
         if isinstance(obj, GroupController):
              node = "Group%d" % obj.id
         elif obj.type == "ECR":
@@ -383,7 +425,7 @@ class NavigationGraph(object):
                 self.edges.add((node, part_doc_id, role))
                 if is_part(plmobject):
                     if plmobject["id"] in self.options["doc_parts"]:
-                        self._create_doc_edges(plmobject["id"], part_doc_id)
+                        self._add_document_edges(plmobject["id"], part_doc_id)
                 self._set_node_attributes(plmobject, part_doc_id, type_="plmobject")
 
         else:
@@ -397,12 +439,15 @@ class NavigationGraph(object):
                 part_doc = link.plmobject
                 if part_doc.is_part:
                     if part_doc.id in self.options["doc_parts"]:
-                        self._create_doc_edges(part_doc.id, part_doc_id)
+                        self._add_document_edges(part_doc.id, part_doc_id)
                 self._set_node_attributes(part_doc, part_doc_id)
 
     def create_edges(self):
         """
         Builds the graph (adds all edges and nodes that respected the options)
+
+        .. versionchanged:: 2.1
+            The number of queries does not depend on the number of nodes.
         """
         self.options["doc_parts"] = frozenset(self.options["doc_parts"])
         self.doc_parts = "#".join(str(o) for o in self.options["doc_parts"])
@@ -438,24 +483,15 @@ class NavigationGraph(object):
             if not (self.options[OSR] and not self.plmobject_results):
                 if isinstance(self.object, GroupController) or getattr(self.object, "type", "") == "ECR":
                     self._create_doc_edges(self.object, None)
-                if self._part_to_node:
-                    links = models.DocumentPartLink.objects.at(self.time).\
-                            filter(part__in=self._part_to_node.keys())
-                    if self.options[OSR]:
-                        links = links.filter(document__in=self.plmobject_results)
-                    for link in links.select_related("document"):
-                        self.edges.add((link.part_id, link.document_id, " "))
-                        self._set_node_attributes(link.document)
+                for part_id in self._part_to_node.keys():
+                    self._add_document_edges(part_id, part_id)
 
         elif not isinstance(self.object, UserController):
             if not (self.options[OSR] and not self.plmobject_results):
                 ids = self.options["doc_parts"].intersection(self._part_to_node.keys())
-                links = models.DocumentPartLink.objects.at(self.time).filter(part__in=ids)
-                if self.options[OSR]:
-                    links = links.filter(document__in=self.plmobject_results)
-                for link in links.select_related("document"):
-                    self.edges.add((link.part_id, link.document_id, " "))
-                    self._set_node_attributes(link.document)
+                for part_id in ids:
+                    self._add_document_edges(part_id, part_id)
+        self._load_document_edges()
 
         # treats the parts to see if they have an attached document
         if not self.options["doc"] and self._part_to_node:
@@ -640,32 +676,53 @@ class NavigationGraph(object):
         return dict(width=width, height=height, scale=scale, translate=translate,
                 edges=edges)
 
+    def _layout(self, dot, prog):
+        """
+        Lays out the graph *dot* with *prog* and returns a tuple
+        (image map, parsed svg).
+        """
+        graph = FrozenAGraph(dot)
+        s = StringIO.StringIO()
+        svg = StringIO.StringIO()
+        # draw runs prog on the frozen data, a previous call
+        # to layout would be useless
+        graph.draw(svg, format='svg', prog=prog)
+        svg.seek(0)
+        graph.draw(s, format='cmapx', prog=prog)
+        s.seek(0)
+        map_string = s.read()
+        graph.clear()
+        return map_string, self._parse_svg(svg.read())
+
     def render(self):
         """
         Renders an image of the graph.
 
+        .. versionchanged:: 2.1
+            The layout is cached, the key is computed from the nodes,
+            the edges, the graph attributes and the layout program.
+            Labels of nodes are not laid out by graphviz, so the layout
+            is reused if they change.
+
         :returns: a tuple (html content, javascript content)
         """
         warnings.simplefilter('ignore', RuntimeWarning)
-        # builds the graph
-        for key, attrs in self.nodes.iteritems():
-            self.graph.add_node(key, label="", **attrs)
+        # builds the graph, nodes and edges are sorted so that
+        # the same graph is always represented by the same string
+        for key in sorted(self.nodes, key=unicode):
+            self.graph.add_node(key, label="", **self.nodes[key])
         s = unicode(self.graph)
         s = s[:s.rfind("}")]
         s += "\n".join(u'%s -> %s [label="%s", href="."];' % edge for edge in sorted(self.edges)) + "}\n"
         self.graph.close()
-        self.graph = FrozenAGraph(s)
 
         prog = self.options.get("prog", "dot")
-        self.graph.layout(prog=prog)
-        s = StringIO.StringIO()
-        svg = StringIO.StringIO()
-        self.graph.draw(svg, format='svg', prog=prog)
-        svg.seek(0)
-        self.graph.draw(s, format='cmapx', prog=prog)
-        s.seek(0)
-        map_string = s.read()
-        self.graph.clear()
+        key = get_layout_key(s, prog)
+        layout = cache.get(key)
+        if layout is None:
+            layout = self._layout(s, prog)
+            cache.set(key, layout, get_layout_timeout())
+        map_string, svg_data = layout
         warnings.simplefilter('default', RuntimeWarning)
-        return self._convert_map(map_string), self._parse_svg(svg.read())
+        return self._convert_map(map_string), svg_data
 
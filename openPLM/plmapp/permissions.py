@@ -0,0 +1,234 @@
+############################################################################
+# openPLM - open source PLM
+# Copyright 2010 Philippe Joulaud, Pierre Cosquer
+#
+# This file is part of openPLM.
+#
+#    openPLM is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    openPLM is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with openPLM.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact :
+#    Philippe Joulaud : ninoo.fr@gmail.com
+#    Pierre Cosquer : pcosquer@linobject.com
+################################################################################
+
+"""
+.. versionadded:: 2.1
+
+This module contains the :class:`AuthorizationContext` of a user:
+it loads once the groups, delegations and roles of the user and
+answers :meth:`.PLMObjectController.check_permission`,
+:meth:`.PLMObjectController.check_readable` and the ``is_readable``
+template filter from memory.
+
+A context is attached to a :class:`~django.contrib.auth.models.User`
+instance (see :func:`get_context`). Since a request (``request.user``) and
+a celery task load their own user instance, a context lives as long as
+the request or the task.
+
+All contexts are invalidated when a group membership, a delegation or a
+role of a user is modified.
+
+:func:`filter_readable` checks the readability of many objects at once.
+"""
+
+import itertools
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Q, F
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+import openPLM.plmapp.models as models
+
+_counter = itertools.count(1)
+_version = next(_counter)
+
+def invalidate_contexts(**kwargs):
+    """
+    Invalidates all authorization contexts: their data are reloaded
+    at their next use. It is connected to the signals sent when
+    a group membership, a delegation or a role is modified.
+    """
+    global _version
+    _version = next(_counter)
+
+
+class AuthorizationContext(object):
+    """
+    Cache of the authorization data of *user*.
+
+    Data are loaded lazily:
+
+        * group ids and names: one query
+        * delegators of all roles: one query
+        * roles of the user and its delegators on a plmobject: one query per
+          plmobject, see :meth:`prefetch_roles` to load the roles of several
+          plmobjects in one query.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.clear()
+
+    def clear(self):
+        """ Clears all cached data. """
+        self.version = _version
+        self._groups = None
+        self._delegators = None
+        self._roles = {}
+
+    def _check_version(self):
+        if self.version != _version:
+            self.clear()
+
+    def _load_groups(self):
+        self._check_version()
+        if self._groups is None:
+            self._groups = dict(self.user.groups.values_list("id", "name"))
+        return self._groups
+
+    @property
+    def group_ids(self):
+        """ Set of the ids of the groups of the user. """
+        return set(self._load_groups())
+
+    @property
+    def group_names(self):
+        """ Set of the names of the groups of the user. """
+        return set(self._load_groups().itervalues())
+
+    def in_group(self, group_id):
+        """ Returns True if the user belongs to the group *group_id*. """
+        return group_id in self._load_groups()
+
+    def get_delegators(self, role):
+        """
+        Returns the set of user ids of the (direct and indirect) delegators
+        of the user for the role *role*.
+        """
+        return set(self._load_delegators().get(role, ()))
+
+    def _load_delegators(self):
+        self._check_version()
+        if self._delegators is None:
+            self._delegators = defaultdict(set)
+            links = models.ClosureDelegationLink.objects.filter(delegatee=self.user.id)
+            for role, delegator in links.values_list("role", "delegator"):
+                self._delegators[role].add(delegator)
+        return self._delegators
+
+    def prefetch_roles(self, plmobject_ids):
+        """
+        Loads in one query the roles of the user (and of its delegators)
+        on the plmobjects *plmobject_ids*.
+        """
+        self._check_version()
+        ids = set(plmobject_ids).difference(self._roles)
+        if not ids:
+            return
+        delegators = self._load_delegators()
+        users = set([self.user.id])
+        for d in delegators.itervalues():
+            users.update(d)
+        for obj_id in ids:
+            self._roles[obj_id] = set()
+        links = models.PLMObjectUserLink.current_objects.filter(plmobject__in=ids,
+                user__in=users).values_list("plmobject", "user", "role")
+        for obj_id, user_id, role in links:
+            if user_id == self.user.id or user_id in delegators.get(role, ()):
+                self._roles[obj_id].add(role)
+
+    def has_role(self, plmobject_id, role):
+        """
+        Returns True if the user or one of its delegators for the role *role*
+        has the role *role* on the plmobject *plmobject_id*.
+        """
+        self._check_version()
+        if plmobject_id not in self._roles:
+            self.prefetch_roles((plmobject_id,))
+        return role in self._roles[plmobject_id]
+
+    def get_readable_ids(self, objects, ids):
+        """
+        Returns the set of ids of the readable objects among *objects*
+        (:class:`.PLMObject` instances) and *ids* (ids of plmobjects).
+
+        Instances are checked without query, *ids* are checked with
+        one query. The rules are the ones of
+        :meth:`.PLMObjectController.check_readable`: nothing is readable
+        by an inactive or restricted user.
+        """
+        user = self.user
+        readable = set()
+        if not user.is_active or user.profile.restricted:
+            return readable
+        is_company = user.username == settings.COMPANY
+        groups = self._load_groups()
+        for obj in objects:
+            if (is_company or obj.is_official or obj.is_deprecated
+                or obj.is_cancelled or obj.owner_id == user.id
+                or obj.group_id in groups):
+                readable.add(obj.id)
+        if ids:
+            qs = models.PLMObject.objects.filter(id__in=ids)
+            if not is_company:
+                qs = qs.filter(Q(state=F("lifecycle__official_state"))
+                        | Q(state=F("lifecycle__last_state"))
+                        | Q(lifecycle=models.get_cancelled_lifecycle())
+                        | Q(owner=user.id) | Q(group__in=list(groups)))
+            readable.update(qs.values_list("id", flat=True))
+        return readable
+
+
+def get_context(user):
+    """
+    Returns the :class:`AuthorizationContext` of *user*. It is created
+    at the first call and attached to *user*.
+    """
+    try:
+        return user._authorization_context
+    except AttributeError:
+        context = user._authorization_context = AuthorizationContext(user)
+        return context
+
+def filter_readable(user, objects_or_ids):
+    """
+    Returns the list of items of *objects_or_ids* that *user* can read,
+    in the same order.
+
+    *objects_or_ids* may contain :class:`.PLMObject` instances and
+    plmobject ids. The rules are the ones of
+    :meth:`.PLMObjectController.check_readable`: an inactive or restricted
+    user can not read any object, other users can read official, deprecated
+    and cancelled objects and the objects they own or whose group they
+    belong to. The company can read all objects.
+
+    The whole batch is checked in a few queries: ids are checked with one
+    query, instances need no query once the groups of the user are loaded.
+    """
+    items = list(objects_or_ids)
+    objects = [item for item in items if isinstance(item, models.PLMObject)]
+    ids = set(item for item in items if not isinstance(item, models.PLMObject))
+    readable = get_context(user).get_readable_ids(objects, ids)
+    return [item for item in items if getattr(item, "id", item) in readable]
+
+post_save.connect(invalidate_contexts, sender=models.PLMObjectUserLink)
+post_delete.connect(invalidate_contexts, sender=models.PLMObjectUserLink)
+post_save.connect(invalidate_contexts, sender=models.DelegationLink)
+post_delete.connect(invalidate_contexts, sender=models.DelegationLink)
+models.links_ended.connect(invalidate_contexts, sender=models.PLMObjectUserLink)
+models.links_created.connect(invalidate_contexts, sender=models.PLMObjectUserLink)
+models.links_ended.connect(invalidate_contexts, sender=models.DelegationLink)
+m2m_changed.connect(invalidate_contexts, sender=User.groups.through)
@@ -0,0 +1,212 @@
+############################################################################
+# openPLM - open source PLM
+# Copyright 2010 Philippe Joulaud, Pierre Cosquer
+#
+# This file is part of openPLM.
+#
+#    openPLM is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    openPLM is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with openPLM.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact :
+#    Philippe Joulaud : ninoo.fr@gmail.com
+#    Pierre Cosquer : pcosquer@linobject.com
+################################################################################
+
+"""
+.. versionadded:: 2.1
+
+This module caches reference data which seldom change: lifecycles,
+their states and the available types of objects.
+
+Cached values are grouped by *namespace*. Each namespace has a version
+which is part of the keys of its values. :func:`invalidate` renews the
+version, so that outdated values are never read again and expire on their
+own. Namespaces are invalidated by signals: a lifecycle, a state or
+a rank is saved or deleted or a model class is prepared.
+
+Values of :const:`SHARED_NAMESPACES` (data stored in the database) are
+stored in the django cache named by the ``REFERENCE_CACHE`` setting
+(``"default"`` by default) and their timeout can be set with the
+``REFERENCE_CACHE_TIMEOUT`` setting (in seconds).
+The version of a shared namespace is read from the django cache at most once
+every ``REFERENCE_CACHE_CHECK_INTERVAL`` seconds (5 by default), so an
+invalidation made by another process is seen after this delay.
+A local-memory backend is enough for one process, a file-based
+backend shares values and invalidations between processes (wsgi processes,
+celery workers). Values whose version is still current are also kept in
+the memory of the process. The :const:`TYPES` namespace contains classes
+defined by the process and is only kept in memory.
+
+Hits and misses are counted per namespace, see :func:`get_stats`.
+"""
+
+import time
+import uuid
+import hashlib
+from functools import wraps
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import get_cache
+from django.db.models.signals import class_prepared
+
+#: lifecycles, their states and values computed from a state and a lifecycle
+LIFECYCLES = "lifecycles"
+#: available types (classes) of objects
+TYPES = "types"
+
+#: namespaces stored in the django cache
+SHARED_NAMESPACES = (LIFECYCLES, )
+
+_MISSING = object()
+
+_backend = None
+#: namespace -> (version, dict(key -> value)) of values kept in memory
+_values = {}
+#: namespace -> (version, time of the last read) of shared namespaces
+_versions = {}
+#: namespace -> [hits, misses]
+_stats = defaultdict(lambda: [0, 0])
+
+def get_timeout():
+    return getattr(settings, "REFERENCE_CACHE_TIMEOUT", 60 * 60 * 24)
+
+def get_check_interval():
+    return getattr(settings, "REFERENCE_CACHE_CHECK_INTERVAL", 5)
+
+def get_backend():
+    """
+    Returns the django cache that stores the values of the shared namespaces.
+    """
+    global _backend
+    if _backend is None:
+        _backend = get_cache(getattr(settings, "REFERENCE_CACHE", "default"))
+    return _backend
+
+def _version_key(namespace):
+    return "openplm:ref_version:%s" % namespace
+
+def get_version(namespace):
+    """
+    Returns the current version of the shared namespace *namespace*.
+
+    The version is read from the django cache if it has not been read
+    for ``REFERENCE_CACHE_CHECK_INTERVAL`` seconds.
+    """
+    now = time.time()
+    version, checked = _versions.get(namespace, (None, 0))
+    if version is not None and now - checked < get_check_interval():
+        return version
+    backend = get_backend()
+    key = _version_key(namespace)
+    version = backend.get(key)
+    if version is None:
+        # another process may have set a version meanwhile
+        backend.add(key, uuid.uuid4().hex, get_timeout())
+        version = backend.get(key)
+    _versions[namespace] = (version, now)
+    return version
+
+def invalidate(*namespaces):
+    """
+    Invalidates all values of *namespaces*.
+    """
+    for namespace in namespaces:
+        _values.pop(namespace, None)
+        if namespace in SHARED_NAMESPACES:
+            version = uuid.uuid4().hex
+            get_backend().set(_version_key(namespace), version, get_timeout())
+            _versions[namespace] = (version, time.time())
+
+def get(namespace, key, compute):
+    """
+    Returns the value of *key* in *namespace*. If it is not cached,
+    the value is computed by calling *compute* (without arguments)
+    and stored.
+
+    *key* must be hashable. For a shared namespace, its :func:`repr`
+    must identify it and the value must be picklable.
+    """
+    shared = namespace in SHARED_NAMESPACES
+    version = get_version(namespace) if shared else None
+    current, values = _values.get(namespace, (None, None))
+    if values is None or current != version:
+        values = {}
+        _values[namespace] = (version, values)
+    stats = _stats[namespace]
+    value = values.get(key, _MISSING)
+    if value is not _MISSING:
+        stats[0] += 1
+        return value
+    if shared:
+        backend_key = "openplm:ref:%s:%s:%s" % (namespace, version,
+                hashlib.md5(repr(key)).hexdigest())
+        value = get_backend().get(backend_key, _MISSING)
+        if value is not _MISSING:
+            stats[0] += 1
+            values[key] = value
+            return value
+    stats[1] += 1
+    value = compute()
+    if shared:
+        get_backend().set(backend_key, value, get_timeout())
+    values[key] = value
+    return value
+
+def cached(namespace, key=None):
+    """
+    Decorator which caches the results of a function in *namespace*.
+
+    *key* is a function which takes the same arguments as the decorated
+    function and returns the key of its result. By default, the
+    arguments are the key.
+    """
+    def decorator(func):
+        name = "%s.%s" % (func.__module__, func.__name__)
+        @wraps(func)
+        def wrapper(*args):
+            k = (name, key(*args) if key is not None else args)
+            return get(namespace, k, lambda: func(*args))
+        return wrapper
+    return decorator
+
+def get_stats():
+    """
+    Returns a dict(namespace -> dict) of the number of hits and misses
+    and the hit ratio of each namespace since the start of the process
+    (or the last call to :func:`reset_stats`).
+    """
+    stats = {}
+    for namespace, (hits, misses) in _stats.items():
+        total = hits + misses
+        stats[namespace] = {
+            "hits" : hits,
+            "misses" : misses,
+            "ratio" : float(hits) / total if total else 0.,
+        }
+    return stats
+
+def reset_stats():
+    """
+    Resets the statistics returned by :func:`get_stats`.
+    """
+    _stats.clear()
+
+
+def _invalidate_types(sender, **kwargs):
+    # deferred classes (see QuerySet.only()) are not available types
+    if not getattr(sender, "_deferred", False):
+        invalidate(TYPES)
+
+class_prepared.connect(_invalidate_types)
+
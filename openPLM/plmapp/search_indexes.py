@@ -1,30 +1,19 @@
 import datetime
 import codecs
 import os.path
-from subprocess import Popen, PIPE
 
-from django.conf import settings
 from django.db.models import signals
 
 from haystack import site
 from haystack import indexes
 from haystack.indexes import *
-from haystack.models import SearchResult
 from haystack.query import SearchQuerySet
 from haystack.utils import get_identifier
 
 import openPLM.plmapp.models as models
 from openPLM.plmapp.tasks import update_index, remove_index
 from openPLM.plmapp.filters import plaintext
-
-# just a hack to prevent a KeyError
-def get_state(self):
-    ret_dict = self.__dict__.copy()
-    if 'searchsite' in ret_dict:
-        del(ret_dict['searchsite'])
-    del(ret_dict['log'])
-    return ret_dict
-SearchResult.__getstate__ = get_state
+from openPLM.plmapp.files.extraction import extract_text
 
 ###########################
 # from https://github.com/mixcloud/django-celery-haystack-SearchIndex/
@@ -212,8 +201,7 @@ class DocumentFileIndex(QueuedModelSearchIndex):
         if ext.lower() in text_files:
             content = codecs.open(path, encoding="utf-8", errors="ignore").read(size)
         else:
-            p = Popen([settings.EXTRACTOR, path], stdout=PIPE, close_fds=True)
-            content = p.stdout.read(size).decode("utf-8", "ignore")
+            content = extract_text(path, size)
         return content
 
     def index_queryset(self):
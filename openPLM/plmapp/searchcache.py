@@ -0,0 +1,172 @@
+############################################################################
+# openPLM - open source PLM
+# Copyright 2010 Philippe Joulaud, Pierre Cosquer
+#
+# This file is part of openPLM.
+#
+#    openPLM is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    openPLM is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with openPLM.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact :
+#    Philippe Joulaud : ninoo.fr@gmail.com
+#    Pierre Cosquer : pcosquer@linobject.com
+################################################################################
+
+"""
+.. versionadded:: 2.1
+
+This module stores the results of the current search of a user (results
+displayed by the left panel of most pages).
+
+Results are not pickled into the session: the identifiers and the rendered
+snippets of the first :const:`MAX_RESULTS` results are stored in the
+default django cache under a key made of the user id and a hash of the
+query (the *search id*). The session only contains the search id.
+Entries expire after ``SEARCH_RESULTS_CACHE_TIMEOUT`` seconds (default:
+30 minutes), the search is then run again.
+
+:class:`SearchResults` loads the results only when they are displayed.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from haystack.models import SearchResult
+
+import openPLM.plmapp.models as models
+from openPLM.plmapp.permissions import filter_readable, get_context
+
+#: maximal number of stored results
+MAX_RESULTS = 30
+
+#: stored fields of a result used to render it
+SNIPPET_FIELDS = ("rendered", "rendered_add", "state", "state_class",
+    "lifecycle", "owner", "group", "document_id")
+
+def get_timeout():
+    return getattr(settings, "SEARCH_RESULTS_CACHE_TIMEOUT", 60 * 30)
+
+def get_search_id(*query):
+    """
+    Returns the search id (a hash) of a query. *query* are the parameters
+    of the search (type, query string...).
+    """
+    return hashlib.md5(repr(query)).hexdigest()
+
+def _get_key(user, search_id):
+    return "search_results_%d_%s" % (user.id, search_id)
+
+def _to_entry(result):
+    fields = {}
+    for name in SNIPPET_FIELDS:
+        value = getattr(result, name, None)
+        if value is not None:
+            fields[name] = value
+    return (result.app_label, result.model_name, result.pk, result.score, fields)
+
+def store_results(user, search_id, results):
+    """
+    Stores the first :const:`MAX_RESULTS` *results* (a
+    :class:`~haystack.query.SearchQuerySet`) of the search *search_id*.
+
+    Returns a :class:`SearchResults` of the stored results.
+    """
+    results = [r for r in results[:MAX_RESULTS] if r is not None]
+    cache.set(_get_key(user, search_id), [_to_entry(r) for r in results],
+            get_timeout())
+    return SearchResults(user, search_id, results=results)
+
+def _get_plmobject_ids(results):
+    """
+    Returns a list of (result, plmobject id) of *results* bound to
+    a plmobject or a document file (its document).
+    """
+    ids = []
+    for result in results:
+        if result is None or result.model is None:
+            # stale result of an unregistered model
+            continue
+        if issubclass(result.model, models.PLMObject):
+            ids.append((result, int(result.pk)))
+        elif issubclass(result.model, models.DocumentFile):
+            document_id = getattr(result, "document_id", None)
+            if document_id is not None:
+                ids.append((result, int(document_id)))
+    return ids
+
+def set_readable_results(user, results):
+    """
+    Sets the :attr:`readable` attribute of all search results bound to
+    a plmobject or a document file (see the ``is_readable`` filter).
+    The readability of all results is checked with one query.
+    """
+    ids = _get_plmobject_ids(results)
+    readable = set(filter_readable(user, set(obj_id for r, obj_id in ids)))
+    for result, obj_id in ids:
+        result.readable = obj_id in readable
+
+def prefetch_roles(user, results):
+    """
+    Loads in one query the roles of *user* on the plmobjects of *results*
+    so that the ``can_add`` filter, which checks the permissions of each
+    result, does not run one query per result.
+    """
+    ids = _get_plmobject_ids(results)
+    get_context(user).prefetch_roles(obj_id for r, obj_id in ids)
+
+
+class SearchResults(object):
+    """
+    Lazy list of the stored results of the search *search_id* of *user*.
+
+    Results are loaded from the cache at their first access.
+    If they have expired and *form* (a valid search form) is given,
+    the search is run again and its results are stored.
+    The readability of the results is set by :func:`set_readable_results`.
+    """
+
+    def __init__(self, user, search_id, form=None, results=None):
+        self.user = user
+        self.search_id = search_id
+        self.form = form
+        self._results = results
+        self._readable_set = False
+
+    def _load(self):
+        if self._results is None:
+            self._results = []
+            if self.search_id is not None:
+                entries = cache.get(_get_key(self.user, self.search_id))
+                if entries is not None:
+                    self._results = [SearchResult(app_label, model_name, pk, score, **fields)
+                            for app_label, model_name, pk, score, fields in entries]
+                elif self.form is not None and self.form.is_valid():
+                    self._results = store_results(self.user, self.search_id,
+                            self.form.search())._results
+        if not self._readable_set:
+            self._readable_set = True
+            set_readable_results(self.user, self._results)
+        return self._results
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __nonzero__(self):
+        return bool(self._load())
+
+    def __getitem__(self, index):
+        return self._load()[index]
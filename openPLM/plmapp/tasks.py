@@ -2,48 +2,20 @@
 # adapted from https://github.com/mixcloud/django-celery-haystack-SearchIndex/
 # by sdcooke
 
-from functools import wraps
+import time
+import logging
+from collections import OrderedDict, defaultdict
+from multiprocessing import Lock
 
 from django.db.models.loading import get_model
 
 import openPLM.plmapp.mail
 import openPLM.plmapp.thumbnailers
+import openPLM.plmapp.archivecache
 
 from djcelery_transactions import task
 
-def synchronized(cls=None, lock=None):
-    """Class decorator to synchronize execution of a task's run method.
-
-    This prevents parallel execution of two instances of the same task within
-    the same worker. If an instance of the same task is running in the same
-    worker, the second invocation blocks until the first one completes.
-
-    Note that this applies to the task class, so `@synchronized` should
-    appear before `@task` or `@periodic_task` when tasks are defined with
-    decorators.
-
-    .. code-block:: python
-
-        @synchronized
-        @task
-        def cleanup_database(**kwargs):
-            logger = cleanup_database.get_logger(**kwargs)
-            logger.warn("Task running...")
-    """
-    from multiprocessing import Lock
-    cls.lock = lock or Lock()
-    cls.unsynchronized_run = cls.run
-    @wraps(cls.unsynchronized_run)
-    def wrapper(*args, **kwargs):
-        with cls.lock:
-            cls.unsynchronized_run(*args, **kwargs)
-    cls.run = wrapper
-    # cls.__class__.__call__ is set by recent versions of celery (2.5)
-    def call(self, *args, **kwargs):
-        return wrapper(*args, **kwargs)
-    cls.__class__.__call__ = call
-    return cls
-
+logger = logging.getLogger("openPLM.index")
 
 _plmobject_fields = ("owner__username", "creator__username", "group__name", "state", "lifecycle")
 _documentfile_fields =  ("document", ) + tuple("document__" + f for f in _plmobject_fields)
@@ -67,49 +39,165 @@ def _get_manager(model_class):
     return manager
 
 
-@synchronized
+class IndexWriter(object):
+    """
+    .. versionadded:: 2.1
+
+    Indexer of a worker process.
+
+    :meth:`apply_operations` applies the operations of one task
+    (:func:`update_index`, :func:`update_indexes` or :func:`remove_index`)
+    in one transaction on a writable database. Operations on the same
+    object are coalesced (only the last operation is kept) and instances
+    are fetched with one query per model.
+
+    Nothing is kept in memory between two tasks: if the transaction
+    fails, the error is propagated so that the task is retried.
+
+    :attr:`stats` stores some metrics (number of batches, updates,
+    removals, coalesced operations, errors and time spent to
+    apply the batches), see also :meth:`get_stats`.
+    """
+
+    UPDATE = "update"
+    FAST_UPDATE = "fast_update"
+    REMOVE = "remove"
+
+    def __init__(self, lock=None):
+        self.lock = lock or Lock()
+        self.stats = dict.fromkeys(("batches", "updates", "removals",
+            "coalesced", "errors"), 0)
+        self.stats["time"] = 0.0
+
+    def coalesce(self, operations):
+        """
+        Returns the list of *operations* (tuples (operation, app_name,
+        model_name, pk)) keeping only the last operation on each object.
+        """
+        pending = OrderedDict()
+        for operation in operations:
+            identifier = u"%s.%s.%s" % operation[1:]
+            previous = pending.pop(identifier, None)
+            if previous is not None:
+                self.stats["coalesced"] += 1
+                if previous[0] == self.UPDATE and operation[0] == self.FAST_UPDATE:
+                    # a fast update would reuse outdated data
+                    operation = previous
+            pending[identifier] = operation
+        return pending.values()
+
+    def apply_operations(self, operations):
+        """
+        Applies *operations* (see :meth:`coalesce`) in one transaction.
+        """
+        from haystack import backend, site
+
+        batch = self.coalesce(operations)
+        if not batch:
+            return
+        with self.lock:
+            search_backend = backend.SearchBackend(site=site)
+            search_backend.open_writer()
+            t = time.time()
+            try:
+                with search_backend.transaction():
+                    self.apply(batch)
+            except Exception:
+                self.stats["errors"] += 1
+                logger.exception("Can not update the index")
+                raise
+            finally:
+                self.stats["time"] += time.time() - t
+                search_backend.close_writer()
+        self.stats["batches"] += 1
+        logger.info("Index batch: %(batches)d batches, %(updates)d "
+            "updates, %(removals)d removals, %(throughput).1f "
+            "operations/s", self.get_stats())
+
+    def apply(self, batch):
+        """
+        Applies a batch of operations (see :meth:`coalesce`).
+        """
+        from haystack import site
+        import openPLM.plmapp.search_indexes
+
+        updates = defaultdict(dict)
+        for operation, app_name, model_name, pk in batch:
+            if operation == self.REMOVE:
+                model_class = get_model(app_name, model_name)
+                identifier = u"%s.%s.%s" % (app_name, model_name, pk)
+                site.get_index(model_class).remove_object(identifier)
+                self.stats["removals"] += 1
+            else:
+                updates[(app_name, model_name)][pk] = operation
+        for (app_name, model_name), pks in updates.iteritems():
+            model_class = get_model(app_name, model_name)
+            search_index = site.get_index(model_class)
+            # one query per model
+            instances = _get_manager(model_class).in_bulk(pks.keys())
+            for pk, instance in instances.iteritems():
+                if pks[pk] == self.FAST_UPDATE:
+                    instance.fast_reindex = True
+                search_index.update_object(instance)
+                self.stats["updates"] += 1
+
+    def get_stats(self):
+        """
+        Returns a copy of :attr:`stats` with one more key: *throughput*
+        (number of applied operations per second).
+        """
+        stats = dict(self.stats)
+        operations = stats["updates"] + stats["removals"]
+        stats["throughput"] = operations / stats["time"] if stats["time"] else 0.0
+        return stats
+
+
+#: lock shared by the processes of a worker
+_index_lock = Lock()
+_index_writer = None
+
+def get_index_writer():
+    """
+    .. versionadded:: 2.1
+
+    Returns the :class:`IndexWriter` of the current process.
+    """
+    global _index_writer
+    if _index_writer is None:
+        _index_writer = IndexWriter(_index_lock)
+    return _index_writer
+
+
 @task(name="openPLM.plmapp.tasks.update_index",
       default_retry_delay=60, max_retries=10)
 def update_index(app_name, model_name, pk, fast_reindex=False, **kwargs):
-    from haystack import site
-    import openPLM.plmapp.search_indexes
-
-    model_class = get_model(app_name, model_name)
-    manager = _get_manager(model_class)
-    instance = manager.get(pk=pk)
-    if fast_reindex:
-        instance.fast_reindex = True
-    search_index = site.get_index(model_class)
-    search_index.update_object(instance)
+    operation = IndexWriter.FAST_UPDATE if fast_reindex else IndexWriter.UPDATE
+    try:
+        get_index_writer().apply_operations([(operation, app_name, model_name, pk)])
+    except Exception, exc:
+        kwargs["fast_reindex"] = fast_reindex
+        update_index.retry(args=(app_name, model_name, pk), kwargs=kwargs, exc=exc)
 
 
 @task(name="openPLM.plmapp.tasks.update_indexes",
       default_retry_delay=60, max_retries=10)
 def update_indexes(instances, fast_reindex=False):
-    from haystack import site
-    import openPLM.plmapp.search_indexes
-
-    for app_name, model_name, pk in instances:
-        model_class = get_model(app_name, model_name)
-        manager = _get_manager(model_class)
-        instance = manager.get(pk=pk)
-        if fast_reindex:
-            instance.fast_reindex = True
-        search_index = site.get_index(model_class)
-        search_index.update_object(instance)
-update_indexes = synchronized(update_indexes, update_index.lock)
+    operation = IndexWriter.FAST_UPDATE if fast_reindex else IndexWriter.UPDATE
+    try:
+        get_index_writer().apply_operations([(operation, app_name, model_name, pk)
+            for app_name, model_name, pk in instances])
+    except Exception, exc:
+        update_indexes.retry(args=(instances, fast_reindex), exc=exc)
 
 
 @task(name="openPLM.plmapp.tasks.remove_index",
       default_retry_delay=60, max_retries=10)
 def remove_index(app_name, model_name, identifier):
-    from haystack import site
-    import openPLM.plmapp.search_indexes
-
-    model_class = get_model(app_name, model_name)
-    search_index = site.get_index(model_class)
-    search_index.remove_object(identifier)
-remove_index = synchronized(remove_index, update_index.lock)
+    pk = identifier.rsplit(".", 1)[-1]
+    try:
+        get_index_writer().apply_operations([(IndexWriter.REMOVE, app_name, model_name, pk)])
+    except Exception, exc:
+        remove_index.retry(args=(app_name, model_name, identifier), exc=exc)
 
 
 @task
@@ -11,6 +11,7 @@ from haystack.models import SearchResult
 from openPLM.plmapp.controllers import (DocumentController, PartController,
         UserController, GroupController)
 from openPLM.plmapp import models
+from openPLM.plmapp.permissions import get_context, filter_readable
 from openPLM.plmapp.filters import richtext, plaintext
 from openPLM.plmapp.utils import get_pages_num
 
@@ -319,19 +320,14 @@ def is_readable(obj, user):
     #  * user is their owner
     #  * user is in their group
     if isinstance(obj, models.PLMObject):
-        if obj.is_official or obj.is_deprecated or obj.is_cancelled:
-            return True
-        if obj.owner_id == user.id:
-            return True
-        if not hasattr(user, "group_ids"):
-            # cache group ids as it may be used to test another object
-            # in the page
-            user.group_ids = set(user.groups.all().values_list("id", flat=True))
-        return obj.group_id in user.group_ids
+        # the authorization context is shared with the controllers
+        return bool(filter_readable(user, [obj]))
     elif isinstance(obj, SearchResult):
+        if getattr(obj, "readable", None) is not None:
+            # set by get_generic_data for all results
+            return obj.readable
         if is_plmobject(obj) or is_documentfile(obj):
-            if not hasattr(user, "group_names"):
-                user.group_names = set(user.groups.all().values_list("name", flat=True))
+            group_names = get_context(user).group_names
         if is_plmobject(obj):
             state_class = result_class(obj)
             if state_class in ("state-official", "state-deprecated", "state-cancelled"):
@@ -339,24 +335,16 @@ def is_readable(obj, user):
             if obj.owner == user.username:
                 return True
             if obj.group is None:
-                try:
-                    gr = models.PLMObject.objects.filter(id=obj.pk).values_list("group__name", flat=True)[0]
-                except IndexError: # deleted object, not yet unindexed
-                    return False
-                return gr in user.group_names
-            return obj.group in user.group_names
+                # a deleted object, not yet unindexed, is not readable
+                return bool(filter_readable(user, [int(obj.pk)]))
+            return obj.group in group_names
         elif is_documentfile(obj):
             if obj.group:
-                if obj.group in user.group_names:
+                if obj.group in group_names:
                     return True
                 else:
                     # the document may be official, deprecated...
-                    s, l = (models.PLMObject.objects.filter(id=obj.document_id)
-                            .values_list("state", "lifecycle"))[0]
-                    obj.state_id = s
-                    obj.lifecycle_id = l
-                    return get_state_class(obj) in ("official", "deprecated",
-                            "cancelled")
+                    return bool(filter_readable(user, [obj.document_id]))
             # document file indexed before the revision [1848]
             if obj.object is None: # deleted object
                 return False
@@ -44,6 +44,9 @@ from openPLM.plmapp.tests.navigate import *
 from openPLM.plmapp.tests.reference import *
 from openPLM.plmapp.tests.restricted import *
 from openPLM.plmapp.tests.filters import *
+from openPLM.plmapp.tests.bom import *
+from openPLM.plmapp.tests.closure import *
+from openPLM.plmapp.tests.tasks import *
 
 import openPLM.plmapp.models
 from openPLM.plmapp.lifecycle import LifecycleList
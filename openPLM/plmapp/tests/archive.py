@@ -1,9 +1,20 @@
+import os
+import shutil
 import zipfile
 import tarfile
+import tempfile
 from cStringIO import StringIO
 
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
 from openPLM.plmapp.tests.views import CommonViewTest
 from openPLM.plmapp.controllers.document import DocumentController
+from openPLM.plmapp.controllers.part import PartController
+from openPLM.plmapp.utils.archive import iterate_in_thread, ARCHIVE_FORMATS
+from openPLM.plmapp import archivecache, models
 
 class ArchiveViewTestCase(CommonViewTest):
 
@@ -35,9 +46,12 @@ class ArchiveViewTestCase(CommonViewTest):
         self.controller.attach_to_document(self.document)
         self.controller.attach_to_document(self.document_bis)
 
-    def get_archive(self, obj, format):
-        response = self.client.get(obj.plmobject_url + "archive/",
+    def get_response(self, obj, format):
+        return self.client.get(obj.plmobject_url + "archive/",
              {"format": format})
+
+    def get_archive(self, obj, format):
+        response = self.get_response(obj, format)
         return StringIO("".join(response.streaming_content))
 
     def test_download_document_zip(self):
@@ -78,3 +92,262 @@ class ArchiveViewTestCase(CommonViewTest):
             self.assertEqual(self.contents[name], tf.extractfile(name).read())
         tf.close()
 
+
+    def test_content_length_tar(self):
+        for obj in (self.document, self.controller):
+            response = self.get_response(obj, "tar")
+            content = "".join(response.streaming_content)
+            self.assertEqual(len(content), int(response["Content-Length"]))
+
+    def test_content_length_zip_deflated(self):
+        # .test files are compressed, the size is unknown
+        response = self.get_response(self.document, "zip")
+        self.assertFalse(response.has_header("Content-Length"))
+
+    def test_content_length_zip_stored(self):
+        doc = DocumentController.create('doc3', 'Document',
+                'a', self.user, self.DATA)
+        for i in range(3):
+            doc.add_file(self.get_file("image_%d.png" % i, "png" * (i + 1)))
+        response = self.get_response(doc, "zip")
+        content = "".join(response.streaming_content)
+        self.assertEqual(len(content), int(response["Content-Length"]))
+        zf = zipfile.ZipFile(StringIO(content))
+        self.assertFalse(zf.testzip())
+        self.assertEqual("pngpng", zf.open("image_1.png").read())
+        zf.close()
+
+
+class IterateInThreadTestCase(SimpleTestCase):
+
+    def test_iterate(self):
+        self.assertEqual(range(100), list(iterate_in_thread(xrange(100), 4)))
+
+    def test_exception(self):
+        def gen():
+            yield 1
+            raise ValueError()
+        it = iterate_in_thread(gen())
+        self.assertEqual(1, it.next())
+        self.assertRaises(ValueError, it.next)
+
+    def test_close(self):
+        it = iterate_in_thread(iter(xrange(1000)), 2)
+        self.assertEqual(0, it.next())
+        it.close()
+
+
+class ArchiveCacheTestCase(CommonViewTest):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings = override_settings(ARCHIVES_CACHE_DIR=self.cache_dir)
+        self.settings.enable()
+        super(ArchiveCacheTestCase, self).setUp()
+        self.document = DocumentController.create('doc1', 'Document',
+                'a', self.user, self.DATA)
+        self.content = "".join(chr(i % 256) for i in xrange(5000))
+        self.document.add_file(self.get_file("file.test", self.content))
+
+    def tearDown(self):
+        super(ArchiveCacheTestCase, self).tearDown()
+        self.settings.disable()
+        shutil.rmtree(self.cache_dir)
+
+    def get_archives(self):
+        return sorted(os.listdir(self.cache_dir))
+
+    def get_response(self, obj, format, **extra):
+        return self.client.get(obj.plmobject_url + "archive/",
+             {"format": format}, **extra)
+
+    def test_not_official(self):
+        response = self.get_response(self.document, "zip")
+        "".join(response.streaming_content)
+        self.assertFalse(response.has_header("Accept-Ranges"))
+        self.assertEqual([], self.get_archives())
+
+    def test_fill_on_promotion(self):
+        self.document.promote()
+        archives = self.get_archives()
+        self.assertEqual(len(ARCHIVE_FORMATS), len(archives))
+        response = self.get_response(self.document, "zip")
+        self.assertEqual("bytes", response["Accept-Ranges"])
+        content = "".join(response.streaming_content)
+        self.assertEqual(len(content), int(response["Content-Length"]))
+        zf = zipfile.ZipFile(StringIO(content))
+        self.assertEqual(self.content, zf.open("file.test").read())
+        zf.close()
+        self.assertEqual(archives, self.get_archives())
+
+    def test_fill_part(self):
+        self.attach_to_official_document()
+        self.controller.attach_to_document(self.document)
+        self.document.promote()
+        self.controller.promote()
+        # archives of the two documents and of the part
+        self.assertEqual(3 * len(ARCHIVE_FORMATS), len(self.get_archives()))
+        response = self.get_response(self.controller, "tar")
+        self.assertEqual("bytes", response["Accept-Ranges"])
+        tf = tarfile.open(fileobj=StringIO("".join(response.streaming_content)))
+        self.assertEqual(self.content, tf.extractfile("file.test").read())
+        self.assertEqual(2, len(tf.getnames()))
+        tf.close()
+
+    def test_fill_on_miss(self):
+        self.document.promote()
+        archivecache.clear()
+        response = self.get_response(self.document, "tar")
+        content = "".join(response.streaming_content)
+        self.assertFalse(response.has_header("Accept-Ranges"))
+        archives = self.get_archives()
+        self.assertEqual(1, len(archives))
+        self.assertTrue(archives[0].endswith(".tar"))
+        response = self.get_response(self.document, "tar")
+        self.assertEqual("bytes", response["Accept-Ranges"])
+        self.assertEqual(content, "".join(response.streaming_content))
+
+    def test_fill_on_miss_building(self):
+        self.document.promote()
+        archivecache.clear()
+        key = archivecache.get_building_key(self.document.id, "tar")
+        # another request is building the archive
+        cache.add(key, True)
+        response = self.get_response(self.document, "tar")
+        "".join(response.streaming_content)
+        self.assertEqual([], self.get_archives())
+        # the task clears the marker
+        cache.delete(key)
+        self.assertTrue(archivecache.schedule_fill(self.document.id, "tar"))
+        self.assertEqual(None, cache.get(key))
+        self.assertEqual(1, len(self.get_archives()))
+
+    def test_range(self):
+        self.document.promote()
+        response = self.get_response(self.document, "tar")
+        content = "".join(response.streaming_content)
+        etag = response["ETag"]
+        size = len(content)
+        response = self.get_response(self.document, "tar",
+                HTTP_RANGE="bytes=100-1199")
+        self.assertEqual(206, response.status_code)
+        self.assertEqual(content[100:1200], "".join(response.streaming_content))
+        self.assertEqual("1100", response["Content-Length"])
+        self.assertEqual("bytes 100-1199/%d" % size, response["Content-Range"])
+        # suffix range
+        response = self.get_response(self.document, "tar",
+                HTTP_RANGE="bytes=-10", HTTP_IF_RANGE=etag)
+        self.assertEqual(206, response.status_code)
+        self.assertEqual(content[-10:], "".join(response.streaming_content))
+        # modified archive
+        response = self.get_response(self.document, "tar",
+                HTTP_RANGE="bytes=-10", HTTP_IF_RANGE='"etag"')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(content, "".join(response.streaming_content))
+        # unsatisfiable range
+        response = self.get_response(self.document, "tar",
+                HTTP_RANGE="bytes=%d-" % size)
+        self.assertEqual(416, response.status_code)
+        self.assertEqual("bytes */%d" % size, response["Content-Range"])
+
+    def test_key(self):
+        files = list(self.document.files)
+        path = archivecache.get_path(self.document, files, "zip")
+        self.assertEqual(path, archivecache.get_path(self.document, files, "zip"))
+        self.assertNotEqual(path, archivecache.get_path(self.document, files, "tar"))
+        files[0].revision += 1
+        self.assertNotEqual(path, archivecache.get_path(self.document, files, "zip"))
+
+    def test_evict(self):
+        self.document.promote()
+        zip_path, tar_path = [archivecache.get_path(self.document,
+            self.document.files, f) for f in ("zip", "tar")]
+        # the zip file is the least recently used archive
+        os.utime(zip_path, (0, 0))
+        self.assertEqual(0, archivecache.evict(10 ** 9))
+        self.assertEqual(1, archivecache.evict(os.path.getsize(tar_path)))
+        self.assertFalse(os.path.exists(zip_path))
+        self.assertTrue(os.path.exists(tar_path))
+
+
+class AssemblyArchiveTestCase(CommonViewTest):
+
+    def setUp(self):
+        super(AssemblyArchiveTestCase, self).setUp()
+        self.c1 = PartController.create("c1", "Part", "a", self.user, self.DATA)
+        self.c2 = PartController.create("c2", "Part", "a", self.user, self.DATA)
+        self.controller.add_child(self.c1, 1, 10)
+        self.c1.add_child(self.c2, 1, 10)
+        self.documents = {}
+        for name, parts in (("root", [self.controller]), ("d1", [self.c1]),
+                ("shared", [self.c2, self.c1]), ("d2", [self.c2])):
+            doc = DocumentController.create(name, "Document", "a",
+                    self.user, self.DATA)
+            doc.add_file(self.get_file(name + ".test", name))
+            for part in parts:
+                part.attach_to_document(doc)
+            self.documents[name] = doc
+        self.expected = {
+            "Part1_a/root.test" : "root",
+            "Part1_a/c1_a/d1.test" : "d1",
+            # only stored in the directory of the first part of the BOM
+            "Part1_a/c1_a/shared.test" : "shared",
+            "Part1_a/c1_a/c2_a/d2.test" : "d2",
+        }
+
+    def get_archive(self, format, **data):
+        data.update(format=format, assembly="1")
+        response = self.client.get(self.base_url + "archive/", data)
+        return StringIO("".join(response.streaming_content))
+
+    def test_download_tar(self):
+        tf = tarfile.open(fileobj=self.get_archive("tar"))
+        self.assertEqual(sorted(self.expected), sorted(tf.getnames()))
+        for name, content in self.expected.iteritems():
+            self.assertEqual(content, tf.extractfile(name).read())
+        tf.close()
+
+    def test_download_zip(self):
+        zf = zipfile.ZipFile(self.get_archive("zip"))
+        self.assertFalse(zf.testzip())
+        self.assertEqual(sorted(self.expected), sorted(zf.namelist()))
+        for name, content in self.expected.iteritems():
+            self.assertEqual(content, zf.open(name).read())
+        zf.close()
+
+    def test_download_unreadable_document(self):
+        # d2 is only readable by the company
+        models.Document.objects.filter(id=self.documents["d2"].id).update(
+                owner=self.cie, group=self.leading_group)
+        del self.expected["Part1_a/c1_a/c2_a/d2.test"]
+        tf = tarfile.open(fileobj=self.get_archive("tar"))
+        self.assertEqual(sorted(self.expected), sorted(tf.getnames()))
+        tf.close()
+
+    def test_get_assembly_files_official(self):
+        self.documents["root"].promote()
+        files = self.controller.get_assembly_files(only_official=True)
+        self.assertEqual([("Part1_a", "root.test")],
+                [(path, df.filename) for path, df in files])
+
+    def test_get_assembly_files_date(self):
+        date = self.documents["root"].ctime
+        files = self.controller.get_assembly_files(date=date)
+        self.assertEqual([], files)
+
+    def test_get_assembly_files_past_revisions(self):
+        date = timezone.now()
+        root = self.documents["root"]
+        root_file = root.files[0]
+        root.checkin(root_file, self.get_file("root.test", "new root"))
+        self.documents["d1"].add_file(self.get_file("new.test", "new"))
+        files = self.controller.get_assembly_files(date=date)
+        names = dict((path + "/" + df.filename, df) for path, df in files)
+        self.assertEqual(sorted(self.expected), sorted(names))
+        self.assertEqual(1, names["Part1_a/root.test"].revision)
+        self.assertEqual("root", names["Part1_a/root.test"].file.read())
+        # current files
+        files = self.controller.get_assembly_files()
+        names = dict((path + "/" + df.filename, df) for path, df in files)
+        self.assertEqual(2, names["Part1_a/root.test"].revision)
+        self.assertTrue("Part1_a/c1_a/new.test" in names)
@@ -4,6 +4,7 @@ from django.core.files.base import ContentFile
 from django.contrib.auth.models import User
 from django.test import TestCase
 
+from openPLM.plmapp import refcache
 from openPLM.plmapp.models import GroupInfo, DocumentFile
 from openPLM.plmapp.controllers import PLMObjectController
 
@@ -60,6 +61,8 @@ class BaseTestCase(TestCase):
 
     def tearDown(self):
         cache.clear()
+        # values kept in memory do not read the cleared version at once
+        refcache.invalidate(refcache.LIFECYCLES)
         from haystack import backend
         backend.SearchBackend.inmemory_db = None
         super(BaseTestCase, self).tearDown()
@@ -0,0 +1,61 @@
+############################################################################
+# openPLM - open source PLM
+# Copyright 2010 Philippe Joulaud, Pierre Cosquer
+#
+# This file is part of openPLM.
+#
+#    openPLM is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    openPLM is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with openPLM.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact :
+#    Philippe Joulaud : ninoo.fr@gmail.com
+#    Pierre Cosquer : pcosquer@linobject.com
+################################################################################
+
+"""
+This module contains tests of :func:`.build_bom_tree`. Its performances
+are measured by the ``benchmark_bom_tree`` command.
+"""
+
+from django.test import SimpleTestCase
+
+from openPLM.plmapp.controllers.part import build_bom_tree, Child, Parent
+from openPLM.plmapp.management.commands.benchmark_bom_tree import (
+        make_assembly, reverse_assembly)
+
+
+class BOMTreeTestCase(SimpleTestCase):
+
+    def test_children(self):
+        links = make_assembly(100000)
+        res = build_bom_tree(0, links, -1, Child, "parent_id", "child_id")
+        self.assertEqual(len(links), len(res))
+
+    def test_parents(self):
+        # a part used in many assemblies: the tree is built upside down
+        links = reverse_assembly(make_assembly(100000))
+        res = build_bom_tree(0, links, -1, Parent, "child_id", "parent_id")
+        self.assertEqual(len(links), len(res))
+
+    def test_order(self):
+        links = make_assembly(1000)
+        res = build_bom_tree(0, links, -1, Child, "parent_id", "child_id")
+        # depth first order: a child follows its parent and siblings are
+        # sorted by ascending order
+        last = {0: (0, 0)}
+        for level, link in res:
+            parent_level, parent_order = last[link.parent_id]
+            self.assertEqual(parent_level + 1, level)
+            last[link.child_id] = (level, 0)
+            self.assertTrue(parent_order <= link.order)
+            last[link.parent_id] = (parent_level, link.order)
@@ -23,40 +23,111 @@
 ################################################################################
 
 """
-This module contains tests to measure the performances of
-:func:`.rebuild_closure`.
+This module contains tests of the :class:`.ClosureDelegationLink` table
+(transitive closure of delegations).
 """
 
-import time
 import random
+
 from django.test import TestCase
 
 from openPLM.plmapp.models import *
+from openPLM.plmapp.mail import get_delegatees, get_roles_filter
+from openPLM.plmapp.utils import level_to_sign_str
+
 
-class ClosureTest(TestCase):
-    def go(self, nb_users, nb_links):
-        users = []
-        for i in xrange(nb_users):
-            user = User(username=str(i))
+class DelegationClosureTestCase(TestCase):
+
+    def setUp(self):
+        self.users = []
+        for i in xrange(5):
+            user = User(username="user%d" % i)
             user.save()
-            users.append(user)
-        for role, r in [("owner", "owner")]:
-            for i in xrange(nb_links):
-                u1 = random.choice(users)
-                u2 = random.choice(users)
-                if u1 != u2:
-                    DelegationLink.objects.get_or_create(delegator=u1, delegatee=u2,
-                                          role=role)
-        t = time.clock()
-        for user in users:
-            delegators = DelegationLink.get_delegators(user, "owner")
-            print len(delegators), delegators[:10]
-        print time.clock() - t
-        print DelegationLink.objects.all().count(), "links"
-        t = time.clock()
-        rebuild_closure()
-        print time.clock() - t
-        print ClosureDelegationLink.objects.all().count(), "links"
-
-    def test_performance(self):
-        self.go(1000, 1000)
+            self.users.append(user)
+
+    def delegate(self, delegator, delegatee, role=ROLE_OWNER):
+        return DelegationLink.objects.create(delegator=self.users[delegator],
+                delegatee=self.users[delegatee], role=role)
+
+    def get_delegators(self, user, role=ROLE_OWNER):
+        ids = DelegationLink.get_delegators(self.users[user], role)
+        return sorted(self.users.index(User.objects.get(id=i)) for i in ids)
+
+    def get_closure(self):
+        return sorted(ClosureDelegationLink.objects.values_list("role",
+            "delegator", "delegatee"))
+
+    def test_chain(self):
+        self.delegate(0, 1)
+        self.delegate(1, 2)
+        self.delegate(2, 3)
+        self.assertEqual([0, 1, 2], self.get_delegators(3))
+        self.assertEqual([0, 1], self.get_delegators(2))
+        self.assertEqual([], self.get_delegators(0))
+        self.assertEqual([], self.get_delegators(3, ROLE_NOTIFIED))
+
+    def test_roles(self):
+        self.delegate(0, 1)
+        self.delegate(1, 2, ROLE_NOTIFIED)
+        self.assertEqual([], self.get_delegators(2))
+        self.assertEqual([1], self.get_delegators(2, ROLE_NOTIFIED))
+
+    def test_end(self):
+        self.delegate(0, 1)
+        link = self.delegate(1, 2)
+        self.delegate(2, 3)
+        link.end()
+        self.assertEqual([2], self.get_delegators(3))
+        self.assertEqual([], self.get_delegators(2))
+        self.assertEqual([0], self.get_delegators(1))
+
+    def test_end_several_paths(self):
+        self.delegate(0, 1)
+        self.delegate(0, 2)
+        link = self.delegate(1, 3)
+        self.delegate(2, 3)
+        link.end()
+        self.assertEqual([0, 2], self.get_delegators(3))
+
+    def test_delete(self):
+        link = self.delegate(0, 1)
+        self.delegate(1, 2)
+        link.delete()
+        self.assertEqual([1], self.get_delegators(2))
+
+    def test_cycle(self):
+        self.delegate(0, 1)
+        link = self.delegate(1, 0)
+        self.assertEqual([0, 1], self.get_delegators(0))
+        link.end()
+        self.assertEqual([], self.get_delegators(0))
+        self.assertEqual([0], self.get_delegators(1))
+
+    def test_mail_get_delegatees(self):
+        self.delegate(0, 1)
+        self.delegate(1, 2)
+        self.delegate(3, 4, ROLE_NOTIFIED)
+        self.delegate(3, 4, level_to_sign_str(0))
+        ids = [u.id for u in self.users]
+        delegatees = get_delegatees([ids[0], ids[3]], get_roles_filter([ROLE_OWNER]))
+        self.assertEqual({ids[0] : set([ids[1], ids[2]])}, dict(delegatees))
+        delegatees = get_delegatees([ids[3]], get_roles_filter([ROLE_SIGN]))
+        self.assertEqual({ids[3] : set([ids[4]])}, dict(delegatees))
+
+    def test_rebuild(self):
+        rand = random.Random(0)
+        roles = (ROLE_OWNER, ROLE_NOTIFIED)
+        links = []
+        for i in xrange(40):
+            d1, d2 = rand.sample(xrange(len(self.users)), 2)
+            role = rand.choice(roles)
+            if not DelegationLink.current_objects.filter(role=role,
+                    delegator=self.users[d1], delegatee=self.users[d2]).exists():
+                links.append(self.delegate(d1, d2, role))
+            if links and rand.random() < 0.3:
+                links.pop(rand.randrange(len(links))).end()
+        closure = self.get_closure()
+        self.assertTrue(closure)
+        self.assertEqual(len(closure), rebuild_delegation_closure())
+        self.assertEqual(closure, self.get_closure())
+
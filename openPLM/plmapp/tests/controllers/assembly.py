@@ -1,11 +1,17 @@
+from django.conf import settings
+from django.contrib.auth.models import User
 from django.test import TransactionTestCase
 from django.core import mail
+from django.db import connection
+from django.utils import timezone
 
 from openPLM.plmapp.controllers import PartController
+from openPLM.plmapp.controllers import part as part_module
 from openPLM.plmapp import models
 from openPLM.plmapp import exceptions as exc
 from openPLM.plmapp.utils import level_to_sign_str
 from openPLM.plmapp.lifecycle import LifecycleList
+from openPLM.plmapp.permissions import get_context
 
 
 from openPLM.plmapp.tests.base import BaseTestCase
@@ -16,6 +22,16 @@ P = "proposed"
 DE = "deprecated"
 I = "issue"
 
+class TaskRecorder(object):
+    """ Fake celery task which records its calls """
+
+    def __init__(self):
+        self.calls = []
+
+    def delay(self, *args):
+        self.calls.append(args)
+
+
 class AssemblyTestCase(BaseTestCase, TransactionTestCase):
 
     CONTROLLER = PartController
@@ -94,11 +110,19 @@ class AssemblyTestCase(BaseTestCase, TransactionTestCase):
 
     def assertPromotion(self, assembly, state=O):
         ctrl, ctrls = self.build_assembly(*assembly)
+        start = timezone.now()
         ctrl.promote_assembly()
         for c in ctrls:
             obj = models.Part.objects.get(id=c.id)
             if c.lifecycle == ctrl.lifecycle and c.original_state == ctrl.original_state:
                 self.assertEqual(obj.state.name, state)
+                self.assertTrue(obj.mtime >= start)
+                self.assertEqual(1, ctrl.HISTORY.objects.filter(plmobject=obj,
+                    action="promoted").count())
+                sh = models.StateHistory.objects.get(plmobject=obj, end_time=None)
+                self.assertEqual(obj.state, sh.state)
+                self.assertEqual(obj.is_official,
+                        sh.state_category == models.StateHistory.OFFICIAL)
             else:
                 self.assertEqual(obj.state.name, c.original_state)
 
@@ -111,6 +135,17 @@ class AssemblyTestCase(BaseTestCase, TransactionTestCase):
             self.assertEqual(obj.state.name, c.original_state)
         self.assertEqual(outbox, mail.outbox)
 
+    def test_promotion_invalidates_contexts(self):
+        ctrl, ctrls = self.build_assembly("P1", D, {}, [
+            ("P2", D, {}, []),
+        ])
+        cie = User.objects.get(username=settings.COMPANY)
+        context = get_context(cie)
+        self.assertFalse(context.has_role(ctrl.id, models.ROLE_OWNER))
+        ctrl.promote_assembly()
+        self.assertEqual(O, models.Part.objects.get(id=ctrl.id).state.name)
+        self.assertTrue(context.has_role(ctrl.id, models.ROLE_OWNER))
+
     def get_issue_lifecycle(self):
         lcl = LifecycleList("lc_asm", O, D, P, I, O, DE)
         return models.Lifecycle.from_lifecyclelist(lcl)
@@ -488,7 +523,92 @@ class AssemblyTestCase(BaseTestCase, TransactionTestCase):
             ]),
         )
 
+    def count_promotion_queries(self, ref, nb_children):
+        assembly = (ref, D, {}, [
+            ("%s-%d" % (ref, i), D, {}, [
+                ("%s-%d-1" % (ref, i), D, {}, []),
+            ]) for i in xrange(nb_children)
+        ])
+        ctrl, ctrls = self.build_assembly(*assembly)
+        # indexing is not counted, it is done by another process
+        update_indexes = part_module.update_indexes
+        part_module.update_indexes = recorder = TaskRecorder()
+        connection.use_debug_cursor = True
+        connection.queries = []
+        try:
+            ctrl.promote_assembly()
+            nb_queries = len(connection.queries)
+        finally:
+            connection.use_debug_cursor = None
+            part_module.update_indexes = update_indexes
+        # only one task is sent
+        self.assertEqual(1, len(recorder.calls))
+        self.assertEqual(len(ctrls), len(recorder.calls[0][0]))
+        return nb_queries
+
+    def test_constant_number_of_queries(self):
+        self.assertEqual(self.count_promotion_queries("A", 2),
+                self.count_promotion_queries("B", 20))
+
+    def test_merged_mails(self):
+        brian = self.get_contributor()
+        brian.email = "brian@example.com"
+        brian.save()
+        models.DelegationLink.objects.create(delegator=brian,
+                delegatee=self.user, role=level_to_sign_str(0))
+        mail.outbox = []
+        self.assertPromotion(
+            ("P1", D, {"signers": [brian]}, [
+                ("P2", D, {"signers": [brian]}, [
+                    ("P3", D, {"signers": [brian]}, []),
+                ]),
+                ("P4", D, {"signers": [brian]}, []),
+            ]),
+        )
+        emails = [e for m in mail.outbox for e in m.bcc]
+        # one mail per user
+        self.assertEqual(sorted(set(emails)), sorted(emails))
+        self.assertEqual(1, emails.count(brian.email))
 
-    # TODO:
-    #  * alternates
+    def test_merged_mails_notified(self):
+        carl = User.objects.create(username="carl", email="carl@example.com")
+        ctrl, ctrls = self.build_assembly("P1", D, {}, [
+            ("P2", D, {}, [
+                ("P3", D, {}, []),
+            ]),
+        ])
+        for c in ctrls:
+            models.PLMObjectUserLink.objects.create(plmobject=c.object,
+                    user=carl, role=models.ROLE_NOTIFIED)
+        mail.outbox = []
+        ctrl.promote_assembly()
+        emails = [e for m in mail.outbox for e in m.bcc]
+        self.assertEqual(1, emails.count(carl.email))
+
+    def create_official_part(self, ref):
+        ctrl = self.CONTROLLER.create(ref, self.TYPE, "a", self.user,
+                self.DATA, True, True)
+        ctrl.object.state = ctrl.lifecycle.official_state
+        ctrl.object.save(update_fields=("state",))
+        return ctrl
+
+    def test_alternates(self):
+        previous = self.create_official_part("P3")
+        alternate = self.create_official_part("Q1")
+        models.AlternatePartSet.join(previous.object, alternate.object)
+        ctrl, ctrls = self.build_assembly("P1", D, {}, [
+            ("P2", D, {}, [
+                ("P3", D, {"rev": "b"}, []),
+            ]),
+        ])
+        revision = [c for c in ctrls if c.reference == "P3"][0]
+        models.RevisionLink.objects.create(old=previous.object, new=revision.object)
+        ctrl.promote_assembly()
+        # the official revision replaces its previous revision,
+        # like PartController.promote
+        self.assertTrue(models.Part.objects.get(id=previous.id).is_deprecated)
+        self.assertEqual(None, models.AlternatePartSet.get_partset(previous.object))
+        partset = models.AlternatePartSet.get_partset(revision.object)
+        self.assertEqual(set([revision.id, alternate.id]),
+                set(partset.parts.values_list("id", flat=True)))
 
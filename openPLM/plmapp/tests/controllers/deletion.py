@@ -1,5 +1,8 @@
 import os
+import shutil
 import datetime
+from django.core.management import call_command
+from django.test.utils import override_settings
 from django.utils import timezone
 
 import openPLM.plmapp.models as models
@@ -228,3 +231,75 @@ class DeletionTestCase(BaseTestCase):
         self.assertDeleted(d.previous_revision)
 
 
+@override_settings(DOCUMENTS_CONTENT_ADDRESSED=True)
+class ContentAddressedStorageTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(ContentAddressedStorageTestCase, self).setUp()
+        self.controller = DocumentController.create("adoc", "Document", "a",
+                                                 self.user, {})
+
+    def tearDown(self):
+        dlt.ON_CHECKIN_SELECTORS[:] = on_checkin
+        super(ContentAddressedStorageTestCase, self).tearDown()
+        shutil.rmtree(models.docfs.path(models.docfs.BLOBS_DIR), True)
+
+    def get_blob(self, doc_file):
+        return models.DocumentBlob.objects.get(name=doc_file.file.name)
+
+    def test_add_file(self):
+        d1 = self.controller.add_file(self.get_file("a.test", "data"))
+        d2 = self.controller.add_file(self.get_file("b.test", "data"))
+        self.assertEqual(d1.file.name, d2.file.name)
+        self.assertTrue(d1.file.name.startswith(models.docfs.BLOBS_DIR))
+        self.assertEqual(2, self.get_blob(d1).refcount)
+        d3 = self.controller.add_file(self.get_file("c.test", "other data"))
+        self.assertNotEqual(d1.file.name, d3.file.name)
+        self.assertEqual("other data", d3.file.read())
+
+    def test_revise(self):
+        d = self.controller.add_file(self.get_file(data="d0"))
+        rev = self.controller.revise("b")
+        d2, = rev.files.all()
+        self.assertEqual(d.file.name, d2.file.name)
+        self.assertEqual("d0", d2.file.read())
+        self.assertEqual(2, self.get_blob(d).refcount)
+
+    def test_checkin_delete_all(self):
+        dlt.ON_CHECKIN_SELECTORS[:] = [(dlt.yes, dlt.DeleteAllFiles())]
+        d = self.controller.add_file(self.get_file(data="d0"))
+        rev = self.controller.revise("b")
+        self.controller.checkin(d, self.get_file(data="d1"))
+        d, = self.controller.files.all()
+        self.assertTrue(d.previous_revision.deleted)
+        # the blob is still referenced by the revision
+        d2, = rev.files.all()
+        self.assertEqual(1, self.get_blob(d2).refcount)
+        self.assertEqual("d0", d2.file.read())
+        rev.checkin(d2, self.get_file(data="d2"))
+        self.assertFalse(models.DocumentBlob.objects.filter(name=d2.file.name))
+        self.assertFalse(os.path.exists(d2.file.path))
+
+    def test_collect_garbage(self):
+        d = self.controller.add_file(self.get_file(data="d0"))
+        path = d.file.path
+        models.docfs.delete(d.file.name)
+        self.assertEqual((0, 0), models.docfs.collect_garbage())
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual((1, 2), models.docfs.collect_garbage(
+            grace=datetime.timedelta(0)))
+        self.assertFalse(os.path.exists(path))
+
+    def test_convert(self):
+        with self.settings(DOCUMENTS_CONTENT_ADDRESSED=False):
+            d1 = self.controller.add_file(self.get_file("a.test", "data"))
+            d2 = self.controller.add_file(self.get_file("b.test", "data"))
+        paths = [d1.file.path, d2.file.path]
+        self.assertNotEqual(d1.file.name, d2.file.name)
+        call_command("convert_document_storage", verbosity=0)
+        d1, d2 = self.controller.files.order_by("id")
+        self.assertEqual(d1.file.name, d2.file.name)
+        self.assertEqual(2, self.get_blob(d1).refcount)
+        self.assertEqual("data", d2.file.read())
+        for path in paths:
+            self.assertFalse(os.path.exists(path))
@@ -26,13 +26,17 @@
 This module contains some tests for openPLM.
 """
 
+from django.db import transaction
+from django.test.utils import override_settings
 from django.utils import timezone
+import datetime
 import itertools
 
 from openPLM.plmapp.controllers import PLMObjectController, PartController, \
         DocumentController
 import openPLM.plmapp.exceptions as exc
 import openPLM.plmapp.models as models
+from openPLM.plmapp import bomcache
 from openPLM.plmapp.lifecycle import LifecycleList
 
 from openPLM.plmapp.tests.controllers.plmobject import ControllerTest
@@ -410,6 +414,27 @@ class PartControllerTest(ControllerTest):
                 self.controller.get_children(-1, only_official=True)]
         self.assertEqual(children, wanted)
 
+    def test_links_at(self):
+        link = self.controller.add_child(self.controller2, 10, 15)
+        self.controller.delete_child(self.controller2)
+        link = models.ParentChildLink.objects.get(id=link.id)
+        second = datetime.timedelta(seconds=1)
+        def at(time):
+            return list(models.ParentChildLink.objects.at(time)\
+                    .filter(parent=self.controller.object))
+        self.assertEqual([], at(link.ctime - second))
+        # bounds are included
+        self.assertEqual([link], at(link.ctime))
+        self.assertEqual([link], at(link.end_time))
+        self.assertEqual([], at(link.end_time + second))
+        self.assertEqual([], at(None))
+        # state histories
+        sh = models.StateHistory.objects.filter(plmobject=self.controller.object)
+        start = sh.order_by("start_time")[0].start_time
+        self.assertEqual([], list(sh.at(start - second)))
+        self.assertEqual(1, sh.at(start).count())
+        self.assertEqual(1, sh.at(None).count())
+
     def test_get_parents(self):
         controller4 = self.create("aPart4")
         self.controller.add_child(self.controller2, 10, 15)
@@ -451,6 +476,78 @@ class PartControllerTest(ControllerTest):
                 self.controller3.get_parents(-1, only_official=True)]
         self.assertEqual(parents, wanted)
 
+    def test_is_ancestor(self):
+        self.controller.add_child(self.controller2, 10, 15)
+        self.controller2.add_child(self.controller3, 10, 15)
+        self.assertTrue(self.controller3.is_ancestor(self.controller.object))
+        self.assertTrue(self.controller3.is_ancestor(self.controller2.object))
+        self.assertFalse(self.controller.is_ancestor(self.controller3.object))
+        self.controller2.delete_child(self.controller3)
+        self.assertFalse(self.controller3.is_ancestor(self.controller.object))
+
+    def test_bom_closure(self):
+        controller4 = self.create("aPart4")
+        self.controller.add_child(self.controller2, 10, 15)
+        self.controller.add_child(controller4, 10, 25)
+        self.controller2.add_child(self.controller3, 10, 15)
+        controller4.add_child(self.controller2, 10, 15)
+        closure = models.ParentChildLinkClosure.current_objects
+        paths = set(closure.filter(ancestor=self.controller.object).\
+                values_list("descendant", "depth"))
+        wanted = set([(self.controller2.id, 1), (self.controller2.id, 2),
+            (controller4.id, 1), (self.controller3.id, 2), (self.controller3.id, 3)])
+        self.assertEqual(wanted, paths)
+        date = timezone.now()
+        children = self.controller.get_children(-1)
+        # a modification does not change the closure
+        self.controller.modify_child(self.controller2, 14, 15, "-")
+        self.assertEqual(wanted, set(closure.filter(ancestor=self.controller.object).\
+                values_list("descendant", "depth")))
+        self.controller.delete_child(self.controller2)
+        wanted = set([(controller4.id, 1), (self.controller2.id, 2),
+            (self.controller3.id, 3)])
+        self.assertEqual(wanted, set(closure.filter(ancestor=self.controller.object).\
+                values_list("descendant", "depth")))
+        # rebuilds the closure and checks the bom at *date*
+        models.rebuild_bom_closure()
+        self.assertEqual(wanted, set(closure.filter(ancestor=self.controller.object).\
+                values_list("descendant", "depth")))
+        self.assertEqual(children, self.controller.get_children(-1, date=date))
+
+    @override_settings(BOM_CACHE_CURRENT=True)
+    def test_get_bom_cache(self):
+        self.controller.add_child(self.controller2, 10, 15)
+        bom = self.controller.get_bom(None, "all")
+        self.assertEqual(bom, self.controller.get_bom(None, "all"))
+        # a modification of a child invalidates the snapshot
+        self.controller2.add_child(self.controller3, 10, 15)
+        bom2 = self.controller.get_bom(None, "all")
+        self.assertEqual([self.controller2.id, self.controller3.id],
+                [c.link.child_id for c in bom2["children"]])
+        # a promotion changes the states
+        self.controller3.promote()
+        bom3 = self.controller.get_bom(None, "all")
+        self.assertEqual(self.controller3.state.name,
+                bom3["states"][self.controller3.id])
+
+    @override_settings(BOM_CACHE_CURRENT=True)
+    def test_get_bom_cache_invalidated_on_commit(self):
+        self.controller.add_child(self.controller2, 10, 15)
+        # a snapshot built before the end of the transaction is not kept
+        key = bomcache.get_snapshot_key(self.controller.id, None, -1)
+        transaction.signals.post_commit.send(None)
+        self.assertNotEqual(key,
+                bomcache.get_snapshot_key(self.controller.id, None, -1))
+
+    @override_settings(BOM_CACHE_CURRENT=False)
+    def test_get_bom_cache_not_shared(self):
+        # current BOMs are not cached by a cache private to a process
+        self.assertEqual(None,
+                bomcache.get_snapshot_key(self.controller.id, None, -1))
+        date = timezone.now() - datetime.timedelta(days=1)
+        self.assertNotEqual(None,
+                bomcache.get_snapshot_key(self.controller.id, date, -1))
+
     def test_is_promotable1(self):
         """Tests promotion from draft state, an official document is attached."""
         self.assertTrue(self.controller.is_promotable())
@@ -35,6 +35,7 @@ from openPLM.plmapp.utils import level_to_sign_str
 import openPLM.plmapp.exceptions as exc
 import openPLM.plmapp.models as models
 from openPLM.plmapp.controllers import PLMObjectController, UserController
+from openPLM.plmapp.permissions import filter_readable, get_context
 
 from openPLM.plmapp.tests.base import BaseTestCase
 
@@ -431,6 +432,39 @@ class ControllerTest(BaseTestCase):
                 role="notified")
         self.assertEqual(ids[0], link.id)
 
+    def test_permissions_cached_by_user(self):
+        controller = self.create("Part1")
+        controller.check_readable()
+        controller.check_permission(models.ROLE_OWNER)
+        controller.check_permission(models.ROLE_NOTIFIED, False)
+        # a new controller shares the authorization context of the user
+        ctrl2 = self.CONTROLLER(controller.object, self.user)
+        with self.assertNumQueries(0):
+            self.assertTrue(ctrl2.check_readable(False))
+            self.assertTrue(ctrl2.check_in_group(self.user, False))
+            self.assertTrue(ctrl2.check_permission(models.ROLE_OWNER, False))
+            self.assertFalse(ctrl2.check_permission(models.ROLE_NOTIFIED, False))
+
+    def test_permissions_cache_invalidated(self):
+        controller = self.create("Part1")
+        user = self.get_contributor()
+        user2 = self.get_contributor("user3")
+        ctrl = self.CONTROLLER(controller.object, user2)
+        self.assertFalse(ctrl.check_permission(models.ROLE_NOTIFIED, False))
+        # role added to a delegator
+        UserController(user, user).delegate(user2, models.ROLE_NOTIFIED)
+        controller.add_notified(user)
+        ctrl = self.CONTROLLER(controller.object, user2)
+        self.assertTrue(ctrl.check_permission(models.ROLE_NOTIFIED, False))
+        # role removed
+        controller.remove_notified(user)
+        ctrl = self.CONTROLLER(controller.object, user2)
+        self.assertFalse(ctrl.check_permission(models.ROLE_NOTIFIED, False))
+        # group membership
+        self.assertTrue(ctrl.check_in_group(user2, False))
+        user2.groups.remove(self.group)
+        self.assertFalse(ctrl.check_in_group(user2, False))
+
     def test_set_role(self):
         controller = self.create("Part1")
         user = self.get_contributor()
@@ -619,6 +653,42 @@ class ControllerTest(BaseTestCase):
         ctrl = self.CONTROLLER(controller.object, robert)
         self.assertRaises(exc.PermissionError, ctrl.check_readable)
 
+    def test_filter_readable(self):
+        controller = self.create("P1")
+        obj = controller.object
+        other = self.create("P2").object
+        missing_id = other.id + 1000
+        items = [obj, other.id, missing_id]
+        self.assertEqual([obj, other.id], filter_readable(self.user, items))
+        self.assertEqual([obj, other.id], filter_readable(self.cie, items))
+        robert = models.User.objects.create_user("Robert", "pwd", "robert@p.txt")
+        self.assertEqual([], filter_readable(robert, items))
+        robert.groups.add(self.group)
+        with self.assertNumQueries(2):
+            self.assertEqual([obj, other.id], filter_readable(robert, items))
+        robert.groups.remove(self.group)
+        self.promote_to_official(controller)
+        self.assertEqual([obj], filter_readable(robert, items))
+        self.assertEqual([obj.id], filter_readable(robert, [obj.id]))
+
+    def test_prefetch_roles_search_results(self):
+        from haystack.models import SearchResult
+        from openPLM.plmapp.searchcache import prefetch_roles
+        ctrls = [self.create("P%d" % i) for i in xrange(3)]
+        meta = ctrls[0].object._meta
+        results = [SearchResult(meta.app_label, meta.module_name, str(c.id), 1)
+                for c in ctrls]
+        robert = self.get_contributor("Robert")
+        models.PLMObjectUserLink.objects.create(plmobject=ctrls[1].object,
+                user=robert, role=models.ROLE_NOTIFIED)
+        context = get_context(robert)
+        # delegators and roles of all results
+        with self.assertNumQueries(2):
+            prefetch_roles(robert, results)
+        with self.assertNumQueries(0):
+            self.assertEqual([False, True, False], [context.has_role(c.id,
+                models.ROLE_NOTIFIED) for c in ctrls])
+
     def test_is_readable_not_editable(self):
         """
         Tests that an official or deprecated object is readable by every body.
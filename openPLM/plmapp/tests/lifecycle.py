@@ -27,12 +27,20 @@ This module contains test for lifecycle stuff.
 """
 
 from django.test import TestCase
+from django.core.cache import cache
 
+from openPLM.plmapp import refcache
 from openPLM.plmapp.models import Lifecycle, get_default_lifecycle, \
-        get_default_state, LifecycleStates
+        get_default_state, get_state_names, LifecycleStates, State
 from openPLM.plmapp.lifecycle import LifecycleList
 
 class LifecycleTest(TestCase):
+
+    def tearDown(self):
+        cache.clear()
+        refcache.invalidate(refcache.LIFECYCLES)
+        super(LifecycleTest, self).tearDown()
+
     def test_get_default(self):
         lifecycle = get_default_lifecycle()
     
@@ -58,3 +66,81 @@ class LifecycleTest(TestCase):
         state = get_default_state()
         self.assertEqual(state.name, "draft")
 
+    def test_to_list_cached(self):
+        cycle = LifecycleList("cycle_name", "b", "a", "b", "c")
+        Lifecycle.from_lifecyclelist(cycle)
+        Lifecycle.objects.get(name="cycle_name").to_states_list()
+        refcache.reset_stats()
+        lifecycle = Lifecycle.objects.get(name="cycle_name")
+        with self.assertNumQueries(0):
+            lc_list = lifecycle.to_states_list()
+            self.assertEqual("a", lifecycle.first_state.name)
+            self.assertEqual("c", lifecycle.last_state.name)
+        self.assertEqual(list(cycle), list(lc_list))
+        self.assertEqual("b", lc_list.official_state)
+        self.assertEqual(1, refcache.get_stats()[refcache.LIFECYCLES]["hits"])
+
+    def test_to_list_invalidated(self):
+        cycle = LifecycleList("cycle_name", "b", "a", "b", "c")
+        lifecycle = Lifecycle.from_lifecyclelist(cycle)
+        self.assertEqual(3, Lifecycle.objects.get(name="cycle_name").nb_states)
+        state = State.objects.create(name="d")
+        LifecycleStates.objects.create(lifecycle=lifecycle, state=state, rank=3)
+        lifecycle = Lifecycle.objects.get(name="cycle_name")
+        self.assertEqual(["a", "b", "c", "d"], list(lifecycle.to_states_list()))
+        self.assertTrue("d" in get_state_names())
+
+
+
+class CountingCache(object):
+    """ Wraps a django cache and counts its reads. """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.reads = 0
+
+    def get(self, *args, **kwargs):
+        self.reads += 1
+        return self.backend.get(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+
+class RefCacheTest(TestCase):
+
+    def setUp(self):
+        self.backend = refcache.get_backend()
+        refcache._backend = CountingCache(self.backend)
+
+    def tearDown(self):
+        refcache._backend = self.backend
+        cache.clear()
+        refcache.invalidate(refcache.LIFECYCLES)
+        super(RefCacheTest, self).tearDown()
+
+    def get(self):
+        return refcache.get(refcache.LIFECYCLES, "key", lambda: "value")
+
+    def test_hits_no_backend_reads(self):
+        self.get()
+        refcache._backend.reads = 0
+        for i in xrange(10):
+            self.assertEqual("value", self.get())
+        self.assertEqual(0, refcache._backend.reads)
+
+    def test_version_read_after_interval(self):
+        self.get()
+        refcache._backend.reads = 0
+        with self.settings(REFERENCE_CACHE_CHECK_INTERVAL=0):
+            for i in xrange(10):
+                self.assertEqual("value", self.get())
+        self.assertEqual(10, refcache._backend.reads)
+
+    def test_invalidated_by_another_process(self):
+        self.get()
+        # another process renews the version
+        self.backend.set(refcache._version_key(refcache.LIFECYCLES), "other")
+        with self.settings(REFERENCE_CACHE_CHECK_INTERVAL=0):
+            self.assertEqual("new", refcache.get(refcache.LIFECYCLES, "key",
+                lambda: "new"))
@@ -1,6 +1,7 @@
 import lxml.html
 
 from django.contrib.auth.models import User
+from django.db import connection
 
 from openPLM.plmapp import models
 from openPLM.plmapp.navigate import NavigationGraph, OSR
@@ -249,6 +250,44 @@ class PartNavigateTestCase(NavigateTestCase):
             self.assertCount(3, 3)
 
 
+    def test_layout_cache(self):
+        """
+        Tests that a layout is reused if the graph is not modified.
+        """
+        calls = []
+        layout = NavigationGraph._layout
+        def counting_layout(graph, dot, prog):
+            calls.append(prog)
+            return layout(graph, dot, prog)
+        NavigationGraph._layout = counting_layout
+        try:
+            data = self.DATA.copy()
+            data["name"] = "Coffee"
+            child1 = PartController.create("c1", "Part", "k",
+                    self.user, data, True, True)
+            self.controller.add_child(child1, 15, 789, "kg")
+            self.get_graph_data({"child" : True})
+            self.assertEqual(1, len(calls))
+            json = self.json
+            self.get_graph_data({"child" : True})
+            self.assertEqual(1, len(calls))
+            self.assertEqual(json, self.json)
+            # a new name is not laid out
+            child1.name = "Tea"
+            child1.save()
+            self.get_graph_data({"child" : True})
+            self.assertEqual(1, len(calls))
+            self.assertTrue("Tea" in self.nodes[1].text_content())
+            # but a new layout is required if an edge is modified
+            self.controller.modify_child(child1, 10, 789, "kg")
+            self.get_graph_data({"child" : True})
+            self.assertEqual(2, len(calls))
+            self.get_graph_data({"child" : True, "prog" : "neato"})
+            self.assertEqual(["dot", "dot", "neato"], calls)
+        finally:
+            NavigationGraph._layout = layout
+
+
 class DocumentNavigateTestCase(NavigateTestCase):
     TYPE = "Document"
     CONTROLLER = DocumentController
@@ -440,3 +479,86 @@ class UserNavigateTestCase(NavigateTestCase):
             self.get_graph_data({"to_sign" : True, OSR : True }, (result,))
             self.assertCount(1, 0)
 
+
+class NavigateQueriesTestCase(NavigateTestCase):
+    """
+    Tests that the number of queries does not depend on the size
+    of the graph.
+    """
+
+    def create_objects(self, model, type_, prefix, count):
+        objects = []
+        root = self.controller.object
+        for i in xrange(count):
+            obj = model(type=type_, reference="%s%d" % (prefix, i),
+                    revision="a", lifecycle=root.lifecycle, state=root.state,
+                    creator=self.user, owner=self.user, group=self.group)
+            obj.no_index = True
+            obj.save()
+            objects.append(obj)
+        return objects
+
+    def build_assembly(self, prefix, count):
+        """
+        Builds an assembly of *count* parts (binary tree), a document
+        is attached to each part. Returns the root.
+        """
+        parts = self.create_objects(models.Part, "Part", prefix + "P", count)
+        docs = self.create_objects(models.Document, "Document", prefix + "D", count)
+        models.ParentChildLink.objects.bulk_create(
+            models.ParentChildLink(parent=parts[(i - 1) // 2], child=parts[i],
+                quantity=1, order=i) for i in xrange(1, count))
+        models.rebuild_bom_closure()
+        models.DocumentPartLink.objects.bulk_create(
+            models.DocumentPartLink(part=p, document=d) for p, d in zip(parts, docs))
+        return parts[0]
+
+    def count_queries(self, root, options):
+        graph = NavigationGraph(root)
+        graph.set_options(options)
+        connection.use_debug_cursor = True
+        connection.queries = []
+        try:
+            graph.create_edges()
+            graph.render()
+            nb_queries = len(connection.queries)
+        finally:
+            connection.use_debug_cursor = None
+        return nb_queries, len(graph.nodes)
+
+    def test_assembly(self):
+        options = {"child" : True, "doc" : True}
+        small = PartController(self.build_assembly("S", 3), self.user)
+        nb_queries, nb_nodes = self.count_queries(small, options)
+        self.assertEqual(6, nb_nodes)
+        big = PartController(self.build_assembly("B", 250), self.user)
+        nb_queries2, nb_nodes = self.count_queries(big, options)
+        self.assertEqual(500, nb_nodes)
+        self.assertEqual(nb_queries, nb_queries2)
+
+    def test_owned_parts(self):
+        user = UserController(self.user, self.user)
+        root = self.build_assembly("S", 2)
+        options = {"owned" : True, "doc_parts" : [root.id]}
+        nb_queries, nb_nodes = self.count_queries(user, options)
+        self.build_assembly("B", 40)
+        parts = models.Part.objects.filter(reference__startswith="BP")
+        options = {"owned" : True, "doc_parts" : [p.id for p in parts]}
+        nb_queries2, nb_nodes2 = self.count_queries(user, options)
+        self.assertTrue(nb_nodes2 > nb_nodes + 80)
+        self.assertEqual(nb_queries, nb_queries2)
+
+    def test_notified_users(self):
+        options = {"notified" : True}
+        def add_users(prefix, count):
+            for i in xrange(count):
+                user = User.objects.create(username="%s%d" % (prefix, i))
+                models.PLMObjectUserLink.objects.create(user=user,
+                        plmobject=self.controller.object, role="notified")
+        add_users("s", 1)
+        nb_queries, nb_nodes = self.count_queries(self.controller, options)
+        self.assertEqual(2, nb_nodes)
+        add_users("b", 20)
+        nb_queries2, nb_nodes = self.count_queries(self.controller, options)
+        self.assertEqual(22, nb_nodes)
+        self.assertEqual(nb_queries, nb_queries2)
@@ -6,6 +6,8 @@ import openPLM.plmapp.exceptions as exc
 from openPLM.plmapp import models
 from openPLM.plmapp.controllers import (PartController, DocumentController,
         GroupController, UserController)
+from openPLM.plmapp.permissions import filter_readable
+from openPLM.plmapp.templatetags.plmapp_tags import is_readable
 from openPLM.plmapp.tests.base import BaseTestCase
 
 
@@ -42,6 +44,23 @@ class RestrictedPLMObjectControllerTestCase(RestrictedTestCase):
                 plmobject=self.rctrl.object, role=models.ROLE_READER)
         self.assertTrue(self.rctrl.check_restricted_readable())
 
+    def test_filter_readable(self):
+        obj = self.ctrl.object
+        self.assertEqual([], filter_readable(self.restricted_user, [obj, obj.id]))
+        # like check_readable, a reader role is not enough
+        models.PLMObjectUserLink.objects.create(user=self.restricted_user,
+                plmobject=obj, role=models.ROLE_READER)
+        self.assertEqual([], filter_readable(self.restricted_user, [obj, obj.id]))
+
+    def test_filter_readable_official(self):
+        self.ctrl.object.state = self.ctrl.lifecycle.official_state
+        self.ctrl.object.save()
+        obj = self.ctrl.object
+        self.assertTrue(obj.is_official)
+        self.assertEqual([obj, obj.id], filter_readable(self.user, [obj, obj.id]))
+        self.assertEqual([], filter_readable(self.restricted_user, [obj, obj.id]))
+        self.assertFalse(is_readable(obj, self.restricted_user))
+
     def test_add_notified_error(self):
         self.assertRaises(exc.PermissionError, self.ctrl.add_notified,
                 self.restricted_user)
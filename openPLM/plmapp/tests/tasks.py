@@ -0,0 +1,227 @@
+############################################################################
+# openPLM - open source PLM
+# Copyright 2010 Philippe Joulaud, Pierre Cosquer
+#
+# This file is part of openPLM.
+#
+#    openPLM is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    openPLM is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with openPLM.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Contact :
+#    Philippe Joulaud : ninoo.fr@gmail.com
+#    Pierre Cosquer : pcosquer@linobject.com
+################################################################################
+
+
+"""
+This module contains tests for the index writer (:class:`.IndexWriter`),
+the parallel_rebuild_index command and the extracted text cache.
+"""
+
+import os
+import shutil
+import datetime
+import tempfile
+
+from django.core.management import call_command
+from django.test.utils import override_settings
+from django.utils import timezone
+from haystack.query import SearchQuerySet
+
+from openPLM.plmapp.files import extraction
+from openPLM.plmapp.models import ExtractedText
+from openPLM.plmapp.tasks import IndexWriter, update_indexes
+from openPLM.plmapp.management.commands.parallel_rebuild_index import (Checkpoint,
+        swap_index, make_shards, index_updated)
+from openPLM.plmapp.tests.base import BaseTestCase
+
+UPDATE = IndexWriter.UPDATE
+FAST_UPDATE = IndexWriter.FAST_UPDATE
+REMOVE = IndexWriter.REMOVE
+
+
+class RecordingIndexWriter(IndexWriter):
+    """ IndexWriter which records its batches instead of applying them """
+
+    def __init__(self, *args, **kwargs):
+        super(RecordingIndexWriter, self).__init__(*args, **kwargs)
+        self.batches = []
+
+    def apply(self, batch):
+        self.batches.append(batch)
+
+
+class FailingIndexWriter(IndexWriter):
+    """ IndexWriter which can not apply its batches """
+
+    def apply(self, batch):
+        raise ValueError("index error")
+
+
+class IndexWriterTestCase(BaseTestCase):
+
+    def test_coalesce(self):
+        writer = RecordingIndexWriter()
+        writer.apply_operations([(UPDATE, "plmapp", "part", 1),
+            (UPDATE, "plmapp", "part", 2),
+            (UPDATE, "plmapp", "part", 1),
+            (REMOVE, "plmapp", "part", "2")])
+        self.assertEqual([[(UPDATE, "plmapp", "part", 1),
+            (REMOVE, "plmapp", "part", "2")]], writer.batches)
+        self.assertEqual(2, writer.get_stats()["coalesced"])
+        self.assertEqual(1, writer.get_stats()["batches"])
+
+    def test_coalesce_fast_update(self):
+        writer = RecordingIndexWriter()
+        writer.apply_operations([(UPDATE, "plmapp", "part", 1),
+            (FAST_UPDATE, "plmapp", "part", 1)])
+        self.assertEqual([[(UPDATE, "plmapp", "part", 1)]], writer.batches)
+
+    def test_error_propagated(self):
+        writer = FailingIndexWriter()
+        self.assertRaises(ValueError, writer.apply_operations,
+                [(UPDATE, "plmapp", "part", 1)])
+        self.assertEqual(1, writer.get_stats()["errors"])
+        self.assertEqual(0, writer.get_stats()["batches"])
+
+    def test_update_indexes(self):
+        ctrl = self.create("P1")
+        ctrl2 = self.create("P2")
+        ctrl.name = ctrl2.name = "batched"
+        ctrl.object.no_index = ctrl2.object.no_index = True
+        ctrl.save()
+        ctrl2.save()
+        self.assertFalse(SearchQuerySet().auto_query("batched"))
+        update_indexes.delay([(c._meta.app_label, c._meta.module_name, c.id)
+            for c in (ctrl.object, ctrl2.object)])
+        results = SearchQuerySet().auto_query("batched")
+        self.assertEqual(set([ctrl.id, ctrl2.id]), set(int(r.pk) for r in results))
+
+
+
+class ParallelRebuildIndexTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(ParallelRebuildIndexTestCase, self).setUp()
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path, True)
+        super(ParallelRebuildIndexTestCase, self).tearDown()
+
+    def test_checkpoint(self):
+        checkpoint = Checkpoint(self.path + "/checkpoint")
+        shards = [["plmapp.part.0", "plmapp", "part", 1, 10],
+                ["plmapp.part.1", "plmapp", "part", 11, 20]]
+        start = timezone.now()
+        checkpoint.create(shards, start)
+        checkpoint.mark_done("plmapp.part.0")
+        checkpoint2 = Checkpoint(self.path + "/checkpoint")
+        self.assertTrue(checkpoint2.exists())
+        checkpoint2.load()
+        self.assertEqual(shards, checkpoint2.shards)
+        self.assertEqual([shards[1]], checkpoint2.pending())
+        self.assertEqual(start, checkpoint2.start)
+
+    def test_swap_index(self):
+        index_path = os.path.join(self.path, "index")
+        new_index = os.path.join(self.path, "checkpoint", "index")
+        for path, name in ((index_path, "old"), (new_index, "new")):
+            os.makedirs(path)
+            open(os.path.join(path, name), "w").close()
+        swap_index(new_index, index_path)
+        self.assertEqual(["new"], os.listdir(index_path))
+        self.assertEqual(["checkpoint", "index"], sorted(os.listdir(self.path)))
+
+    def test_index_updated(self):
+        ctrls = [self.create("Rebuilt%d" % i) for i in xrange(2)]
+        shards = make_shards(100)
+        start = timezone.now()
+        # created and modified after the shards are computed
+        ctrls.append(self.create("Rebuilt2"))
+        ctrls[1].name = "modified"
+        ctrls[1].save()
+        with override_settings(HAYSTACK_XAPIAN_PATH=self.path + "/index"):
+            index_updated(shards, start)
+            results = SearchQuerySet().models(type(ctrls[0].object))
+            self.assertEqual(set([ctrls[1].id, ctrls[2].id]),
+                    set(int(r.pk) for r in results))
+
+    def test_rebuild(self):
+        index_path = self.path + "/index"
+        with override_settings(HAYSTACK_XAPIAN_PATH=index_path):
+            ctrls = [self.create("Rebuilt%d" % i) for i in xrange(5)]
+            call_command("parallel_rebuild_index", workers=0, batch_size=2,
+                    verbosity=0)
+            results = SearchQuerySet().models(type(ctrls[0].object))
+            self.assertEqual(set(c.id for c in ctrls),
+                    set(int(r.pk) for r in results))
+
+
+class ExtractedTextTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(ExtractedTextTestCase, self).setUp()
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path, True)
+        super(ExtractedTextTestCase, self).tearDown()
+
+    def write(self, name, content):
+        path = os.path.join(self.path, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_same_content(self):
+        content = "ISO-10303-21;\nPRODUCT('cached_product','',''));\n"
+        path1 = self.write("a.stp", content)
+        path2 = self.write("b.stp", content)
+        text = extraction.extract_text(path1)
+        self.assertTrue(u"cached_product" in text)
+        self.assertEqual(0.0, extraction.get_hit_ratio())
+        self.assertEqual(text, extraction.extract_text(path2))
+        stored = ExtractedText.objects.get()
+        self.assertEqual(1, stored.hits)
+        self.assertEqual(".stp", stored.extension)
+        self.assertEqual(0.5, extraction.get_hit_ratio())
+        # the extractor output depends on the extension
+        extraction.extract_text(self.write("c.txt2", content))
+        self.assertEqual(2, ExtractedText.objects.count())
+
+    def test_evict(self):
+        now = timezone.now()
+        for i in xrange(10):
+            ExtractedText.objects.create(content_hash=str(i), extension=".stp",
+                    extractor_version="v", text="x" * 100, size=100,
+                    atime=now + datetime.timedelta(seconds=i))
+        self.assertEqual(0, extraction.evict(1000))
+        self.assertEqual(3, extraction.evict(800))
+        # least recently used texts are deleted first
+        hashes = ExtractedText.objects.values_list("content_hash", flat=True)
+        self.assertEqual(set("3456789"), set(hashes))
+        self.assertEqual(700, extraction.get_stats().size)
+
+    def test_evicted_texts_stats(self):
+        content = "ISO-10303-21;\nPRODUCT('evicted_product','',''));\n"
+        path = self.write("a.stp", content)
+        extraction.extract_text(path)
+        extraction.extract_text(path)
+        size = extraction.get_stats().size
+        self.assertTrue(size > 0)
+        self.assertEqual(1, extraction.evict(size - 1))
+        self.assertFalse(ExtractedText.objects.exists())
+        # evicted texts are still counted
+        self.assertEqual(0, extraction.get_stats().size)
+        self.assertEqual(0.5, extraction.get_hit_ratio())
@@ -26,6 +26,7 @@
 
 from django.contrib.auth.models import User
 from django.test import TestCase
+from django.core.cache import cache
 from django.core.files.base import File
 import datetime
 
@@ -655,6 +656,30 @@ class SearchViewTestCase(CommonViewTest):
             af = response.context["search_form"]
             self.assertEqual(af.data["q"], query)
 
+    def test_session_results_cached(self):
+        "Tests that results are stored in the cache, not in the session"
+        results = self.search({"type" : self.TYPE})
+        session = self.client.session
+        self.assertFalse("results" in session)
+        self.assertTrue("search_id" in session)
+        response = self.get("/user/%s/attributes/" % self.user.username)
+        self.assertEqual([r.object for r in response.context["results"]],
+                results)
+        # expired results: the search is run again
+        cache.clear()
+        response = self.get("/user/%s/attributes/" % self.user.username)
+        self.assertEqual([r.object for r in response.context["results"]],
+                results)
+
+    def test_set_readable_results_no_model(self):
+        "Tests that results without a model are skipped"
+        from haystack.models import SearchResult
+        from openPLM.plmapp.searchcache import set_readable_results
+        result = SearchResult("plmapp", "unknownmodel", "1", 1)
+        self.assertEqual(None, result.model)
+        set_readable_results(self.user, [result])
+        self.assertEqual(None, getattr(result, "readable", None))
+
     def test_empty(self):
         "Test a search with an empty database"
         # clear all plmobject so results is empty
@@ -1,8 +1,12 @@
 import os.path
+import sys
+import Queue
 import tarfile
 import itertools
+import threading
+from multiprocessing.pool import ThreadPool
 from cStringIO import StringIO
-import struct, time, sys
+import struct, time
 import binascii, stat
 from zipfile import ZipInfo, ZIP_STORED, ZIP_DEFLATED, LargeZipFile, ZIP64_LIMIT
 
@@ -31,6 +35,139 @@ def get_available_name(name, exiting_files):
 #: True if files are compressed or not according to their extension
 ZIP_AUTO = -1
 
+#: size of blocks read from archived files (a multiple of
+#: :const:`tarfile.BLOCKSIZE`, 1 Mo)
+BLOCK_SIZE = 2048 * tarfile.BLOCKSIZE
+
+#: maximal number of compressed blocks waiting to be sent
+QUEUE_SIZE = 8
+
+def iterate_in_thread(iterable, maxsize=QUEUE_SIZE):
+    """
+    .. versionadded:: 2.1
+
+    Returns a generator which yields the items of *iterable*. *iterable*
+    is consumed by a worker thread which stays at most *maxsize* items
+    ahead. Exceptions raised by the worker are raised by the generator.
+    """
+    queue = Queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Queue.Full:
+                continue
+        return False
+
+    def run():
+        try:
+            for item in iterable:
+                if not put((True, item)):
+                    return
+            put((False, None))
+        except Exception:
+            put((False, sys.exc_info()))
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            ok, item = queue.get()
+            if not ok:
+                if item is not None:
+                    raise item[0], item[1], item[2]
+                break
+            yield item
+    finally:
+        # the consumer may stop before the end (closed connection)
+        stop.set()
+        thread.join()
+
+#: number of threads which read the files of the next members of an archive
+PREFETCH_WORKERS = 4
+
+#: maximal number of members read in advance
+PREFETCH_AHEAD = 8
+
+#: maximal number of bytes of a member read in advance (32 Mo)
+PREFETCH_SIZE = 32 * 1024 * 1024
+
+def _read_ahead(path, index, position):
+    """
+    Reads the beginning of the file *path* so that it is in the page cache
+    when it is archived. Stops once the member *index* is being archived
+    (``position[0] >= index``).
+    """
+    size = PREFETCH_SIZE
+    try:
+        with open(path, "rb") as f:
+            while size > 0 and position[0] < index:
+                s = f.read(min(BLOCK_SIZE, size))
+                if not s:
+                    break
+                size -= len(s)
+    except IOError:
+        pass
+
+def prefetch(members, workers=PREFETCH_WORKERS, ahead=PREFETCH_AHEAD):
+    """
+    .. versionadded:: 2.1
+
+    Yields *members* (see :func:`get_members`) in order while the stored
+    files of the next *ahead* members are read by a pool of *workers*
+    threads.
+
+    Workers only read files, they do not access the database, so
+    :meth:`.Document.get_content_and_size` is still called by the
+    archive generator.
+    """
+    if workers <= 0 or len(members) < 2:
+        for member in members:
+            yield member
+        return
+    # index of the member being archived, shared with the workers
+    position = [0]
+    pool = ThreadPool(min(workers, len(members) - 1))
+    next_index = 1
+    try:
+        for index, member in enumerate(members):
+            position[0] = index
+            while next_index < len(members) and next_index <= index + ahead:
+                path = members[next_index][0].file.path
+                pool.apply_async(_read_ahead, (path, next_index, position))
+                next_index += 1
+            yield member
+    finally:
+        # stops pending reads
+        position[0] = len(members)
+        pool.close()
+        pool.join()
+
+def _deflate(fp, cmpr, state):
+    """
+    Yields the compressed content of *fp*. The crc, the size and
+    the compressed size are stored in *state*.
+    """
+    CRC = file_size = compress_size = 0
+    while 1:
+        buf = fp.read(BLOCK_SIZE)
+        if not buf:
+            break
+        file_size = file_size + len(buf)
+        CRC = crc32(buf, CRC) & 0xffffffff
+        buf = cmpr.compress(buf)
+        if buf:
+            compress_size = compress_size + len(buf)
+            yield buf
+    buf = cmpr.flush()
+    compress_size = compress_size + len(buf)
+    yield buf
+    state.update(CRC=CRC, file_size=file_size, compress_size=compress_size)
+
 #: formats that are stored uncompressed
 STORED_FORMATS = set((
     "zip", "gz", "bz2", "tgz", "xz", "rar", ".zipx", # archives
@@ -125,9 +262,53 @@ class IterZipFile:
             if not self._allowZip64:
                 raise LargeZipFile("Zipfile size would require ZIP64 extensions")
 
+    def _get_compression(self, filename, compress_type):
+        if compress_type is not None:
+            return compress_type
+        if self.compression == ZIP_AUTO:
+            ext = os.path.splitext(filename)[1].lower()
+            return ZIP_STORED if ext and ext[1:] in STORED_FORMATS \
+                    else ZIP_DEFLATED
+        return self.compression
+
+    def get_size(self, members):
+        """
+        .. versionadded:: 2.1
+
+        Returns the size of the archive of *members*, a list of tuples
+        (filename, arcname, size), or None if it can not be computed
+        (a member is compressed).
+        """
+        tell = count = central = 0
+        for filename, arcname, size in members:
+            if self._get_compression(filename, None) != ZIP_STORED:
+                return None
+            if size > ZIP64_LIMIT or tell > ZIP64_LIMIT:
+                return None
+            arcname = os.path.normpath(os.path.splitdrive(arcname)[1])
+            while arcname[0] in (os.sep, os.altsep):
+                arcname = arcname[1:]
+            zinfo = ZipInfo(arcname)
+            zinfo.flag_bits |= 0x08
+            zinfo.file_size = zinfo.compress_size = 0
+            encoded_name = zinfo._encodeFilenameFlags()[0]
+            # header + data + data descriptor
+            tell += len(zinfo.FileHeader()) + size + 12
+            central += sizeCentralDir + len(encoded_name)
+            count += 1
+        size = tell + central + sizeEndCentDir + len(self.comment)
+        if count >= ZIP_FILECOUNT_LIMIT or tell > ZIP64_LIMIT:
+            size += sizeEndCentDir64 + sizeEndCentDir64Locator
+        return size
+
     def write(self, filename, arcname=None, compress_type=None):
         """Put the bytes from filename into the archive under the name
-        arcname."""
+        arcname.
+
+        .. versionchanged:: 2.1
+            Files are read by blocks of :const:`BLOCK_SIZE` bytes
+            and compressed in a worker thread.
+        """
 
         st = os.stat(filename)
         isdir = stat.S_ISDIR(st.st_mode)
@@ -143,16 +324,7 @@ class IterZipFile:
             arcname += '/'
         zinfo = ZipInfo(arcname, date_time)
         zinfo.external_attr = (st[0] & 0xFFFF) << 16L      # Unix attributes
-        if self.compression == ZIP_AUTO:
-            ext = os.path.splitext(filename)[1].lower()
-            compression = ZIP_STORED if ext and ext[1:] in STORED_FORMATS \
-                    else ZIP_DEFLATED
-        else:
-            compression = self.compression
-        if compress_type is None:
-            zinfo.compress_type = compression
-        else:
-            zinfo.compress_type = compress_type
+        zinfo.compress_type = self._get_compression(filename, compress_type)
 
         zinfo.file_size = st.st_size
         zinfo.flag_bits |= 0x08
@@ -180,29 +352,28 @@ class IterZipFile:
         header = zinfo.FileHeader()
         yield header
         self.tell += len(header)
-        if zinfo.compress_type == ZIP_DEFLATED:
-            cmpr = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION,
-                 zlib.DEFLATED, -15)
-        else:
-            cmpr = None
-        while 1:
-            buf = fp.read(1024 * 8)
-            if not buf:
-                break
-            file_size = file_size + len(buf)
-            CRC = crc32(buf, CRC) & 0xffffffff
-            if cmpr:
-                buf = cmpr.compress(buf)
-                compress_size = compress_size + len(buf)
-            yield buf
-        fp.close()
-        if cmpr:
-            buf = cmpr.flush()
-            compress_size = compress_size + len(buf)
-            yield buf
-            zinfo.compress_size = compress_size
-        else:
-            zinfo.compress_size = file_size
+        try:
+            if zinfo.compress_type == ZIP_DEFLATED:
+                cmpr = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION,
+                     zlib.DEFLATED, -15)
+                # compression is CPU bound, it is done by another thread
+                # while previous blocks are sent
+                state = {}
+                for buf in iterate_in_thread(_deflate(fp, cmpr, state)):
+                    yield buf
+                CRC, file_size = state["CRC"], state["file_size"]
+                zinfo.compress_size = state["compress_size"]
+            else:
+                while 1:
+                    buf = fp.read(BLOCK_SIZE)
+                    if not buf:
+                        break
+                    file_size = file_size + len(buf)
+                    CRC = crc32(buf, CRC) & 0xffffffff
+                    yield buf
+                zinfo.compress_size = file_size
+        finally:
+            fp.close()
         self.tell += zinfo.compress_size
         zinfo.CRC = CRC
         zinfo.file_size = file_size
@@ -318,6 +489,39 @@ class IterZipFile:
         yield self.comment
 
 
+def _has_fixed_size(document):
+    """
+    Returns True if the content of the files of *document* is the content
+    stored by :obj:`.docfs` (documents which do not override
+    :meth:`.Document.get_content_and_size`).
+    """
+    from openPLM.plmapp.models import Document
+    method = type(document).get_content_and_size
+    return method.im_func is Document.get_content_and_size.im_func
+
+def get_members(files):
+    """
+    .. versionadded:: 2.1
+
+    Returns a list of tuples (:class:`.DocumentFile`, leaf document,
+    archive name) of *files*.
+
+    An item of *files* is a :class:`.DocumentFile` or a tuple
+    (directory, :class:`.DocumentFile`).
+    """
+    members = []
+    filenames = set()
+    for df in files:
+        if isinstance(df, tuple):
+            directory, df = df
+            name = u"%s/%s" % (directory, df.filename)
+        else:
+            name = df.filename
+        filename = get_available_name(name, filenames)
+        filenames.add(filename)
+        members.append((df, df.document.get_leaf_object(), filename))
+    return members
+
 def generate_tarfile(files):
     """
     Returns a generator that yields *files* as a tar file.
@@ -326,28 +530,27 @@ def generate_tarfile(files):
     consume too much memory so it can be used to serve efficiently a tar file
     of large files.
 
-    :param files: a sequence of class:`.DocumentFile`
+    .. versionchanged:: 2.1
+        Files are read by blocks of :const:`BLOCK_SIZE` bytes
+        and the next files are read in advance (see :func:`prefetch`).
+
+    :param files: a sequence of class:`.DocumentFile` (see :func:`get_members`)
     """
-    fake_file = StringIO()
-    tf = tarfile.open(mode= "w", fileobj=fake_file)
-    filenames = set()
-    for df in files:
+    tf = tarfile.open(mode= "w", fileobj=StringIO())
+    for df, document, filename in prefetch(get_members(files)):
         # yields the header
-        filename = get_available_name(df.filename, filenames)
-        filenames.add(filename)
         info = tf.gettarinfo(df.file.path, filename)
-        f, size = df.document.get_leaf_object().get_content_and_size(df)
+        f, size = document.get_content_and_size(df)
         # change the name of the owner
         info.uname = info.gname = df.document.owner.username
         info.size = size
         yield info.tobuf()
         # yields the content of the file
         try:
-            s = f.read(512)
+            s = f.read(BLOCK_SIZE)
             while s:
                 yield s
-                s = f.read(512)
-            yield s
+                s = f.read(BLOCK_SIZE)
             blocks, remainder = divmod(info.size, tarfile.BLOCKSIZE)
             if remainder > 0:
                 yield (tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
@@ -356,6 +559,26 @@ def generate_tarfile(files):
     # yields the nul blocks that mark the end of the tar file
     yield (tarfile.NUL * tarfile.BLOCKSIZE * 2)
 
+def get_tarfile_size(files):
+    """
+    .. versionadded:: 2.1
+
+    Returns the size of the tar file of *files* or None if it can not
+    be computed without generating the content of a file.
+    """
+    tf = tarfile.open(mode= "w", fileobj=StringIO())
+    total = 0
+    for df, document, filename in get_members(files):
+        if not _has_fixed_size(document):
+            return None
+        info = tf.gettarinfo(df.file.path, filename)
+        info.uname = info.gname = df.document.owner.username
+        blocks, remainder = divmod(info.size, tarfile.BLOCKSIZE)
+        if remainder > 0:
+            blocks += 1
+        total += len(info.tobuf()) + blocks * tarfile.BLOCKSIZE
+    return total + tarfile.BLOCKSIZE * 2
+
 
 def generate_zipfile(files):
     """
@@ -365,15 +588,15 @@ def generate_zipfile(files):
     consume too much memory so it can be used to serve efficiently a tar file
     of large files.
 
-    :param files: a sequence of class:`.DocumentFile`
+    .. versionchanged:: 2.1
+        The next files are read in advance (see :func:`prefetch`).
+
+    :param files: a sequence of class:`.DocumentFile` (see :func:`get_members`)
     :param compressed: ``True`` if files should be compressed (default: True)
     """
     zf = IterZipFile()
-    filenames = set()
-    for df in files:
-        filename = get_available_name(df.filename, filenames)
-        filenames.add(filename)
-        f, size = df.document.get_leaf_object().get_content_and_size(df)
+    for df, document, filename in prefetch(get_members(files)):
+        f, size = document.get_content_and_size(df)
         path = f.name
         try:
             for s in zf.write(path, filename):
@@ -383,14 +606,43 @@ def generate_zipfile(files):
     for s in zf.close():
         yield s
 
+def get_zipfile_size(files):
+    """
+    .. versionadded:: 2.1
+
+    Returns the size of the zip file of *files* or None if it can not
+    be computed without generating the archive (some files are compressed).
+    """
+    members = []
+    for df, document, filename in get_members(files):
+        if not _has_fixed_size(document):
+            return None
+        path = df.file.path
+        members.append((path, filename, os.path.getsize(path)))
+    return IterZipFile().get_size(members)
+
 _generators = {
     "zip" : generate_zipfile,
     "tar" : generate_tarfile,
 }
 
+_sizes = {
+    "zip" : get_zipfile_size,
+    "tar" : get_tarfile_size,
+}
+
 #: List of available archive formats (currently: ``zip`` and ``tar``).
 ARCHIVE_FORMATS = _generators.keys()
 
 def generate_archive(files, format):
     return _generators[format](files)
 
+def get_archive_size(files, format):
+    """
+    .. versionadded:: 2.1
+
+    Returns the size of the archive of *files* (a list) generated by
+    :func:`generate_archive` or None if it is not known in advance.
+    """
+    return _sizes[format](files)
+
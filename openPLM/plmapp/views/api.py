@@ -31,6 +31,7 @@ import json
 import functools
 
 import django.forms
+from django.conf import settings
 from django.contrib.auth.decorators import user_passes_test
 from django.contrib.auth import authenticate, login
 from django.db import transaction
@@ -38,7 +39,8 @@ from django.http import HttpResponseForbidden
 from django.views.decorators.csrf import csrf_exempt
 
 import openPLM.plmapp.models as models
-from openPLM.plmapp.controllers import get_controller, DocumentController
+from openPLM.plmapp.controllers import get_controller
+from openPLM.plmapp.permissions import get_context, filter_readable
 import openPLM.plmapp.forms as forms
 from openPLM.plmapp.utils import get_next_revision
 from openPLM.plmapp.views.base import json_view, get_obj_by_id, object_to_dict,\
@@ -121,21 +123,24 @@ def search(request, editable_only="true", with_file_only="true"):
         if form.is_valid():
             # object may have been deleted but not yet unindexed
             results = [r.object for r in form.search().load_all()[:30] if r is not None]
+            results = [r.document.get_leaf_object() if isinstance(r, models.DocumentFile)
+                    else r for r in results]
+            # checks the readability of all results at once
+            results = filter_readable(request.user, results)
+            context = get_context(request.user)
+            is_company = request.user.username == settings.COMPANY
             objects = []
             ids = set()
             for res in results:
-                if isinstance(res, models.DocumentFile):
-                    res = res.document.get_leaf_object()
                 if res.id in ids: # avoiding duplicated results
                     continue
                 if editable_only == "false" or res.is_editable:
                     if with_file_only == "true" and hasattr(res, "files") \
                        and not bool(res.files):
                         continue
-                    if editable_only == "true":
-                        obj = DocumentController(res, request.user)
-                        if not obj.check_in_group(request.user, False):
-                            continue
+                    if editable_only == "true" and not (is_company
+                            or context.in_group(res.group_id)):
+                        continue
                     ids.add(res.id)
                     objects.append(object_to_dict(res))
             return {"objects" : objects}
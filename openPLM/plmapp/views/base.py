@@ -51,6 +51,7 @@ from openPLM.plmapp.controllers import get_controller
 from openPLM.plmapp.exceptions import ControllerError
 from openPLM.plmapp.forms import get_navigate_form, SimpleSearchForm
 from openPLM.plmapp.navigate import NavigationGraph, OSR
+from openPLM.plmapp.searchcache import SearchResults, get_search_id, store_results
 from openPLM.plmapp.utils import can_generate_pdf
 
 
@@ -316,7 +317,7 @@ def get_generic_data(request, type_='-', reference='-', revision='-', search=Tru
 
     if not restricted: # a restricted account can not perform a search
         # Builds, update and treat Search form
-        search_needed = "results" not in request.session or load_all
+        search_needed = "search_id" not in request.session or load_all
         if request.method == "GET" and "type" in request.GET:
             search_form = SimpleSearchForm(request.GET, auto_id=_SEARCH_ID)
             request.session["type"] = request.GET["type"]
@@ -340,17 +341,22 @@ def get_generic_data(request, type_='-', reference='-', revision='-', search=Tru
             search_official = ["", "1"][search_form.cleaned_data["search_official"]]
             request.session["search_official"] = search_official
             search_count = request.session["search_count"] = qset.count()
-            qset = qset[:30]
-            request.session["results"] = qset
+            search_id = get_search_id(request.session["type"], search_query,
+                    search_official)
+            request.session["search_id"] = search_id
+            # results are stored in the cache, not in the session
+            request.session.pop("results", None)
+            results = store_results(request.user, search_id, qset)
             save_session = True
         else:
-            qset = request.session.get("results", [])
+            results = SearchResults(request.user, request.session.get("search_id"),
+                    search_form if search else None)
             search_query = request.session.get("search_query", "")
             search_count = request.session.get("search_count", 0)
             search_official = request.session.get("search_official", "")
 
         ctx.update({
-           'results' : qset,
+           'results' : results,
            'search_query' : search_query,
            'search_count' : search_count,
            'search_form' : search_form,
@@ -376,12 +382,6 @@ def get_generic_data(request, type_='-', reference='-', revision='-', search=Tru
             raise Http404
     else:
         ctx["is_readable"] = True
-    # little hack to avoid a KeyError
-    # see https://github.com/toastdriven/django-haystack/issues/404
-    from haystack import site
-    for r in request.session.get("results", []):
-        r.searchsite = site
-
     if save_session:
         request.session.save()
     return obj, ctx
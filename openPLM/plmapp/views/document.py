@@ -30,6 +30,7 @@ import tempfile
 from mimetypes import guess_type
 
 from django.conf import settings
+from django.core.servers.basehttp import FileWrapper
 from django.http import (HttpResponseRedirect, HttpResponse, Http404,
                         HttpResponseForbidden,
                         HttpResponseBadRequest, StreamingHttpResponse)
@@ -39,7 +40,8 @@ from django.contrib import messages
 
 import openPLM.plmapp.models as models
 import openPLM.plmapp.forms as forms
-from openPLM.plmapp.utils.archive import ARCHIVE_FORMATS
+from openPLM.plmapp.utils.archive import ARCHIVE_FORMATS, BLOCK_SIZE
+from openPLM.plmapp.searchcache import prefetch_roles
 from openPLM.plmapp.views.base import (get_obj, get_obj_from_form, get_id_card_data,
     get_obj_by_id, handle_errors, get_generic_data,  secure_required)
 from openPLM.plmapp.controllers import UserController
@@ -136,6 +138,8 @@ def add_part(request, obj_type, obj_ref, obj_revi):
             return HttpResponseRedirect(obj.plmobject_url + "parts/")
     else:
         add_part_form = forms.AddPartForm()
+    if ctx["results"]:
+        prefetch_roles(request.user, ctx["results"])
     ctx.update({'link_creation': True,
                 'add_part_form': add_part_form,
                 'attach' : (obj, "attach_part") })
@@ -488,12 +492,21 @@ def public_download(request, docfile_id):
 
 
 def serve(ctrl, doc_file, view=False):
+    """
+    Returns a response which streams the content of *doc_file*
+    (see :meth:`.Document.get_content_and_size`).
+
+    .. versionchanged:: 2.1
+        The file is sent by blocks of :const:`.BLOCK_SIZE` bytes instead of
+        by lines.
+    """
     name = doc_file.filename.encode("utf-8", "ignore")
     content_type = guess_type(name, False)[0]
     if not content_type:
         content_type = 'application/octet-stream'
     f, size = ctrl.get_content_and_size(doc_file)
-    response = StreamingHttpResponse(f, content_type=content_type)
+    response = StreamingHttpResponse(FileWrapper(f, BLOCK_SIZE),
+            content_type=content_type)
     response["Content-Length"] = size
     if not view:
         response['Content-Disposition'] = 'attachment; filename="%s"' % name
@@ -31,6 +31,7 @@ from django.utils.translation import ugettext_lazy as _
 
 import openPLM.plmapp.models as models
 import openPLM.plmapp.forms as forms
+from openPLM.plmapp.permissions import get_context
 from openPLM.plmapp.views.base import handle_errors, get_generic_data, get_pagination
 from openPLM.plmapp.utils import r2r
 
@@ -53,7 +54,7 @@ def display_users(request, obj_ref):
     ctx["pending_invitations"] = obj.invitation_set.filter(
             state=models.Invitation.PENDING).select_related("guest", "owner")
     ctx['current_page'] = 'users'
-    ctx['in_group'] = bool(request.user.groups.filter(id=obj.id))
+    ctx['in_group'] = get_context(request.user).in_group(obj.id)
     return r2r("groups/users.html", ctx, request)
 
 
@@ -95,7 +96,7 @@ def group_ask_to_join(request, obj_ref):
         return HttpResponseRedirect("..")
     ctx["ask_form"] = ""
     ctx['current_page'] = 'users'
-    ctx['in_group'] = request.user.groups.filter(id=obj.id).exists()
+    ctx['in_group'] = get_context(request.user).in_group(obj.id)
     return r2r("groups/ask_to_join.html", ctx, request)
 
 
@@ -67,6 +67,7 @@ from openPLM.plmapp.views.base import (init_ctx, get_obj,
     get_creation_view, secure_required, get_pagination)
 from openPLM.plmapp.controllers import get_controller
 from openPLM.plmapp.exceptions import ControllerError, PermissionError
+from openPLM.plmapp.searchcache import get_search_id, store_results
 from openPLM.plmapp.utils import filename_to_name, r2r
 
 
@@ -685,12 +686,13 @@ class OpenPLMSearchView(SearchView):
         # the same results
         session = self.request.session
         self.suggestion = results.spelling_suggestion(self.get_query())
-        session["results"] = results[:30]
         session["search_count"] = results.count()
         session["search_official"] = self.request.GET.get("search_official", "")
-        from haystack import site
-        for r in session.get("results"):
-            r.searchsite = site
+        search_id = get_search_id(session.get("type", "all"), session["search_query"],
+                session["search_official"])
+        session["search_id"] = search_id
+        session.pop("results", None)
+        store_results(self.request.user, search_id, results)
         session.save()
         return results
 
@@ -787,7 +789,7 @@ def browse(request, type="object"):
                 object_list = object_list.filter(published=True)
             elif state != "all":
                 object_list = object_list.filter(state=state)
-            ctx["states"] = models.State.objects.order_by("name").values_list("name", flat=True)
+            ctx["states"] = models.get_state_names()
             ctx["template"] = request.GET.get("template", "0")
             if ctx["template"] == "1":
                 object_list = object_list.filter(lifecycle__type=models.Lifecycle.TEMPLATE)
@@ -32,6 +32,7 @@ from django.utils.translation import ugettext_lazy as _
 import openPLM.plmapp.models as models
 import openPLM.plmapp.forms as forms
 from openPLM.plmapp.utils.archive import ARCHIVE_FORMATS
+from openPLM.plmapp.searchcache import prefetch_roles
 from openPLM.plmapp.views.base import (get_obj_from_form, handle_errors, get_generic_data, get_id_card_data, get_obj_by_id)
 from openPLM.plmapp.decomposers.base import DecomposersManager
 from openPLM.plmapp.utils import r2r
@@ -72,6 +73,9 @@ def display_children(request, obj_type, obj_ref, obj_revi):
 
     ``decomposable_children``
         a set of child part ids that are decomposable
+
+    ``archive_formats``
+        list of available archive formats
     """
     if "diff" in request.GET:
         query = request.GET.urlencode() + "&compact=on"
@@ -108,6 +112,7 @@ def display_children(request, obj_type, obj_ref, obj_revi):
                 'decomposition_msg' : decomposition_msg,
                 'decomposable_children' : decomposable_children,
                 "display_form" : display_form,
+                'archive_formats' : ARCHIVE_FORMATS,
                 })
     return r2r('parts/bom.html', ctx, request)
 
@@ -208,6 +213,7 @@ def replace_child(request, obj_type, obj_ref, obj_revi, link_id):
     else:
         form = forms.AddPartForm()
     if ctx["results"]:
+        prefetch_roles(request.user, ctx["results"])
         obj.precompute_can_add_child2()
     ctx["replace_child_form"] = form
     ctx["link"] = link
@@ -268,6 +274,7 @@ def add_child(request, obj_type, obj_ref, obj_revi):
         add_child_form = forms.AddChildForm(obj.object, initial=initial)
         ctx['current_page'] = 'BOM-child'
     if ctx["results"]:
+        prefetch_roles(request.user, ctx["results"])
         obj.precompute_can_add_child2()
         orders = list(obj.parentchildlink_parent.values_list('order', flat=True))
         initial_order = max(orders) + 10 if orders else 10
@@ -406,6 +413,8 @@ def add_alternate(request, obj_type, obj_ref, obj_revi):
             return HttpResponseRedirect(obj.plmobject_url + "alternates/")
     else:
         add_part_form = forms.AddPartForm()
+    if ctx["results"]:
+        prefetch_roles(request.user, ctx["results"])
     ctx.update({'link_creation': True,
                 'add_part_form': add_part_form,
                 'attach' : (obj, "add_alternate") })
@@ -512,6 +521,8 @@ def add_doc_cad(request, obj_type, obj_ref, obj_revi):
             return HttpResponseRedirect(obj.plmobject_url + "doc-cad/")
     else:
         add_doc_cad_form = forms.AddDocCadForm()
+    if ctx["results"]:
+        prefetch_roles(request.user, ctx["results"])
     ctx.update({'link_creation': True,
                 'add_doc_cad_form': add_doc_cad_form,
                 'attach' : (obj, "attach_doc")})
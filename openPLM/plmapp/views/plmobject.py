@@ -24,19 +24,21 @@
 #    Pierre Cosquer : pcosquer@linobject.com
 ################################################################################
 
-import itertools
+import os
 from collections import defaultdict
 from mimetypes import guess_type
 
 from django.forms import HiddenInput
-from django.http import (HttpResponseRedirect, Http404,
+from django.http import (HttpResponse, HttpResponseRedirect, Http404,
     HttpResponseForbidden, StreamingHttpResponse)
 from django.utils.translation import ugettext_lazy as _
 from django.contrib import messages
 
 import openPLM.plmapp.models as models
 import openPLM.plmapp.forms as forms
-from openPLM.plmapp.utils.archive import generate_archive, ARCHIVE_FORMATS
+from openPLM.plmapp import archivecache
+from openPLM.plmapp.permissions import get_context
+from openPLM.plmapp.utils.archive import generate_archive, get_archive_size, ARCHIVE_FORMATS
 from openPLM.plmapp.views.base import (get_obj, get_obj_from_form,
     handle_errors, get_generic_data, get_id_card_data)
 from openPLM.plmapp.exceptions import ControllerError
@@ -684,23 +686,34 @@ def download_archive(request, obj_type, obj_ref, obj_revi):
     """
     View to download all files from a document/part.
 
+    .. versionchanged:: 2.1
+        The response has a ``Content-Length`` header if the size of the
+        archive is known in advance (tar files and uncompressed zip files).
+        Archives of official and deprecated objects are cached
+        (see :mod:`.archivecache`) and support byte ranges.
+        If the ``assembly`` parameter is set, the archive of a part contains
+        the files of its whole BOM (see :meth:`.PartController.get_assembly_files`).
+        The ``date`` and ``state`` parameters of the BOM view
+        (:class:`.DisplayChildrenForm`) select the BOM.
+
     .. include:: views_params.txt
     """
 
     obj = get_obj(obj_type, obj_ref, obj_revi, request.user)
     obj.check_readable()
 
-    d_o_u = "document__owner__username"
-    if obj.is_document:
-        files = obj.files.select_related(d_o_u)
-    elif obj.is_part and "cad" in request.GET:
-        files = obj.get_cad_files()
-    elif obj.is_part:
-        links = obj.get_attached_documents()
-        docs = (link.document for link in links)
-        files = itertools.chain(*(doc.files.select_related(d_o_u)
-            for doc in docs))
+    cad = "cad" in request.GET
+    assembly = obj.is_part and "assembly" in request.GET
+    if assembly:
+        date, only_official = None, False
+        form = forms.DisplayChildrenForm(request.GET)
+        if form.is_valid():
+            date = form.cleaned_data["date"]
+            only_official = form.cleaned_data["state"] == "official"
+        files = obj.get_assembly_files(date, only_official)
     else:
+        files = archivecache.get_files(obj, cad)
+    if files is None:
         return HttpResponseForbidden()
 
     archive_format = request.GET.get("format")
@@ -709,12 +722,55 @@ def download_archive(request, obj_type, obj_ref, obj_revi):
         content_type = guess_type(name, False)[0]
         if not content_type:
             content_type = 'application/octet-stream'
-        content = generate_archive(files, archive_format)
-        response = StreamingHttpResponse(content, content_type=content_type)
+        cached = None
+        if not assembly and archivecache.is_cacheable(obj):
+            cached = archivecache.get(obj, files, archive_format, cad)
+            if cached is None:
+                archivecache.schedule_fill(obj.id, archive_format, cad)
+        if cached is not None:
+            response = _serve_cached_archive(request, cached, content_type)
+        else:
+            content = generate_archive(files, archive_format)
+            response = StreamingHttpResponse(content, content_type=content_type)
+            size = get_archive_size(files, archive_format)
+            if size is not None:
+                response['Content-Length'] = size
         response['Content-Disposition'] = 'attachment; filename="%s"' % name
         return response
     return HttpResponseForbidden()
 
+def _serve_cached_archive(request, f, content_type):
+    """
+    Returns a response which serves the cached archive *f* (an opened
+    file) or the range of bytes requested by the ``Range`` header.
+    """
+    size = os.fstat(f.fileno()).st_size
+    etag = archivecache.get_etag(f)
+    first, last = 0, size - 1
+    status = 200
+    range_header = request.META.get("HTTP_RANGE")
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if range_header and (not if_range or if_range == etag):
+        try:
+            byte_range = archivecache.parse_range(range_header, size)
+        except ValueError:
+            f.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */%d' % size
+            return response
+        if byte_range is not None:
+            first, last = byte_range
+            status = 206
+    content = archivecache.iter_range(f, first, last)
+    response = StreamingHttpResponse(content, content_type=content_type,
+            status=status)
+    response['Content-Length'] = last - first + 1
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    if status == 206:
+        response['Content-Range'] = 'bytes %d-%d/%d' % (first, last, size)
+    return response
+
 
 @handle_errors(undo="../attributes/")
 def clone(request, obj_type, obj_ref, obj_revi,creation_form=None):
@@ -797,7 +853,7 @@ def clone(request, obj_type, obj_ref, obj_revi,creation_form=None):
         not_auto_cloned_fields = ['reference','revision', 'group','lifecycle',
                 'auto', 'pfiles', 'template']
         creation_form = forms.get_creation_form(request.user, cls, template=False)
-        if bool(request.user.groups.filter(id=obj.group.id)):
+        if get_context(request.user).in_group(obj.group_id):
             creation_form.fields["group"].initial = obj.group.id
         if not obj.is_cancelled:
             creation_form.initial["lifecycle"] = obj.lifecycle
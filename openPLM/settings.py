@@ -32,6 +32,25 @@ DATABASES = {
     }
 }
 
+#XYZ: a local-memory cache is private to each process, a file-based cache
+# shares cached values (and their invalidations) between all processes:
+#    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#    'LOCATION': '/var/openPLM/cache/',
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'openplm',
+    }
+}
+#: name of the cache (see :const:`CACHES`) that stores reference data
+#: (lifecycles, states), see :mod:`openPLM.plmapp.refcache`
+REFERENCE_CACHE = 'default'
+#: lifetime (in seconds) of cached reference data
+REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+#: delay (in seconds) between two reads of the version of cached reference
+#: data, a lifecycle modified by another process is seen after this delay
+REFERENCE_CACHE_CHECK_INTERVAL = 5
+
 
 #XYZ: Local time zone for this installation. Choices can be found here:
 # http://en.wikipedia.org/wiki/List_of_tz_zones_by_name
@@ -142,7 +161,9 @@ CELERY_ROUTES = {
     "openPLM.plmapp.tasks.update_index": {"queue": "index"},
     "openPLM.plmapp.tasks.update_indexes": {"queue": "index"},
     "openPLM.plmapp.tasks.remove_index": {"queue": "index"},
+    "openPLM.plmapp.archivecache.fill": {"queue": "archives"},
     "openPLM.plmapp.mail.do_send_histories_mail" : {"queue" : "mails"},
+    "openPLM.plmapp.mail.do_send_merged_histories_mail" : {"queue" : "mails"},
     "openPLM.plmapp.mail.do_send_mail" : {"queue" : "mails"},
 }
 if "openPLM.apps.document3D" in INSTALLED_APPS:
@@ -167,10 +188,30 @@ EMAIL_FAIL_SILENTLY = True
 
 #: directory that stores documents. Make sure to use a trailing slash.
 DOCUMENTS_DIR = "/var/openPLM/docs/"
+#: True if files with the same content are stored once in :const:`DOCUMENTS_DIR`
+#: (see :program:`./manage.py convert_document_storage`)
+DOCUMENTS_CONTENT_ADDRESSED = False
 #: directory that stores thumbnails. Make sure to use a trailing slash.
 THUMBNAILS_DIR = os.path.join(MEDIA_ROOT, "thumbnails/")
 #: URL where thumbnails are located . Make sure to use a trailing slash.
 THUMBNAILS_URL = MEDIA_URL + "thumbnails/"
+#: directory that stores generated archives of official objects,
+#: None disables the cache
+ARCHIVES_CACHE_DIR = "/var/openPLM/archives/"
+#: maximal size (in bytes) of :const:`ARCHIVES_CACHE_DIR`
+ARCHIVES_CACHE_SIZE = 2 * 1024 * 1024 * 1024
+#: directory that stores recomposed STEP files (document3D), it must not be
+#: in :const:`MEDIA_ROOT` since its content is not checked by permissions
+STEP_CACHE_DIR = "/var/openPLM/step_cache/"
+#: maximal size (in bytes) of :const:`STEP_CACHE_DIR`
+STEP_CACHE_SIZE = 1024 * 1024 * 1024
+#: True if the meshes displayed by the 3D view (document3D) store positions and
+#: normals as 16 bits integers (smaller files, precision: 1/65535 of the
+#: bounding box)
+MESH_QUANTIZATION = False
+#: number of processes which mesh the shapes of a STEP file (document3D),
+#: None: one process per CPU
+STEP_MESH_WORKERS = None
 
 # Cookie used for session is temporary and is deleted when browser is closed
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
@@ -211,6 +252,11 @@ HAYSTACK_SEARCH_ENGINE = 'xapian'
 HAYSTACK_XAPIAN_PATH = "/var/openPLM/xapian_index/"
 HAYSTACK_INCLUDE_SPELLING = True
 EXTRACTOR = os.path.abspath(os.path.join(os.path.dirname(__file__), "bin", "extractor.sh"))
+#: maximal size (in bytes) of the texts extracted by :const:`EXTRACTOR`
+#: kept to not extract again files with the same content
+EXTRACTED_TEXT_CACHE_SIZE = 512 * 1024 * 1024
+#: lifetime (in seconds) of the cached results of the current search of a user
+SEARCH_RESULTS_CACHE_TIMEOUT = 60 * 30
 
 # celery stuff
 import djcelery
@@ -12,6 +12,8 @@ import os
 import re
 import shutil
 import sys
+import threading
+from contextlib import contextmanager
 
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
@@ -132,6 +134,11 @@ class SearchBackend(BaseSearchBackend):
     """
 
     inmemory_db = None
+    #: writable database shared by all backends of a process
+    #: between :meth:`open_writer` and :meth:`close_writer`
+    writable_db = None
+    #: thread local storage of term generators
+    _local = threading.local()
 
     def __init__(self, site=None, language=None):
         """
@@ -169,6 +176,86 @@ class SearchBackend(BaseSearchBackend):
             self._content_field_name, self._schema = self.build_schema(self.site.all_searchfields())
         return self._content_field_name
 
+    def open_writer(self, path=None):
+        """
+        Opens a writable database which is reused by :meth:`update`,
+        :meth:`remove` and :meth:`clear` until :meth:`close_writer` is
+        called.
+
+        This avoids opening and closing the database for each indexed object.
+
+        If *path* is given, a new database is created at *path* (it is
+        overwritten if it already exists) instead of opening the
+        ``HAYSTACK_XAPIAN_PATH`` database.
+        """
+        if SearchBackend.writable_db is None:
+            if path is None:
+                SearchBackend.writable_db = self._database(writable=True)
+            else:
+                SearchBackend.writable_db = xapian.WritableDatabase(path,
+                        xapian.DB_CREATE_OR_OVERWRITE)
+        return SearchBackend.writable_db
+
+    def close_writer(self):
+        """
+        Closes the writable database opened by :meth:`open_writer`.
+        """
+        database = SearchBackend.writable_db
+        SearchBackend.writable_db = None
+        if database is not None and settings.HAYSTACK_XAPIAN_PATH != MEMORY_DB_NAME:
+            database.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Context manager which applies all modifications made in its block
+        in one transaction on the shared writable database
+        (see :meth:`open_writer`, which is called if necessary).
+
+        Modifications are cancelled if an exception is raised.
+        """
+        opened = SearchBackend.writable_db is None
+        database = self.open_writer()
+        # in-memory databases do not support transactions
+        in_memory = settings.HAYSTACK_XAPIAN_PATH == MEMORY_DB_NAME
+        if not in_memory:
+            database.begin_transaction()
+        try:
+            yield database
+        except:
+            if not in_memory:
+                database.cancel_transaction()
+            raise
+        else:
+            if not in_memory:
+                database.commit_transaction()
+        finally:
+            if opened:
+                self.close_writer()
+
+    def _release(self, database):
+        """
+        Closes *database* unless it is the shared writable database.
+        """
+        if database is not SearchBackend.writable_db and \
+           settings.HAYSTACK_XAPIAN_PATH != MEMORY_DB_NAME:
+            database.close()
+
+    def _get_term_generator(self, database):
+        """
+        Returns a term generator bound to *database*. Term generators
+        are reused by each thread.
+        """
+        term_generator = getattr(self._local, "term_generator", None)
+        if term_generator is None:
+            term_generator = xapian.TermGenerator()
+            term_generator.set_stemmer(xapian.Stem(self.language))
+            if getattr(settings, 'HAYSTACK_INCLUDE_SPELLING', False):
+                term_generator.set_flags(xapian.TermGenerator.FLAG_SPELLING)
+            self._local.term_generator = term_generator
+        term_generator.set_database(database)
+        return term_generator
+
     def update(self, index, iterable):
         """
         Updates the `index` with any objects in `iterable` by adding/updating
@@ -208,15 +295,10 @@ class SearchBackend(BaseSearchBackend):
         through the use of the :method:xapian.sortable_serialise method.
         """
         database = self._database(writable=True)
+        term_generator = self._get_term_generator(database)
         try:
             for obj in iterable:
                 document = xapian.Document()
-
-                term_generator = xapian.TermGenerator()
-                term_generator.set_database(database)
-                term_generator.set_stemmer(xapian.Stem(self.language))
-                if getattr(settings, 'HAYSTACK_INCLUDE_SPELLING', False):
-                    term_generator.set_flags(xapian.TermGenerator.FLAG_SPELLING)
                 term_generator.set_document(document)
 
                 document_id = DOCUMENT_ID_TERM_PREFIX + get_identifier(obj)
@@ -295,8 +377,7 @@ class SearchBackend(BaseSearchBackend):
             pass
 
         finally:
-            if settings.HAYSTACK_XAPIAN_PATH != MEMORY_DB_NAME:
-                database.close()
+            self._release(database)
             database = None
 
     def remove(self, obj):
@@ -308,8 +389,7 @@ class SearchBackend(BaseSearchBackend):
         """
         database = self._database(writable=True)
         database.delete_document(DOCUMENT_ID_TERM_PREFIX + get_identifier(obj))
-        if settings.HAYSTACK_XAPIAN_PATH != MEMORY_DB_NAME:
-            database.close()
+        self._release(database)
 
     def clear(self, models=[]):
         """
@@ -339,8 +419,7 @@ class SearchBackend(BaseSearchBackend):
                     DOCUMENT_CT_TERM_PREFIX + '%s.%s' %
                     (model._meta.app_label, model._meta.module_name)
                 )
-        if settings.HAYSTACK_XAPIAN_PATH != MEMORY_DB_NAME:
-            database.close()
+        self._release(database)
 
     def document_count(self):
         try:
@@ -881,6 +960,8 @@ class SearchBackend(BaseSearchBackend):
             if not SearchBackend.inmemory_db:
                 SearchBackend.inmemory_db = xapian.inmemory_open()
             return SearchBackend.inmemory_db
+        if writable and SearchBackend.writable_db is not None:
+            return SearchBackend.writable_db
         if writable:
             database = xapian.WritableDatabase(settings.HAYSTACK_XAPIAN_PATH, xapian.DB_CREATE_OR_OPEN)
         else: